@@ -1,21 +1,23 @@
 from enum import Enum
-from itertools import groupby
 from json import dumps
-from typing import List, Dict, Set, Union, Iterable, Callable, TypeVar, Type
+from typing import List, Dict, Set, Tuple, Union, Iterable, Callable, TypeVar, Type
 from functools import wraps
 from pandas import Timestamp, Timedelta, read_csv
 from datetime import datetime, timezone, timedelta
 from statistics import mean
-import matplotlib as plt
 import numpy as np
 import pandas as pd
 
-# Data providers libraries
-from geckoclient import CoinGeckoClient # Custom CoinGecko API endpoints Wrapper
-
-#For future integration
-import investpy
-import yfinance as yf
+# Data providers libraries are imported lazily through the registry, see providers.py
+from providers import Provider, provider_registry
+from datasources import OHLCBatch, data_source_registry
+from grouping import bucket_by, group_codes
+from profiling import ProfileReport, Profiler, profiled
+from costs import CostModel, level_path
+from rebalancing import EveryNBars, RebalancingSchedule, hold_weights
+from currency import CurrencyConverter
+from optimizer import PortfolioOptimizer
+from quality import DataQuality, QualityReport, forward_fill
 
 class BacktestFatalError:
     BE_STRING_TYPED_PATH = "Path should be string typed"
@@ -28,17 +30,6 @@ class BacktestError:
     pass
 
 
-class Provider(Enum):
-    """
-    Enumeration of data provider for config parameters and future dynamic integration
-    """
-    YAHOO = "YAHOO"
-    COINGECKO = "CoinGecko"
-    CRYPTOCOMPARE = "CryptoCompare"
-    INVESTPY = "InvestPy"
-    COINMARKETCAP = "CoinMarketCap"
-
-
 def super_method(func):
     @wraps(func)
     def wrapper(self, *args, **kwargs):
@@ -123,11 +114,21 @@ class BacktesterConfig(object):
     def __init__(
             self,
             strategy_name: str,
-            file_path: CGParams,
+            file_path: Union[CGParams, str],
             start_date: Timestamp,
             end_date: Timestamp,
             product_codes: List[str],
-            frequency: Frequency = Frequency.DAILY
+            frequency: Frequency = Frequency.DAILY,
+            provider: Provider = Provider.COINGECKO,
+            provider_by_code: Dict[str, Provider] = None,
+            profiler: Profiler = None,
+            cost_model: CostModel = None,
+            rebalancing: RebalancingSchedule = None,
+            overlay: Callable[[np.ndarray, np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]] = None,
+            currency: str = None,
+            converter: CurrencyConverter = None,
+            optimizer: PortfolioOptimizer = None,
+            quality: DataQuality = None
     ):
         self._strategy_name = strategy_name
         self._file_path = file_path
@@ -135,6 +136,16 @@ class BacktesterConfig(object):
         self._end_date = end_date
         self._product_codes = product_codes
         self._frequency = frequency
+        self._provider = provider
+        self._provider_by_code = dict() if provider_by_code is None else provider_by_code
+        self._profiler = profiler
+        self._cost_model = cost_model
+        self._rebalancing = EveryNBars(1) if rebalancing is None else rebalancing
+        self._overlay = overlay
+        self._currency = currency
+        self._converter = converter
+        self._optimizer = optimizer
+        self._quality = quality
 
     @property
     def strategy_name(self):
@@ -171,6 +182,78 @@ class BacktesterConfig(object):
     def product_code(self) -> List[str]:
         return self._product_codes
 
+    @property
+    def provider(self) -> Provider:
+        return self._provider
+
+    def provider_for(self, product_code: str) -> Provider:
+        """
+        :return: the provider routed for the product code, the default provider of the config otherwise
+        """
+        return self._provider_by_code.get(product_code, self._provider)
+
+    @property
+    def profiler(self) -> Profiler:
+        """
+        :return: opt-in profiler of the run, None when the run is not profiled
+        """
+        return self._profiler
+
+    @property
+    def cost_model(self) -> CostModel:
+        """
+        :return: fees and slippage applied to the rebalancing, None for a frictionless backtest
+        """
+        return self._cost_model
+
+    @property
+    def rebalancing(self) -> RebalancingSchedule:
+        """
+        :return: dates where the positions are reset to their target weights, every date by default
+        """
+        return self._rebalancing
+
+    @property
+    def overlay(self) -> Callable[[np.ndarray, np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        """
+        :return: path dependent logic applied on top of the targets (see kernels.StopLoss), None when there is none
+        """
+        return self._overlay
+
+    @property
+    def base_currency(self) -> str:
+        """
+        :return: currency of the loaded quotes, the vs_currency of the CoinGecko parameters, usd otherwise
+        """
+        return getattr(self._file_path, "vs_currency", None) or "usd"
+
+    @property
+    def currency(self) -> str:
+        """
+        :return: currency of the prices and levels of the backtest, the base currency by default
+        """
+        return self._currency or self.base_currency
+
+    @property
+    def optimizer(self) -> PortfolioOptimizer:
+        """
+        :return: optimizer of the target weights on the rebalancing dates, None for equal weights
+        """
+        return self._optimizer
+
+    @property
+    def quality(self) -> DataQuality:
+        """
+        :return: data quality stage run on the prices once loaded, None to use them as loaded
+        """
+        return self._quality
+
+    @property
+    def converter(self) -> CurrencyConverter:
+        if self._converter is None:
+            self._converter = CurrencyConverter()
+        return self._converter
+
 
 class Data:
     def __repr__(self):
@@ -305,7 +388,100 @@ class QuoteDataFactory(object):
 
     @staticmethod
     def group_by(iterable: Iterable, key_func: Callable[[Quote], str]):
-        return {_indexer: set(_grouper) for _indexer, _grouper in groupby(sorted(iterable, reverse=True), key=key_func)}
+        return {_indexer: set(_grouper) for _indexer, _grouper in bucket_by(iterable, key_func).items()}
+
+
+class QuoteIndex(object):
+    """
+    class QuoteIndex keeping, per product code, the sorted timestamps of the quote store (int64 nanoseconds)
+    next to the quotes, so range slicing and as-of lookups are binary searches instead of scans over quote_by_ts
+    """
+    def __init__(self):
+        self._ts_by_code: Dict[str, np.ndarray] = dict()
+        self._close_by_code: Dict[str, np.ndarray] = dict()
+        self._quotes_by_code: Dict[str, List[Quote]] = dict()
+
+    @classmethod
+    def from_quotes(cls, quotes: Iterable[Quote]) -> "QuoteIndex":
+        index = cls()
+        quotes_by_code = dict()
+        for quote in quotes:
+            quotes_by_code.setdefault(quote.key.product_code, list()).append(quote)
+        for product_code, _quotes in quotes_by_code.items():
+            ts = np.array([quote.key.ts.value for quote in _quotes], dtype=np.int64)
+            order = np.argsort(ts, kind="stable")
+            index.add(product_code, ts[order], [_quotes[position] for position in order])
+        return index
+
+    def add(self, product_code: str, ts: np.ndarray, quotes: List[Quote], close: np.ndarray = None):
+        """
+        :param ts: sorted int64 timestamps of the quotes
+        :param quotes: quotes of the product in the same order as ts
+        :param close: close prices in the same order as ts, read from the quotes by default
+        """
+        if len(ts) != len(quotes):
+            raise ValueError(f"{product_code}: {len(ts)} timestamps for {len(quotes)} quotes")
+        self._ts_by_code[product_code] = np.asarray(ts, dtype=np.int64)
+        self._close_by_code[product_code] = np.array([quote.close for quote in quotes], dtype=np.float64) \
+            if close is None else np.asarray(close, dtype=np.float64)
+        self._quotes_by_code[product_code] = list(quotes)
+
+    @property
+    def product_codes(self) -> List[str]:
+        return list(self._ts_by_code)
+
+    def timestamps(self, product_code: str) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self._ts_by_code[product_code].astype("datetime64[ns]"))
+
+    def _bounds(self, product_code: str, start: Timestamp = None, end: Timestamp = None):
+        ts = self._ts_by_code[product_code]
+        lo = 0 if start is None else int(np.searchsorted(ts, Timestamp(start).value, side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, Timestamp(end).value, side="right"))
+        return lo, hi
+
+    def between(self, product_code: str, start: Timestamp = None, end: Timestamp = None) -> List[Quote]:
+        """
+        :return: quotes of the product between start and end, both included, sorted by ts
+        """
+        lo, hi = self._bounds(product_code, start, end)
+        return self._quotes_by_code[product_code][lo:hi]
+
+    def closes(self, product_code: str, start: Timestamp = None, end: Timestamp = None) -> np.ndarray:
+        """
+        :return: close prices of the product between start and end as an array
+        """
+        lo, hi = self._bounds(product_code, start, end)
+        return self._close_by_code[product_code][lo:hi]
+
+    def close_matrix(self, product_codes: List[str], ts: np.ndarray) -> np.ndarray:
+        """
+        :param ts: sorted int64 timestamps
+        :return: (len(ts), len(product_codes)) last close at or before every timestamp, NaN before the first quote
+        """
+        matrix = np.full((len(ts), len(product_codes)), np.nan)
+        for column, product_code in enumerate(product_codes):
+            position = np.searchsorted(self._ts_by_code[product_code], ts, side="right") - 1
+            known = position >= 0
+            matrix[known, column] = self._close_by_code[product_code][position[known]]
+        return matrix
+
+    def quoted(self, product_codes: List[str], ts: np.ndarray) -> np.ndarray:
+        """
+        :return: (len(ts), len(product_codes)) True where the product has a quote exactly at the timestamp
+        """
+        matrix = np.zeros((len(ts), len(product_codes)), dtype=bool)
+        for column, product_code in enumerate(product_codes):
+            _ts = self._ts_by_code[product_code]
+            position = np.minimum(np.searchsorted(_ts, ts, side="left"), max(len(_ts) - 1, 0))
+            matrix[:, column] = _ts[position] == ts if len(_ts) else False
+        return matrix
+
+    def asof(self, product_code: str, ts: Timestamp) -> Union[Quote, None]:
+        """
+        :return: last quote of the product at or before ts, None when there is no quote before ts
+        """
+        position = int(np.searchsorted(self._ts_by_code[product_code], Timestamp(ts).value, side="right")) - 1
+        return self._quotes_by_code[product_code][position] if position >= 0 else None
 
 
 def read_csv_file(file_name: str) -> List[dict]:
@@ -318,7 +494,7 @@ def read_csv_file(file_name: str) -> List[dict]:
 
 
 def ohlc_CoinGecko(id: str = None, vs_currency: str = None, days: str = None):
-    client = CoinGeckoClient()
+    client = provider_registry.get(Provider.COINGECKO)()
     return client.get_ohlc(id, vs_currency, days)
 
 
@@ -349,6 +525,17 @@ def load_quote_CG(CGParams):
     return _dict_data
 
 
+def load_quote_batch(batch: OHLCBatch) -> List[Quote]:
+    """
+    :param batch: columnar bars returned by a DataSource
+    :return: list of Quote objects keyed by the product code of the batch
+    """
+    dates = batch.dates
+    return [Quote(key=QuoteKey(product_code=batch.product_code, ts=ts), open=_open, high=high, low=low, close=close)
+            for ts, _open, high, low, close in zip(dates, batch.open.tolist(), batch.high.tolist(),
+                                                   batch.low.tolist(), batch.close.tolist())]
+
+
 def print_close(quotes: List[Quote]):
     """
     function printing a list of closing quotes
@@ -596,7 +783,7 @@ class PositionFactory(object):
 
     @staticmethod
     def group_by(iterable: Iterable, key_func: Callable[[Position], str]):
-        return {_indexer: set(_grouper) for _indexer, _grouper in groupby(sorted(iterable, reverse=True), key=key_func)}
+        return {_indexer: set(_grouper) for _indexer, _grouper in bucket_by(iterable, key_func).items()}
 
 
 class ModelParameters:
@@ -687,6 +874,14 @@ class Backtester(object):
         self._quote_by_ts = dict()
         self._level_by_ts = dict()
         self._underlying_codes = list()
+        self._quote_index = QuoteIndex()
+        self._prices = None
+        self._weights = None
+        self._rebalance = None
+        self._levels = None
+        self._turnover = None
+        self._costs = None
+        self._quality_report = None
         Backtester.__post_init__(self)
 
     @property
@@ -713,6 +908,67 @@ class Backtester(object):
     def quote_by_ts(self) -> Dict[Timestamp, Set[Quote]]:
         return self._quote_by_ts
 
+    @property
+    def quote_index(self) -> QuoteIndex:
+        return self._quote_index
+
+    def quotes_between(self, product_code: str, start: Timestamp = None, end: Timestamp = None) -> List[Quote]:
+        """
+        :return: quotes of the product between start and end, both included
+        """
+        return self.quote_index.between(product_code, start, end)
+
+    def quote_asof(self, product_code: str, ts: Timestamp) -> Union[Quote, None]:
+        """
+        :return: last quote of the product at or before ts
+        """
+        return self.quote_index.asof(product_code, ts)
+
+    @property
+    def prices(self) -> pd.DataFrame:
+        """
+        :return: close of every underlying (columns) at every date of the calendar, last known close when missing
+                 or following the fill policy of the data quality stage of the config
+        """
+        return pd.DataFrame(self._prices, index=pd.DatetimeIndex(self.calendar), columns=self.underlyings_codes)
+
+    @property
+    def weights(self) -> pd.DataFrame:
+        """
+        :return: weight held in every underlying (columns) after the close of every date, the target weights on
+                 the rebalancing dates and the drifted ones in between, see compute_positions
+        """
+        return pd.DataFrame(self._weights, index=pd.DatetimeIndex(self.calendar), columns=self.underlyings_codes)
+
+    @property
+    def rebalance_dates(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.calendar)[self._rebalance]
+
+    @property
+    def levels(self) -> pd.Series:
+        return pd.Series(self._levels, index=pd.DatetimeIndex(self.calendar), name=self.config.strategy_name)
+
+    @property
+    def turnover(self) -> pd.Series:
+        """
+        :return: sum of the absolute weights traded at every close, from the drifted weights to the targets
+        """
+        return pd.Series(self._turnover, index=pd.DatetimeIndex(self.calendar), name="turnover")
+
+    @property
+    def costs(self) -> pd.Series:
+        """
+        :return: fees and slippage paid at every close as a fraction of the level
+        """
+        return pd.Series(self._costs, index=pd.DatetimeIndex(self.calendar), name="costs")
+
+    @property
+    def quality_report(self) -> Union[QualityReport, None]:
+        """
+        :return: gaps, filled prices and outliers found by the data quality stage of the config
+        """
+        return self._quality_report
+
     @property
     def calendar(self) -> List[Timestamp]:
         return self._calendar
@@ -725,74 +981,155 @@ class Backtester(object):
     def config(self) -> BacktesterConfig:
         return self._config
 
+    @property
+    def profiler(self) -> Profiler:
+        return self.config.profiler
+
+    @property
+    def profile(self) -> Union[ProfileReport, None]:
+        """
+        :return: wall time, cpu time, allocations and object counts per stage when the config has a profiler
+        """
+        return None if self.profiler is None else self.profiler.report
+
     def __post_init__(self):
-        self.calendar = CalendarBuilder.from_config(self.config)
+        self._compute_calendar()
         self._load_quotes()
         self._load_underlying_codes()
         self._update_calendar()
+        self._load_prices()
+        self._check_quality()
+
+    @profiled()
+    def _compute_calendar(self):
+        self.calendar = CalendarBuilder.from_config(self.config)
 
+    @profiled()
     def _load_underlying_codes(self):
-        self._underlying_codes = list(set(map(lambda quote: quote.key.product_code, self.quote_by_key.values())))
+        # sorted so the columns of the price and weight matrices do not depend on the set order
+        self._underlying_codes = sorted(set(map(lambda quote: quote.key.product_code, self.quote_by_key.values())))
 
+    @profiled()
     def _update_calendar(self):
-        self._calendar = sorted(set(self.calendar).intersection(set(self.quote_by_ts.keys())))
+        if self.config.quality is None:
+            self._calendar = sorted(set(self.calendar).intersection(set(self.quote_by_ts.keys())))
+        else:
+            # the dates without quote are kept for the data quality stage to report and fill
+            first, last = min(self.quote_by_ts), max(self.quote_by_ts)
+            self._calendar = [ts for ts in self.calendar if first <= ts <= last]
         self.config.start_date = min(self.calendar)
         self.config.end_date = max(self.calendar)
 
+    def _calendar_ts(self) -> np.ndarray:
+        return np.array([ts.value for ts in self.calendar], dtype=np.int64)
+
+    @profiled()
+    def _load_prices(self):
+        """
+        Close matrix of the calendar, re-denominated in the currency of the config (the quotes stay in the base
+        currency)
+        """
+        self._prices = self.quote_index.close_matrix(self.underlyings_codes, self._calendar_ts())
+        if self.config.currency != self.config.base_currency:
+            self._prices = self.config.converter.convert(self._prices, self._calendar_ts(), self.config.base_currency,
+                                                         self.config.currency)
+
+    @profiled()
+    def _check_quality(self):
+        if self.config.quality is not None:
+            quoted = self.quote_index.quoted(self.underlyings_codes, self._calendar_ts())
+            self._prices, self._quality_report = self.config.quality.clean(
+                pd.DatetimeIndex(self.calendar), self._prices, quoted, self.underlyings_codes)
+
+    def prices_in(self, currency: str) -> pd.DataFrame:
+        """
+        :return: prices of the backtest re-denominated in another currency at the historical rates
+        """
+        prices = self.config.converter.convert(self._prices, self._calendar_ts(), self.config.currency, currency)
+        return pd.DataFrame(prices, index=pd.DatetimeIndex(self.calendar), columns=self.underlyings_codes)
+
+    @profiled()
     def _load_quotes(self):
-        quotes = load_quote_CG(CGParams=self.config.file_path)
-        #quotes = load_quote(file_name=self.config.file_path)
-        self._quote_by_ts = QuoteDataFactory.group_by(quotes, lambda quote: quote.key.ts)
+        quotes = list()
+        ts_codes = list()
+        for product_code in self.config.product_code:
+            source = data_source_registry.get(self.config.provider_for(product_code))
+            batch = source.load(product_code, self.config.file_path, start=self.config.start_date,
+                                end=self.config.end_date)
+            batch_quotes = load_quote_batch(batch)
+            self._quote_index.add(product_code, batch.ts, batch_quotes, batch.close)
+            quotes.extend(batch_quotes)
+            ts_codes.append(batch.ts)
+        groups = group_codes(np.concatenate(ts_codes) if ts_codes else np.empty(0, dtype=np.int64))
+        self._quote_by_ts = {Timestamp(int(ts)): {quotes[position] for position in positions}
+                             for ts, positions in reversed(list(groups))}
         self._quote_by_key = {quote.key: quote for quote in quotes}
 
+    @profiled()
     def compute_positions(self):
-        for ts in self.calendar:
-            quotes_set = self.quote_by_ts.get(ts)
-            """
-            Example of quotes_set object
-            quote_set = {
-                Quote(id=QuoteId("AAPL", datetime.now(timezone.utc), Provider.YAHOO), close=100),
-                Quote(id=QuoteId("AAPL", datetime.now(timezone.utc), Provider.YAHOO), close=101)
-            }
-            """
-            nb_components = len(quotes_set)
-            for quote in quotes_set:
-                key = PositionKey(product_code=self.config.strategy_name, underlying_code=quote.key.product_code, ts=ts)
-                self.position_by_key[key] = Position(key, value=1 / nb_components)
-
-        self._position_by_ts = PositionFactory.group_by(self.position_by_key.values(), lambda position: position.key.ts)
+        """
+        Weight the underlyings quoted on the rebalancing dates of the config, equally or with the optimizer of
+        the config, the weights drift with the prices in between
+        """
+        calendar = pd.DatetimeIndex(self.calendar)
+        quoted = self.quote_index.quoted(self.underlyings_codes, self._calendar_ts()) \
+            if self._quality_report is None else self._quality_report.valid
+        # the positions are valued at the last valid close, whatever the fill policy of the data quality stage
+        prices = forward_fill(self._prices)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            targets = np.where(quoted, 1 / quoted.sum(axis=1, keepdims=True), 0.0)
+        if self.config.optimizer is not None:
+            # optimized on the dates of the schedule, a drift threshold then compares with the optimized targets
+            dates = self.config.rebalancing.mask(calendar, prices, targets)
+            targets = self.config.optimizer.targets(self._prices, quoted, dates)
+        self._rebalance = self.config.rebalancing.mask(calendar, prices, targets)
+        # nothing can be traded on a date without any quote, the portfolio drifts until the next rebalancing
+        self._rebalance[1:] &= quoted[1:].any(axis=1)
+        if self.config.overlay is None:
+            self._weights = hold_weights(prices, targets, self._rebalance)
+        else:
+            # the overlay also trades out of the rebalancing dates, eg: when a stop loss is hit
+            self._weights, self._rebalance = self.config.overlay(prices, targets, self._rebalance)
+        self._positions_from_weights(np.where(self._rebalance[:, None], self._weights, 0.0))
         return self
 
+    def _positions_from_weights(self, weights: np.ndarray):
+        """
+        Build the Position objects of the non zero weights, grouped by ts latest first like quote_by_ts
+        """
+        self._position_by_key = dict()
+        position_by_ts = dict()
+        rows, columns = np.nonzero(weights)
+        values = weights[rows, columns].tolist()
+        for row, column, value in zip(rows.tolist(), columns.tolist(), values):
+            ts = self.calendar[row]
+            key = PositionKey(product_code=self.config.strategy_name, underlying_code=self.underlyings_codes[column],
+                              ts=ts)
+            self.position_by_key[key] = Position(key, value=value)
+            position_by_ts.setdefault(ts, set()).add(self.position_by_key[key])
+        self._position_by_ts = dict(reversed(list(position_by_ts.items())))
+
+    @profiled()
     def compute_levels(self, basis: int = 100):
         """
-        Compute levels from yahoo finance
+        Compute the levels from the close prices and the weights of compute_positions, net of the fees and
+        slippage of the cost model of the config, in one vectorized pass over the price and weight matrices
         -> only close supported yet
         to do : adapt for the other time of data we can read from API endpoints and csv files
-        :param basis:
+        :param basis: level of the first date
         :return: Quote(QuoteKey(product_code=self.config.strategy_name, ts=ts), close=value_of_strat)
         """
-        for index in range(len(self.calendar)):
-            ts: Timestamp = self.calendar[index]
-            if ts == self.config.start_date:
-                key = QuoteKey(product_code=self.config.strategy_name, ts=ts)
-                self.level_by_ts[ts] = Quote(key, close=basis)
-            else:
-                for underlying_code in self.underlyings_codes:
-                    _previous_ts: Timestamp = self.calendar[index - 1]
-                    _previous_position_key = PositionKey(product_code=self.config.strategy_name,
-                                                         underlying_code=underlying_code,
-                                                         ts=_previous_ts
-                                                         )
-
-                    _previous_quote_key = QuoteKey(product_code=underlying_code, ts=_previous_ts)
-                    _current_quote_key = QuoteKey(product_code=underlying_code, ts=ts)
-                    _perf = self.position_by_key.get(_previous_position_key).value * (
-                            self.quote_by_key.get(_current_quote_key).close / self.quote_by_key.get(
-                        _previous_quote_key).close - 1)
-
-                    value_of_strat = self.level_by_ts.get(_previous_ts).close * (1 + _perf)
-                    self.level_by_ts[ts] = Quote(QuoteKey(product_code=self.config.strategy_name, ts=ts),
-                                                 close=value_of_strat)
+        if self._weights is None:
+            self.compute_positions()
+        cost_model = self.config.cost_model
+        rates = None if cost_model is None else cost_model.rates(self.underlyings_codes)
+        self._levels, self._turnover, self._costs = level_path(forward_fill(self._prices), self._weights, rates,
+                                                               basis, self._rebalance)
+        self._level_by_ts = {ts: Quote(QuoteKey(product_code=self.config.strategy_name, ts=ts), close=level)
+                             for ts, level in zip(self.calendar, self._levels.tolist())}
+        if self.profiler is not None:
+            # the levels are the last step of a run, write the cProfile/pyinstrument trace if one is recorded
+            self.profiler.dump(self.config.strategy_name)
 
     def _compute_performance(
             self,
@@ -0,0 +1,152 @@
+"""
+Memory-mapped bar archive
+
+File layout (little endian):
+    header   : magic b"BARS" | version uint32 | number of symbols uint32 | reserved uint32     (16 bytes)
+    index    : one 64 bytes entry per symbol: product code (48 bytes utf-8, zero padded) | offset uint64 | count uint64
+    columns  : per symbol, count int64 timestamps (ns since epoch, sorted) followed by
+               count float64 open, high, low, close and volume
+
+Opening an archive only reads the header and the index, the columns are memory-mapped and the date range
+of a request is found by binary search on the timestamps, so only the pages of that range are read from disk
+"""
+import os
+import shutil
+import struct
+import tempfile
+from contextlib import ExitStack
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+from pandas import Timestamp
+
+from datasources import OHLCBatch
+
+MAGIC = b"BARS"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+ENTRY = struct.Struct("<48sQQ")
+COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+class BarStore(object):
+    """
+    class BarStore giving read access to a bar archive without loading it
+    """
+    def __init__(self, path: str):
+        self._path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, nb_symbols, _ = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a bar archive version {VERSION}")
+        self._index = dict()
+        for position in range(nb_symbols):
+            code, offset, count = ENTRY.unpack_from(self._data, HEADER.size + position * ENTRY.size)
+            self._index[code.rstrip(b"\0").decode("utf-8")] = (offset, count)
+
+    @classmethod
+    def open(cls, path: str) -> "BarStore":
+        return cls(path)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def product_codes(self) -> List[str]:
+        return list(self._index)
+
+    def __contains__(self, product_code: str) -> bool:
+        return product_code in self._index
+
+    def _column(self, offset: int, count: int, position: int, dtype) -> np.ndarray:
+        start = offset + position * count * 8
+        return self._data[start:start + count * 8].view(dtype)
+
+    def batch(self, product_code: str, start: Timestamp = None, end: Timestamp = None) -> OHLCBatch:
+        """
+        :return: OHLCBatch whose columns are views on the memory-mapped file, restricted to [start, end]
+        """
+        if product_code not in self._index:
+            raise KeyError(f"{product_code} is not stored in {self.path}")
+        offset, count = self._index[product_code]
+        ts = self._column(offset, count, 0, "<i8")
+        lo = 0 if start is None else int(np.searchsorted(ts, Timestamp(start).value, side="left"))
+        hi = count if end is None else int(np.searchsorted(ts, Timestamp(end).value, side="right"))
+        columns = {name: self._column(offset, count, position + 1, "<f8")[lo:hi]
+                   for position, name in enumerate(COLUMNS)}
+        return OHLCBatch(product_code=product_code, ts=ts[lo:hi], **columns)
+
+
+def _padded(code: str) -> bytes:
+    encoded = code.encode("utf-8")
+    if len(encoded) > 48:
+        raise ValueError(f"product code {code} is longer than 48 bytes")
+    return encoded
+
+
+def write_bars(path: str, batches: Iterable[OHLCBatch]):
+    """
+    Write batches already loaded in memory to a bar archive
+    """
+    batches = list(batches)
+    offset = HEADER.size + ENTRY.size * len(batches)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(batches), 0))
+        for batch in batches:
+            file.write(ENTRY.pack(_padded(batch.product_code), offset, len(batch)))
+            offset += len(batch) * 8 * (len(COLUMNS) + 1)
+        for batch in batches:
+            file.write(np.ascontiguousarray(batch.ts, dtype="<i8").tobytes())
+            for name in COLUMNS:
+                column = getattr(batch, name)
+                column = np.full(len(batch), np.nan) if column is None else column
+                file.write(np.ascontiguousarray(column, dtype="<f8").tobytes())
+
+
+def convert_csv(path: str, csv_by_code: Dict[str, str], chunksize: int = 1_000_000) -> BarStore:
+    """
+    Convert csv files (Date, Open, High, Low, Close[, Volume] columns, sorted by Date) to a bar archive
+    The files are streamed by chunks so the memory used does not depend on the size of the history, every chunk
+    is sorted (see OHLCBatch) but a ValueError is raised when a chunk starts before the end of the previous one
+    :param path: path of the archive to write
+    :param csv_by_code: csv path by product code
+    :param chunksize: number of rows parsed at once
+    :return: BarStore opened on the new archive
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as spool:
+        counts = dict()
+        for code, csv_path in csv_by_code.items():
+            with ExitStack() as stack:
+                columns = {name: stack.enter_context(open(os.path.join(spool, f"{len(counts)}.{name}"), "wb"))
+                           for name in ("ts",) + COLUMNS}
+                counts[code] = 0
+                last = None
+                for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+                    batch = OHLCBatch.from_frame(code, chunk)
+                    if len(batch) == 0:
+                        continue
+                    # the ranges are found by binary search, the whole file must be sorted not only every chunk
+                    if last is not None and batch.ts[0] < last:
+                        raise ValueError(f"dates of {csv_path} should be sorted, {Timestamp(int(batch.ts[0]))} "
+                                         f"comes after {Timestamp(int(last))}")
+                    last = batch.ts[-1]
+                    columns["ts"].write(batch.ts.astype("<i8").tobytes())
+                    for name in COLUMNS:
+                        column = getattr(batch, name)
+                        column = np.full(len(batch), np.nan) if column is None else column
+                        columns[name].write(column.astype("<f8").tobytes())
+                    counts[code] += len(batch)
+
+        offset = HEADER.size + ENTRY.size * len(counts)
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(counts), 0))
+            for code, count in counts.items():
+                file.write(ENTRY.pack(_padded(code), offset, count))
+                offset += count * 8 * (len(COLUMNS) + 1)
+            for position in range(len(counts)):
+                for name in ("ts",) + COLUMNS:
+                    with open(os.path.join(spool, f"{position}.{name}"), "rb") as column:
+                        shutil.copyfileobj(column, file)
+    return BarStore.open(path)
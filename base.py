@@ -1,12 +1,205 @@
+import asyncio
+import json
+import logging
+import threading
 from abc import ABCMeta, abstractmethod
-from typing import Union
+from time import perf_counter
+from string import Formatter
+from typing import Callable, Dict, Hashable, List, Union
+from urllib.parse import quote, urlencode
 #from authlib.integrations.requests_client import OAuth2Session
 from requests import Response
+from urllib3.response import HTTPResponse
+from instrumentation import RequestEvent
 from models.security import *
 
+logger = logging.getLogger(__name__)
+
+
+def _json_backends() -> Dict[str, Callable[[bytes], object]]:
+    """
+    :return: available json decoders taking the raw body, fastest first
+    """
+    backends = dict()
+    try:
+        import orjson
+        backends["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    try:
+        import ujson
+        backends["ujson"] = ujson.loads
+    except ImportError:
+        pass
+    backends["json"] = json.loads
+    return backends
+
+
+JSON_BACKENDS = _json_backends()
+
+# compressions urllib3 is able to decode here: gzip and deflate always, br and zstd when brotli/zstandard are installed
+ACCEPT_ENCODING = ", ".join(encoding for encoding in ("gzip", "deflate", "br", "zstd")
+                            if encoding in HTTPResponse.CONTENT_DECODERS)
+
+
+# parameters holding comma separated lists where the order and the duplicates do not matter
+LIST_PARAMETERS = frozenset({"ids", "vs_currencies", "contract_addresses", "exchange_ids", "price_change_percentage"})
+
+
+def canonical_value(value, is_list: bool = False) -> Union[str, None]:
+    """
+    Canonical text of a request parameter so that equivalent calls produce the same url:
+    booleans are 'true'/'false', None and empty values are dropped (None returned), other values are stripped
+    :param is_list: the value is a comma separated list (or a python collection) whose items are stripped,
+                    deduplicated and sorted, other collections are joined in their order
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [str(item) for item in value]
+    else:
+        items = str(value).split(',') if is_list else [str(value)]
+    items = [item.strip() for item in items if item.strip()]
+    if is_list:
+        items = sorted(dict.fromkeys(items))
+    text = ','.join(items)
+    if text.lower() in ('true', 'false'):
+        return text.lower()
+    return text or None
+
+
+class RequestSpec(object):
+    """
+    class RequestSpec: canonical description of a GET request built from a route template and parameters
+    parameters named in the template are path parameters, the others are query parameters, sorted by name,
+    the parameters of list_parameters are canonical lists (see canonical_value)
+    eg: RequestSpec("coins/{id}/ohlc", id="bitcoin", vs_currency="usd", days=365)
+    """
+    list_parameters = LIST_PARAMETERS
+
+    def __init__(self, route: str, **params):
+        self._route = route
+        path_names = {name for _, name, _, _ in Formatter().parse(route) if name}
+        missing = path_names - params.keys()
+        if missing:
+            raise ValueError(f"{route} needs the path parameters {sorted(missing)}")
+        self._path = route.format(**{name: quote(str(params[name]).strip(), safe='') for name in path_names})
+        query = {name: canonical_value(value, name in self.list_parameters) for name, value in params.items()
+                 if name not in path_names}
+        self._query = sorted((name, value) for name, value in query.items() if value is not None)
+
+    @property
+    def endpoint(self) -> str:
+        """
+        :return: route template, the label of the endpoint in the instrumentation
+        """
+        return self._route
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def query(self) -> str:
+        return urlencode(self._query, safe=',', quote_via=quote)
+
+    @property
+    def cache_key(self) -> str:
+        """
+        :return: stable key of the request, independent of the base url and of the order of the parameters
+        """
+        return f"{self._path}?{self.query}" if self._query else self._path
+
+    def url(self, base_url: str) -> str:
+        return base_url + self.cache_key
+
+    def __repr__(self):
+        return f"RequestSpec({self.cache_key})"
+
+    def __eq__(self, other):
+        return self.cache_key == other.cache_key if isinstance(other, self.__class__) else False
+
+    def __hash__(self):
+        return hash(self.cache_key)
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    class SingleFlight: identical concurrent calls (same key) share one execution, the first caller runs it
+    and the others wait for its result (or its exception), from threads with do() or from coroutines with ado()
+    The result is shared between the callers, it must be treated as read-only
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = dict()
+        self._futures: Dict[Hashable, asyncio.Future] = dict()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, func: Callable, *args, **kwargs):
+        """
+        Coroutine version of do: waiters do not hold a thread, the first caller starts func in the default executor
+        through do() so that it is also shared with the threads calling do() with the same key
+        Every caller, the first one included, waits for the shared future behind a shield: a cancelled caller
+        only stops waiting, the call goes on and its result (or its exception) is given to the others
+        """
+        loop = asyncio.get_running_loop()
+        future = self._futures.get((loop, key))
+        if future is None:
+            future = self._futures[(loop, key)] = loop.create_future()
+            call = loop.run_in_executor(None, lambda: self.do(key, func, *args, **kwargs))
+            call.add_done_callback(lambda done: self._resolve(loop, key, future, done))
+        return await asyncio.shield(future)
+
+    def _resolve(self, loop: asyncio.AbstractEventLoop, key: Hashable, future: asyncio.Future,
+                 done: asyncio.Future):
+        del self._futures[(loop, key)]
+        if done.cancelled():
+            future.cancel()
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+            future.exception()  # mark it retrieved when nobody is waiting anymore
+        else:
+            future.set_result(done.result())
+
 
 class BaseClient(metaclass=ABCMeta):
     base_url = None
+    # callables receiving a RequestEvent after every request, shared by all the clients
+    hooks: List[Callable[[RequestEvent], None]] = list()
+    # identical requests in flight at the same time are sent once, shared by all the clients
+    single_flight = SingleFlight()
+    # decoder of the response bodies, see set_json_backend
+    json_loads: Callable[[bytes], object] = staticmethod(next(iter(JSON_BACKENDS.values())))
 
     @property
     @abstractmethod
@@ -17,25 +210,177 @@ class BaseClient(metaclass=ABCMeta):
     def _get_url(self, route):
         raise NotImplementedError
 
-    @staticmethod
-    def _handle_response(response: Response):
+    @classmethod
+    def add_hook(cls, hook: Callable[[RequestEvent], None]):
+        BaseClient.hooks.append(hook)
+
+    @classmethod
+    def remove_hook(cls, hook: Callable[[RequestEvent], None]):
+        BaseClient.hooks.remove(hook)
+
+    @classmethod
+    def set_json_backend(cls, backend: Union[str, Callable[[bytes], object]]):
+        """
+        :param backend: "orjson", "ujson", "json" or any callable decoding the raw body
+        """
+        if isinstance(backend, str):
+            if backend not in JSON_BACKENDS:
+                raise ValueError(f"json backend {backend} is not installed, available : {list(JSON_BACKENDS)}")
+            backend = JSON_BACKENDS[backend]
+        BaseClient.json_loads = staticmethod(backend)
+
+    def _handle_response(self, response: Response, raw: bool = False):
+        """
+        :param raw: return the body bytes (decompressed) instead of the decoded json
+        :return: decoded body, None when the request failed
+        """
         if response.status_code == 200 or response.status_code == 201:
-            print(response.json())
-            return response.json()
+            if raw:
+                return response.content
+            data = self.json_loads(response.content)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("response : %s", data)
+            return data
         else:
-            print(response.json())
-
-    def _get(self, route, **kwargs) -> object:
-        url = self._get_url(route)
-        print(f'request : {url}')
-        response = self.session.get(url, **kwargs)
-        return self._handle_response(response)
-
-    def _geturl(self, route, **kwargs) -> object:
-        url = route
-        print(f'request : {url}')
-        response = self.session.get(url, **kwargs)
-        return self._handle_response(response)
+            logger.warning("request %s failed with status %s : %.200s", response.url, response.status_code,
+                           response.text)
+
+    def _endpoint(self, url: str) -> str:
+        route = url[len(self.base_url):] if self.base_url and url.startswith(self.base_url) else url
+        return route.split("?")[0].strip()
+
+    def _emit(self, event: RequestEvent):
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("instrumentation hook %s failed", hook)
+
+    def _flight_scope(self) -> Hashable:
+        """
+        :return: what the response depends on besides the url and the request arguments, the headers, auth and
+                 cookies of the session: requests of different scopes are never shared
+        """
+        # the session is held by the caller for the whole call, its id cannot be reused while the call is in flight
+        return type(self).__name__, id(self.session)
+
+    def _request_key(self, url: str, **kwargs) -> Hashable:
+        return (self._flight_scope(), url, tuple(sorted((name, repr(value)) for name, value in kwargs.items())))
+
+    def _request(self, url: str, endpoint: str = None, raw: bool = False, **kwargs) -> object:
+        """
+        Send the GET request, concurrent identical requests share one http call and its decoded result
+        """
+        key = self._request_key(url, raw=raw, **kwargs)
+        if not self.hooks:
+            return self.single_flight.do(key, self._send, url, endpoint, raw, **kwargs)
+        sent, start = list(), perf_counter()
+        try:
+            data = self.single_flight.do(key, self._send_once, sent, url, endpoint, raw, **kwargs)
+        except Exception as error:
+            self._emit_shared(sent, url, endpoint, start, error)
+            raise
+        self._emit_shared(sent, url, endpoint, start)
+        return data
+
+    def _send_once(self, sent: list, url: str, endpoint: str = None, raw: bool = False, **kwargs) -> object:
+        sent.append(url)
+        return self._send(url, endpoint, raw, **kwargs)
+
+    def _emit_shared(self, sent: list, url: str, endpoint: str, start: float, error: Exception = None):
+        """
+        Emit the RequestEvent of a caller which got the result of an identical request in flight instead of
+        sending its own (a cache hit without status)
+        """
+        if sent:
+            return
+        self._emit(RequestEvent(endpoint=endpoint or self._endpoint(url), url=url, cache_hit=True,
+                                total=perf_counter() - start, error=None if error is None else type(error).__name__))
+
+    def _send(self, url: str, endpoint: str = None, raw: bool = False, **kwargs) -> object:
+        """
+        Send the GET request asking for a compressed response and decode the body once,
+        timing every phase when hooks are registered
+        :param endpoint: label of the endpoint in the RequestEvent, the route of the url by default
+        :param raw: return the body bytes instead of the decoded json
+        """
+        logger.debug("request : %s", url)
+        kwargs["headers"] = {"Accept-Encoding": ACCEPT_ENCODING, **kwargs.get("headers", dict())}
+        if not self.hooks:
+            return self._handle_response(self.session.get(url, **kwargs), raw)
+
+        event = RequestEvent(endpoint=endpoint or self._endpoint(url), url=url)
+        start = perf_counter()
+        try:
+            response = self.session.get(url, stream=True, **kwargs)
+            event.ttfb = perf_counter() - start
+            event.status = response.status_code
+            event.response_bytes = len(response.content)
+            event.download = perf_counter() - start - event.ttfb
+            event.wire_bytes = int(response.headers.get("Content-Length", 0)) or None
+            event.content_encoding = response.headers.get("Content-Encoding")
+            # requests-cache sessions flag the responses they serve, the others always go to the network
+            event.cache_hit = bool(getattr(response, "from_cache", False))
+            # retries of the urllib3 Retry mounted on the session adapter, if any
+            retries = getattr(getattr(response, "raw", None), "retries", None)
+            event.retries = len(retries.history) if retries is not None else 0
+            parse_start = perf_counter()
+            data = self._handle_response(response, raw)
+            event.parse = perf_counter() - parse_start
+            return data
+        except Exception as error:
+            event.error = type(error).__name__
+            raise
+        finally:
+            event.total = perf_counter() - start
+            self._emit(event)
+
+    def _fetch(self, spec: RequestSpec, **kwargs) -> object:
+        return self._request(spec.url(self.base_url), endpoint=spec.endpoint, **kwargs)
+
+    def fetch_raw(self, spec: RequestSpec, **kwargs) -> bytes:
+        """
+        :return: body of the response as received (after transport decompression), not decoded,
+                 for callers persisting the payloads
+        """
+        return self._request(spec.url(self.base_url), endpoint=spec.endpoint, raw=True, **kwargs)
+
+    async def _afetch(self, spec: RequestSpec, **kwargs) -> object:
+        return await self._ageturl(spec.url(self.base_url), endpoint=spec.endpoint, **kwargs)
+
+    def _get(self, route, endpoint: str = None, **kwargs) -> object:
+        return self._request(self._get_url(route), endpoint=endpoint, **kwargs)
+
+    def _geturl(self, route, endpoint: str = None, **kwargs) -> object:
+        return self._request(route, endpoint=endpoint, **kwargs)
+
+    async def _aget(self, route, endpoint: str = None, raw: bool = False, **kwargs) -> object:
+        return await self._ageturl(self._get_url(route), endpoint=endpoint, raw=raw, **kwargs)
+
+    async def _ageturl(self, route, endpoint: str = None, raw: bool = False, **kwargs) -> object:
+        """
+        Coroutine version of _request, shares the http call with the threads requesting the same url
+        """
+        key = self._request_key(route, raw=raw, **kwargs)
+        if not self.hooks:
+            return await self.single_flight.ado(key, self._send, route, endpoint, raw, **kwargs)
+        sent, start = list(), perf_counter()
+        try:
+            data = await self.single_flight.ado(key, self._send_once, sent, route, endpoint, raw, **kwargs)
+        except Exception as error:
+            self._emit_shared(sent, route, endpoint, start, error)
+            raise
+        self._emit_shared(sent, route, endpoint, start)
+        return data
+
+    async def acall(self, method: str, *args, **kwargs) -> object:
+        """
+        Run an endpoint method from a coroutine, identical concurrent calls share one execution
+        eg: await client.acall("get_ohlc", "bitcoin", "usd", 365)
+        """
+        key = (self._flight_scope(), self.base_url, method, tuple(map(repr, args)),
+               tuple(sorted((name, repr(value)) for name, value in kwargs.items())))
+        return await self.single_flight.ado(key, getattr(self, method), *args, **kwargs)
 
 
 
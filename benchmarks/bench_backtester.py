@@ -0,0 +1,102 @@
+"""
+Benchmark of the Backtester hot paths on synthetic market data
+
+Every stage is timed separately (best of --repeat runs) and its peak traced memory is measured in a separate run
+with tracemalloc, so tracing does not distort the timings. Results can be saved as a baseline and later runs
+compared to it: a stage slower or heavier than baseline * (1 + tolerance) is reported as a regression.
+
+run from the repository root:
+    python benchmarks/bench_backtester.py --coins 10 --bars 2000 --save benchmarks/baseline.json
+    python benchmarks/bench_backtester.py --coins 10 --bars 2000 --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import synthetic_config  # noqa: E402
+from Backtester import Backtester, Calendar, Frequency, QuoteDataFactory  # noqa: E402
+
+
+def measure(stage: Callable, repeat: int) -> Dict[str, float]:
+    """
+    :return: best wall time in seconds and peak traced memory in MiB of the stage
+    """
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(timings), "peak_mib": peak / 2 ** 20}
+
+
+def stages(backtester: Backtester) -> Dict[str, Callable]:
+    config = backtester.config
+    quotes = list(backtester.quote_by_key.values())
+    return {
+        "compute_calendar": lambda: Calendar(config.start_date, config.end_date, config.frequency).compute_calendar(),
+        "_load_quotes": backtester._load_quotes,
+        "compute_positions": backtester.compute_positions,
+        "compute_levels": backtester.compute_levels,
+        "group_by": lambda: QuoteDataFactory.group_by(quotes, lambda quote: quote.key.ts),
+    }
+
+
+def run(nb_coins: int, nb_bars: int, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    results = dict()
+    for frequency in Frequency:
+        backtester = Backtester(config=synthetic_config(nb_coins, nb_bars, frequency))
+        backtester.compute_positions()
+        for name, stage in stages(backtester).items():
+            results[f"{frequency.value}.{name}"] = measure(stage, repeat)
+    return results
+
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> Dict[str, str]:
+    found = dict()
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(case, {}).get(metric)
+            if reference is not None and value > reference * (1 + tolerance):
+                found[f"{case}.{metric}"] = f"{value:.4f} > {reference:.4f} * {1 + tolerance}"
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coins", type=int, default=10)
+    parser.add_argument("--bars", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", help="json file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save", help="json file where the results are written")
+    args = parser.parse_args()
+
+    results = run(args.coins, args.bars, args.repeat)
+    print(f"{'stage':<32}{'seconds':>12}{'peak MiB':>12}")
+    for case, metrics in results.items():
+        print(f"{case:<32}{metrics['seconds']:>12.4f}{metrics['peak_mib']:>12.2f}")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"coins": args.coins, "bars": args.bars, "results": results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if (baseline["coins"], baseline["bars"]) != (args.coins, args.bars):
+            sys.exit(f"baseline was measured on {baseline['coins']} coins x {baseline['bars']} bars")
+        found = regressions(results, baseline["results"], args.tolerance)
+        for name, message in found.items():
+            print(f"REGRESSION {name}: {message}")
+        sys.exit(1 if found else 0)
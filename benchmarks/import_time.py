@@ -0,0 +1,71 @@
+"""
+Cold start benchmark: measures the import time of the modules loaded by the API server and the Backtester
+with `python -X importtime` and fails when a budget is exceeded or when a lazily loaded provider library
+(yfinance, investpy, matplotlib...) ends up in the import path again
+
+run from the repository root:
+    python benchmarks/import_time.py
+"""
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# models/app.py imports its routers as a top level module, as when the server is started from models/
+ENV = {**os.environ, "PYTHONPATH": os.pathsep.join([ROOT, os.path.join(ROOT, "models")])}
+
+# cumulative import time budget in milliseconds per module, measured in a fresh interpreter
+IMPORT_BUDGET_MS = {
+    "providers": 50,
+    "Backtester": 1500,
+    "models.routers": 1500,
+    "models.app": 1500,
+}
+
+# modules that must only be imported once the matching Provider is selected
+LAZY_MODULES = ["yfinance", "investpy", "matplotlib", "geckoclient", "requests"]
+
+
+def import_time(module: str, repeat: int = 3) -> float:
+    """
+    :param module: top level module imported in a fresh interpreter
+    :param repeat: number of runs, the best one is kept to remove the noise of the machine
+    :return: cumulative import time in milliseconds
+    """
+    timings = list()
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=ROOT, env=ENV, capture_output=True, text=True, check=True)
+        for line in completed.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == module and not fields[2].startswith("  "):
+                timings.append(int(fields[1]) / 1000)
+    return min(timings)
+
+
+def imported_modules(module: str) -> List[str]:
+    completed = subprocess.run([sys.executable, "-c", f"import sys, {module}; print('\\n'.join(sys.modules))"],
+                               cwd=ROOT, env=ENV, capture_output=True, text=True, check=True)
+    return completed.stdout.split()
+
+
+def run(budget: Dict[str, float] = None) -> bool:
+    budget = IMPORT_BUDGET_MS if budget is None else budget
+    success = True
+    for module, limit in budget.items():
+        elapsed = import_time(module)
+        status = "ok" if elapsed <= limit else "OVER BUDGET"
+        success &= elapsed <= limit
+        print(f"{module:<20} {elapsed:>10.1f} ms  (budget {limit} ms)  {status}")
+
+        eager = sorted(set(LAZY_MODULES).intersection(imported_modules(module)))
+        if eager:
+            success = False
+            print(f"{module:<20} eagerly imports {', '.join(eager)}")
+    return success
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
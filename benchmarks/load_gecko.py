@@ -0,0 +1,169 @@
+"""
+Load test of CoinGeckoClient against the mock server of mock_gecko.py (started in process unless --url is given)
+
+Three clients are compared on the same calls, sent as identical concurrent requests: the single flight of
+BaseClient is bypassed by default so every call is an http request, --single-flight keeps it and measures the
+requests it merges instead
+    sync    CoinGeckoClient opening a new Session for every request, the default behaviour
+    pooled  CoinGeckoClient sharing one Session, so connections are kept alive and reused
+    acall   asyncio tasks awaiting the coroutine API of the pooled client (BaseClient.acall), the http calls
+            themselves are blocking and run in the default executor
+
+run from the repository root:
+    python benchmarks/load_gecko.py --requests 500 --concurrency 16 --latency 0.01 --rate-limit 0.01
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+# the clients live at the repository root, the mock server next to this file
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gecko import MockSettings, create_app  # noqa: E402
+from base import BaseClient, SingleFlight  # noqa: E402
+from geckoclient import CoinGeckoClient  # noqa: E402
+
+# endpoint -> (method of CoinGeckoClient, keyword arguments)
+CALLS: Dict[str, Tuple[str, Dict]] = {
+    "ping": ("ping", {}),
+    "price": ("get_price", {"ids": "bitcoin,ethereum", "vs_currencies": "usd"}),
+    "markets": ("get_markets", {"vs_currency": "usd", "ids": "bitcoin,ethereum"}),
+    "ohlc": ("get_ohlc", {"id": "bitcoin", "vs_currency": "usd", "days": 365}),
+    "coins_list": ("get_list", {}),
+    "derivatives": ("get_derivatives_tickers", {}),
+    "exchange_volume_chart": ("get_exchange_volume_chart", {"id": "binance", "days": 10}),
+}
+
+
+class NoSingleFlight(SingleFlight):
+    """
+    SingleFlight running every call, so the identical requests of the load test all reach the server
+    """
+    def do(self, key, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    async def ado(self, key, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: func(*args, **kwargs))
+
+
+def serve(settings: MockSettings, port: int) -> str:
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_app(settings), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/api/v3/"
+
+
+def pooled_session(concurrency: int) -> Session:
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def timed(call: Tuple[str, Dict], client: CoinGeckoClient):
+    method, kwargs = call
+    start = time.perf_counter()
+    try:
+        ok = getattr(client, method)(**kwargs) is not None
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+async def atimed(call: Tuple[str, Dict], client: CoinGeckoClient):
+    method, kwargs = call
+    start = time.perf_counter()
+    try:
+        ok = await client.acall(method, **kwargs) is not None
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_threads(client_factory: Callable[[], CoinGeckoClient], call, nb_requests: int, concurrency: int):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda _: timed(call, client_factory()), range(nb_requests)))
+
+
+def run_acall(client: CoinGeckoClient, call, nb_requests: int, concurrency: int):
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await atimed(call, client)
+
+        return await asyncio.gather(*(one() for _ in range(nb_requests)))
+
+    return asyncio.run(main())
+
+
+def report(name: str, samples: List, elapsed: float) -> Dict[str, float]:
+    latencies = np.array([latency for latency, _ in samples]) * 1000
+    return {
+        "client": name,
+        "rps": len(samples) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "errors": sum(not ok for _, ok in samples),
+    }
+
+
+def run(base_url: str, endpoint: str, nb_requests: int, concurrency: int) -> List[Dict[str, float]]:
+    call = CALLS[endpoint]
+    shared = CoinGeckoClient(base_url=base_url, session=pooled_session(concurrency))
+    runners = {
+        "sync": lambda: run_threads(lambda: CoinGeckoClient(base_url=base_url), call, nb_requests, concurrency),
+        "pooled": lambda: run_threads(lambda: shared, call, nb_requests, concurrency),
+        "acall": lambda: run_acall(shared, call, nb_requests, concurrency),
+    }
+    results = list()
+    for name, runner in runners.items():
+        start = time.perf_counter()
+        samples = runner()
+        elapsed = time.perf_counter() - start
+        results.append(report(name, samples, elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base url of an already running server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--endpoint", choices=list(CALLS), nargs="+", default=["ping", "ohlc"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fixtures", help="directory of recorded payloads")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--single-flight", action="store_true", help="merge the identical requests in flight")
+    args = parser.parse_args()
+
+    if not args.single_flight:
+        BaseClient.single_flight = NoSingleFlight()
+
+    base_url = args.url or serve(MockSettings(fixtures=args.fixtures, latency=args.latency, jitter=args.jitter,
+                                              rate_limit=args.rate_limit, size=args.size), args.port)
+    print(f"{'endpoint':<24}{'client':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for endpoint in args.endpoint:
+        for result in run(base_url, endpoint, args.requests, args.concurrency):
+            print(f"{endpoint:<24}{result['client']:<10}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}"
+                  f"{result['p99_ms']:>10.2f}{result['errors']:>8}")
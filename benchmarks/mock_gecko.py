@@ -0,0 +1,244 @@
+"""
+Local stand-in for api.coingecko.com replaying recorded payloads for every endpoint of CoinGeckoClient
+
+Payloads are read from --fixtures (one {endpoint}.json file per endpoint, see ENDPOINTS for the names),
+endpoints without a recording get a synthetic payload of --size items with the fields of models/gecko.py.
+--latency / --jitter add a delay to every response and --rate-limit is the probability of answering 429.
+
+run from the repository root:
+    python benchmarks/mock_gecko.py --port 8900 --latency 0.02 --rate-limit 0.01
+    python benchmarks/mock_gecko.py --record benchmarks/fixtures/coingecko     # record live payloads
+then point the client to it: CoinGeckoClient(base_url="http://127.0.0.1:8900/api/v3/")
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOW_MS = 1651708800000
+DAY_MS = 86400000
+
+
+@dataclass
+class MockSettings:
+    fixtures: str = None
+    latency: float = 0.0
+    jitter: float = 0.0
+    rate_limit: float = 0.0
+    size: int = 100
+    seed: int = 0
+    # gzip the responses larger than this size (bytes) when the client accepts it, None to disable
+    gzip_minimum_size: int = 1000
+
+
+def _ohlc(size):
+    return [[NOW_MS - (size - i) * DAY_MS, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i] for i in range(size)]
+
+
+def _market_chart(size):
+    series = [[NOW_MS - (size - i) * DAY_MS, 100.0 + i] for i in range(size)]
+    return {"prices": series, "market_caps": series, "total_volumes": series}
+
+
+def _markets(size):
+    return [{"id": f"coin-{i}", "symbol": f"c{i}", "name": f"Coin {i}", "current_price": 1.0 + i,
+             "market_cap": 1e9 / (i + 1), "market_cap_rank": i + 1, "total_volume": 1e7, "high_24h": 1.1 + i,
+             "low_24h": 0.9 + i, "price_change_24h": 0.01, "price_change_percentage_24h": 1.0,
+             "circulating_supply": 1e6, "last_updated": "2022-05-05T00:00:00.000Z"} for i in range(size)]
+
+
+def _tickers(size):
+    return {"name": "Coin", "tickers": [
+        {"base": "COIN", "target": "USDT", "market": {"name": f"Exchange {i}", "identifier": f"exchange-{i}"},
+         "last": 1.0, "volume": 1000.0, "converted_last": {"usd": 1.0}, "converted_volume": {"usd": 1000.0},
+         "trust_score": "green", "bid_ask_spread_percentage": 0.01, "timestamp": "2022-05-05T00:00:00+00:00",
+         "last_traded_at": "2022-05-05T00:00:00+00:00", "last_fetch_at": "2022-05-05T00:00:00+00:00",
+         "is_anomaly": False, "is_stale": False, "trade_url": None, "token_info_url": None,
+         "coin_id": "coin", "target_coin_id": "tether"} for i in range(size)]}
+
+
+def _exchange(i):
+    return {"id": f"exchange-{i}", "name": f"Exchange {i}", "year_established": 2017, "country": "Cayman Islands",
+            "description": "", "url": "https://example.com", "image": "", "has_trading_incentive": False,
+            "trust_score": 10, "trust_score_rank": i + 1, "trade_volume_24h_btc": 1000.0 / (i + 1),
+            "trade_volume_24h_btc_normalized": 900.0 / (i + 1)}
+
+
+def _derivatives(size):
+    return [{"market": f"Exchange {i % 10}", "symbol": f"COIN{i}USDT", "index_id": f"COIN{i}", "price": "1.0",
+             "price_percentage_change_24h": 0.5, "contract_type": "perpetual", "index": 1.0, "basis": -0.01,
+             "spread": 0.01, "funding_rate": 0.01, "open_interest": 1e6, "volume_24h": 1e7,
+             "last_traded_at": NOW_MS // 1000, "expired_at": None} for i in range(size)]
+
+
+def _exchange_rates(size):
+    return {"rates": {f"c{i}": {"name": f"Currency {i}", "unit": f"C{i}", "value": 30000.0 / (i + 1),
+                                "type": "fiat"} for i in range(size)}}
+
+
+# endpoint name, route pattern relative to /api/v3/, synthetic payload generator of `size` items
+ENDPOINTS: List[Tuple[str, str, Callable[[int], object]]] = [
+    ("ping", r"ping", lambda size: {"gecko_says": "(V3) To the Moon!"}),
+    ("token_price", r"simple/token_price/[^/]+",
+     lambda size: {f"0x{i:040x}": {"usd": 1.0} for i in range(size)}),
+    ("price", r"simple/price", lambda size: {f"coin-{i}": {"usd": 1.0 + i} for i in range(size)}),
+    ("coins_list", r"coins/list", lambda size: [{"id": f"coin-{i}", "symbol": f"c{i}", "name": f"Coin {i}"}
+                                                for i in range(size)]),
+    ("coins_markets", r"coins/markets", _markets),
+    ("categories_list", r"coins/categories/list",
+     lambda size: [{"category_id": f"category-{i}", "name": f"Category {i}"} for i in range(size)]),
+    ("categories", r"coins/categories",
+     lambda size: [{"id": f"category-{i}", "name": f"Category {i}", "market_cap": 1e9, "market_cap_change_24h": 1.0,
+                    "content": "", "top_3_coins": [], "volume_24h": 1e7, "updated_at": "2022-05-05T00:00:00.000Z"}
+                   for i in range(size)]),
+    ("ohlc", r"coins/[^/]+/ohlc", _ohlc),
+    ("tickers", r"coins/[^/]+/tickers", _tickers),
+    ("market_chart_range", r"coins/[^/]+/market_chart/range", _market_chart),
+    ("market_chart", r"coins/[^/]+/market_chart", _market_chart),
+    ("asset_platforms", r"asset_platforms",
+     lambda size: [{"id": f"platform-{i}", "chain_identifier": i, "name": f"Platform {i}", "shortname": f"p{i}"}
+                   for i in range(size)]),
+    ("exchanges_list", r"exchanges/list",
+     lambda size: [{"id": f"exchange-{i}", "name": f"Exchange {i}"} for i in range(size)]),
+    ("exchanges", r"exchanges", lambda size: [_exchange(i) for i in range(size)]),
+    ("exchange_volume_chart", r"exchanges/[^/]+/volume_chart",
+     lambda size: [[float(NOW_MS - (size - i) * DAY_MS), str(1000.0 + i)] for i in range(size)]),
+    ("exchange", r"exchanges/[^/]+", lambda size: dict(_exchange(0), **_tickers(size))),
+    ("indexes", r"indexes",
+     lambda size: [{"name": f"Index {i}", "id": f"I{i}", "market": "Exchange", "last": 1.0,
+                    "is_multi_asset_composite": False} for i in range(size)]),
+    ("derivatives_exchange", r"derivatives/exchanges/[^/]+",
+     lambda size: {"name": "Exchange 0", "open_interest_btc": 1000.0, "trade_volume_24h_btc": "1000.0",
+                   "number_of_perpetual_pairs": size, "number_of_futures_pairs": size, "image": "",
+                   "year_established": None, "country": None, "description": "", "url": "https://example.com"}),
+    ("derivatives", r"derivatives", _derivatives),
+    ("exchange_rates", r"exchange_rates", _exchange_rates),
+    ("global_defi", r"global/decentralized_finance_defi",
+     lambda size: {"data": {"defi_market_cap": "1e11", "eth_market_cap": "3e11", "defi_to_eth_ratio": "33",
+                            "trading_volume_24h": "1e10", "defi_dominance": "5", "top_coin_name": "Coin 0",
+                            "top_coin_defi_dominance": 10.0}}),
+    ("global", r"global",
+     lambda size: {"data": {"active_cryptocurrencies": size, "upcoming_icos": 0, "ongoing_icos": 0,
+                            "ended_icos": 0, "markets": size, "total_market_cap": {"usd": 1e12},
+                            "total_volume": {"usd": 1e11}, "market_cap_percentage": {"btc": 40.0},
+                            "market_cap_change_percentage_24h_usd": 1.0, "updated_at": NOW_MS // 1000}}),
+]
+
+_ROUTES = [(name, re.compile(pattern + r"/?$"), generator) for name, pattern, generator in ENDPOINTS]
+
+
+def resolve(path: str):
+    for name, pattern, generator in _ROUTES:
+        if pattern.match(path):
+            return name, generator
+    return None, None
+
+
+def create_app(settings: MockSettings = None) -> FastAPI:
+    settings = MockSettings() if settings is None else settings
+    app = FastAPI(title="CoinGecko mock server")
+    if settings.gzip_minimum_size is not None:
+        app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size)
+    randomizer = random.Random(settings.seed)
+    payloads: Dict[str, bytes] = dict()
+
+    def payload(name: str, generator) -> bytes:
+        if name not in payloads:
+            path = None if settings.fixtures is None else os.path.join(settings.fixtures, f"{name}.json")
+            if path is not None and os.path.exists(path):
+                with open(path, "rb") as file:
+                    payloads[name] = file.read()
+            else:
+                payloads[name] = json.dumps(generator(settings.size)).encode("utf-8")
+        return payloads[name]
+
+    @app.get("/api/v3/{path:path}")
+    async def replay(path: str, request: Request):
+        delay = settings.latency + randomizer.uniform(0, settings.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if randomizer.random() < settings.rate_limit:
+            return JSONResponse(status_code=429, headers={"Retry-After": "1"},
+                                content={"status": {"error_code": 429,
+                                                    "error_message": "You've exceeded the Rate Limit."}})
+        name, generator = resolve(path)
+        if name is None:
+            return JSONResponse(status_code=404, content={"error": f"{path} is not mocked"})
+        return Response(content=payload(name, generator), media_type="application/json")
+
+    return app
+
+
+def record(directory: str, base_url: str = "https://api.coingecko.com/api/v3/"):
+    """
+    Record one live payload per endpoint with sample parameters
+    """
+    from requests import Session
+
+    samples = {
+        "ping": "ping",
+        "price": "simple/price?ids=bitcoin,ethereum&vs_currencies=usd",
+        "coins_list": "coins/list",
+        "coins_markets": "coins/markets?vs_currency=usd",
+        "categories_list": "coins/categories/list",
+        "categories": "coins/categories",
+        "ohlc": "coins/bitcoin/ohlc?vs_currency=usd&days=365",
+        "tickers": "coins/bitcoin/tickers",
+        "market_chart_range": "coins/bitcoin/market_chart/range?vs_currency=usd&from=1392577232&to=1422577232",
+        "market_chart": "coins/bitcoin/market_chart?vs_currency=usd&days=30",
+        "asset_platforms": "asset_platforms",
+        "exchanges_list": "exchanges/list",
+        "exchanges": "exchanges",
+        "exchange_volume_chart": "exchanges/binance/volume_chart?days=10",
+        "exchange": "exchanges/binance",
+        "indexes": "indexes",
+        "derivatives_exchange": "derivatives/exchanges/bitmex",
+        "derivatives": "derivatives",
+        "exchange_rates": "exchange_rates",
+        "global_defi": "global/decentralized_finance_defi",
+        "global": "global",
+    }
+    os.makedirs(directory, exist_ok=True)
+    session = Session()
+    for name, route in samples.items():
+        response = session.get(base_url + route)
+        if response.status_code == 200:
+            with open(os.path.join(directory, f"{name}.json"), "wb") as file:
+                file.write(response.content)
+        print(f"{name:<24}{response.status_code:>6}{len(response.content):>12} bytes")
+        time.sleep(1.5)  # stay under the public rate limit
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--fixtures", help="directory of recorded payloads")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency upper bound in seconds")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="probability of a 429 response")
+    parser.add_argument("--size", type=int, default=100, help="number of items of the synthetic payloads")
+    parser.add_argument("--no-gzip", action="store_true", help="serve uncompressed responses")
+    parser.add_argument("--record", metavar="DIRECTORY", help="record live payloads instead of serving")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+    else:
+        import uvicorn
+        uvicorn.run(create_app(MockSettings(fixtures=args.fixtures, latency=args.latency, jitter=args.jitter,
+                                            rate_limit=args.rate_limit, size=args.size,
+                                            gzip_minimum_size=None if args.no_gzip else 1000)),
+                    host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,70 @@
+"""
+Synthetic market data for benchmarks and offline runs: geometric random walks recorded in the fixture data source
+"""
+import os
+import sys
+from typing import List
+
+import numpy as np
+from pandas import Timestamp, Timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Backtester import BacktesterConfig, Frequency  # noqa: E402
+from datasources import OHLCBatch, data_source_registry  # noqa: E402
+from providers import Provider  # noqa: E402
+
+TIME_DELTA = {
+    Frequency.HOURLY: Timedelta(hours=1),
+    Frequency.DAILY: Timedelta(days=1),
+    Frequency.WEEKLY: Timedelta(days=7),
+}
+
+START_DATE = Timestamp("2015-01-01")
+
+
+def synthetic_batches(
+        nb_coins: int,
+        nb_bars: int,
+        frequency: Frequency = Frequency.DAILY,
+        seed: int = 0,
+        volatility: float = 0.03
+) -> List[OHLCBatch]:
+    """
+    :return: one OHLCBatch per coin, coins are named COIN0, COIN1...
+    """
+    generator = np.random.default_rng(seed)
+    ts = START_DATE.value + np.arange(nb_bars, dtype=np.int64) * TIME_DELTA[frequency].value
+    returns = generator.normal(0.0, volatility, size=(nb_coins, nb_bars))
+    close = 100 * np.exp(np.cumsum(returns, axis=1))
+    spread = np.abs(generator.normal(0.0, volatility / 2, size=(nb_coins, nb_bars)))
+    _open = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    high = np.maximum(_open, close) * (1 + spread)
+    low = np.minimum(_open, close) * (1 - spread)
+    volume = generator.lognormal(10, 1, size=(nb_coins, nb_bars))
+    return [OHLCBatch(product_code=f"COIN{coin}", ts=ts, open=_open[coin], high=high[coin], low=low[coin],
+                      close=close[coin], volume=volume[coin])
+            for coin in range(nb_coins)]
+
+
+def synthetic_config(
+        nb_coins: int,
+        nb_bars: int,
+        frequency: Frequency = Frequency.DAILY,
+        seed: int = 0
+) -> BacktesterConfig:
+    """
+    Record synthetic batches in the fixture data source and return the config of a backtest over all of them
+    """
+    fixtures = data_source_registry.get(Provider.FIXTURE)
+    fixtures.clear()
+    batches = synthetic_batches(nb_coins, nb_bars, frequency, seed)
+    for batch in batches:
+        fixtures.record(batch.product_code, batch)
+    return BacktesterConfig(strategy_name=f"Synthetic {nb_coins}x{nb_bars} {frequency.value}",
+                            file_path=None,
+                            start_date=START_DATE,
+                            end_date=START_DATE + TIME_DELTA[frequency] * (nb_bars - 1),
+                            product_codes=[batch.product_code for batch in batches],
+                            frequency=frequency,
+                            provider=Provider.FIXTURE)
@@ -0,0 +1,130 @@
+from typing import Dict, Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+from metrics import compute_kpi
+
+METHODS = ("stationary", "block")
+
+
+def stationary_indices(nb_dates: int, nb_paths: int, mean_block: float, rng: np.random.Generator,
+                       length: int = None) -> np.ndarray:
+    """
+    Stationary bootstrap (Politis & Romano): blocks of geometric length of mean mean_block starting at random dates,
+    wrapping around the end of the sample
+    :param length: dates of every path, nb_dates by default
+    :return: (nb_paths, length) positions in the sample
+    """
+    length = nb_dates if length is None else length
+    new_block = rng.random((nb_paths, length)) < 1 / mean_block
+    new_block[:, 0] = True
+    starts = rng.integers(0, nb_dates, size=(nb_paths, length))
+    # date where the block of every cell started, the position moves forward by one date inside a block
+    dates = np.arange(length)
+    block_start = np.maximum.accumulate(np.where(new_block, dates, 0), axis=1)
+    return (np.take_along_axis(starts, block_start, axis=1) + dates - block_start) % nb_dates
+
+
+def block_indices(nb_dates: int, nb_paths: int, block_size: int, rng: np.random.Generator,
+                  length: int = None) -> np.ndarray:
+    """
+    Circular moving block bootstrap: blocks of block_size consecutive dates starting at random dates
+    :return: (nb_paths, length) positions in the sample
+    """
+    length = nb_dates if length is None else length
+    nb_blocks = -(-length // block_size)
+    starts = rng.integers(0, nb_dates, size=(nb_paths, nb_blocks, 1))
+    return ((starts + np.arange(block_size)) % nb_dates).reshape(nb_paths, -1)[:, :length]
+
+
+class BootstrapResult(object):
+    """
+    class BootstrapResult with the distribution of every KPI over the resampled paths,
+    (nb_paths,) arrays for one strategy, (nb_strategies, nb_paths) for several
+    """
+    def __init__(self, distributions: Dict[str, np.ndarray], strategies: list = None):
+        self._distributions = distributions
+        self._strategies = strategies
+
+    @property
+    def distributions(self) -> Dict[str, np.ndarray]:
+        return self._distributions
+
+    def confidence_interval(self, kpi: str, level: float = 0.95) -> np.ndarray:
+        """
+        :return: (lower, upper) percentile bounds, (nb_strategies, 2) for several strategies
+        """
+        alpha = (1 - level) / 2
+        return np.moveaxis(np.quantile(self._distributions[kpi], [alpha, 1 - alpha], axis=-1), 0, -1)
+
+    def summary(self, level: float = 0.95) -> pd.DataFrame:
+        """
+        :return: mean, std and confidence bounds of every KPI (and strategy)
+        """
+        rows = list()
+        for kpi, values in self._distributions.items():
+            values = np.atleast_2d(values)
+            bounds = np.atleast_2d(self.confidence_interval(kpi, level))
+            for position, strategy in enumerate(self._strategies or [None]):
+                rows.append({"strategy": strategy, "kpi": kpi, "mean": values[position].mean(),
+                             "std": values[position].std(ddof=1), "lower": bounds[position, 0],
+                             "upper": bounds[position, 1]})
+        frame = pd.DataFrame(rows)
+        return frame.drop(columns="strategy") if self._strategies is None else frame
+
+
+def bootstrap(
+        returns: Union[np.ndarray, pd.Series, pd.DataFrame],
+        nb_paths: int = 10_000,
+        method: str = "stationary",
+        block_size: float = 20,
+        kpis: Iterable[str] = ("sharpe_ratio", "max_drawdown"),
+        periods_per_year: float = 365,
+        length: int = None,
+        seed: int = None,
+        batch_size: int = 1_000
+) -> BootstrapResult:
+    """
+    Resample the returns of one or several strategies into nb_paths paths and compute the KPI of every path,
+    the paths are generated by batches of index arrays so nothing loops over the dates or the paths
+    Several strategies (DataFrame columns or (K, T) array) are resampled on the same dates to keep their
+    correlation
+
+    :param returns: (T,) returns of a strategy, or (K, T) / DataFrame (T dates x K strategies)
+    :param method: "stationary" (random block lengths of mean block_size) or "block" (fixed block_size)
+    :param length: dates of every path, the length of the sample by default
+    :param seed: seed of the numpy generator, the same seed gives the same distributions
+    :param batch_size: paths generated at once, bounds the memory
+    """
+    if method not in METHODS:
+        raise ValueError(f"method should be one of {METHODS} current value is : {method}")
+    strategies = list(returns.columns) if isinstance(returns, pd.DataFrame) else None
+    values = np.asarray(returns, dtype=np.float64)
+    values = values.T if isinstance(returns, pd.DataFrame) else values
+    values = values[..., ~np.isnan(values).reshape(-1, values.shape[-1]).any(axis=0)]
+    nb_dates = values.shape[-1]
+    if nb_dates < 2:
+        raise ValueError(f"at least 2 returns are needed current number is : {nb_dates}")
+    rng = np.random.default_rng(seed)
+    kpis = list(kpis)
+    chunks = {kpi: list() for kpi in kpis}
+    for first in range(0, nb_paths, batch_size):
+        size = min(batch_size, nb_paths - first)
+        indices = stationary_indices(nb_dates, size, block_size, rng, length) if method == "stationary" \
+            else block_indices(nb_dates, size, int(block_size), rng, length)
+        paths = values[..., indices]
+        levels = np.cumprod(np.concatenate([np.ones(paths.shape[:-1] + (1,)), 1 + paths], axis=-1), axis=-1)
+        for kpi in kpis:
+            chunks[kpi].append(compute_kpi(kpi, levels, periods_per_year))
+    return BootstrapResult({kpi: np.concatenate(chunk, axis=-1) for kpi, chunk in chunks.items()}, strategies)
+
+
+def backtest_returns(*backtesters) -> pd.DataFrame:
+    """
+    :return: returns of the levels (level_by_ts) of the backtests on their common dates, one column per strategy
+    """
+    levels = {backtester.config.strategy_name: pd.Series({ts: quote.close for ts, quote in
+                                                           backtester.level_by_ts.items()}).sort_index()
+              for backtester in backtesters}
+    return pd.DataFrame(levels).dropna().pct_change().iloc[1:]
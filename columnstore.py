@@ -0,0 +1,162 @@
+import os
+import time
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 10 ** 9
+
+
+class ColumnTable(object):
+    """
+    class ColumnTable, append-only columnar table on disk partitioned by day of its time column
+
+    Layout: <root>/<YYYY-MM-DD>/part-<ns>-<pid>.npz, one array per column, every append writes new parts
+    (never rewrites existing ones) so a reader never sees a partially written file
+    The time column holds int64 ns since epoch (naive UTC), as OHLCBatch.ts
+
+    eg: table = ColumnTable("data/derivatives", {"ts": "int64", "symbol": "U", "funding_rate": "float64"})
+        table.append({"ts": ts, "symbol": symbols, "funding_rate": rates})
+        table.read(start, end, columns=["ts", "funding_rate"], where={"symbol": "BTCUSDT"})
+    """
+    def __init__(self, root: str, schema: Dict[str, str], time_column: str = "ts"):
+        """
+        :param schema: {column name: numpy dtype}, "U" for strings
+        """
+        if time_column not in schema:
+            raise KeyError(f"time column {time_column} is not in the schema {list(schema)}")
+        self._root = root
+        self._schema = {name: np.dtype(dtype) for name, dtype in schema.items()}
+        self._time_column = time_column
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._schema)
+
+    def partitions(self, start=None, end=None) -> List[str]:
+        """
+        :return: days (YYYY-MM-DD) with data between start and end included, sorted
+        """
+        if not os.path.isdir(self._root):
+            return list()
+        days = sorted(day for day in os.listdir(self._root) if os.path.isdir(os.path.join(self._root, day)))
+        if start is not None:
+            days = [day for day in days if day >= pd.Timestamp(start).strftime("%Y-%m-%d")]
+        if end is not None:
+            days = [day for day in days if day <= pd.Timestamp(end).strftime("%Y-%m-%d")]
+        return days
+
+    def _parts(self, day: str) -> List[str]:
+        directory = os.path.join(self._root, day)
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if name.startswith("part-") and name.endswith(".npz")]
+
+    def _columns(self, columns: Dict[str, Iterable]) -> Dict[str, np.ndarray]:
+        missing = set(self._schema) - set(columns)
+        if missing:
+            raise KeyError(f"columns {sorted(missing)} are missing, schema : {list(self._schema)}")
+        arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in self._schema.items()}
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"columns should have the same length current lengths are : {lengths}")
+        return arrays
+
+    def _write(self, day: str, arrays: Dict[str, np.ndarray]):
+        directory = os.path.join(self._root, day)
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{time.time_ns():020d}-{os.getpid()}"
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        with open(tmp_path, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, os.path.join(directory, f"{name}.npz"))
+
+    def append(self, columns: Dict[str, Iterable]) -> int:
+        """
+        Append rows, split in one new part per day of the time column
+        :return: number of rows written
+        """
+        arrays = self._columns(columns)
+        ts = arrays[self._time_column]
+        if len(ts) == 0:
+            return 0
+        days = ts // NS_PER_DAY
+        order = np.argsort(days, kind="stable")
+        days = days[order]
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for rows in np.split(order, bounds):
+            day = pd.Timestamp(int(ts[rows[0]])).strftime("%Y-%m-%d")
+            self._write(day, {name: array[rows] for name, array in arrays.items()})
+        return len(ts)
+
+    def read(self, start=None, end=None, columns: List[str] = None,
+             where: Dict[str, Union[object, Iterable]] = None) -> Dict[str, np.ndarray]:
+        """
+        :param start: first time included, anything pd.Timestamp accepts
+        :param end: last time included
+        :param columns: columns returned, all by default
+        :param where: {column: value or list of values} rows are kept when every column matches
+        :return: {column: array} sorted by time
+        """
+        columns = self.columns if columns is None else list(columns)
+        where = dict() if where is None else where
+        needed = set(columns) | set(where) | {self._time_column}
+        unknown = needed - set(self._schema)
+        if unknown:
+            raise KeyError(f"columns {sorted(unknown)} are not in the schema {list(self._schema)}")
+
+        chunks = {name: list() for name in needed}
+        for day in self.partitions(start, end):
+            for path in self._parts(day):
+                with np.load(path, allow_pickle=False) as part:
+                    for name in needed:
+                        chunks[name].append(part[name])
+        arrays = {name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=self._schema[name])
+                  for name in needed}
+
+        ts = arrays[self._time_column]
+        mask = np.ones(len(ts), dtype=bool)
+        if start is not None:
+            mask &= ts >= pd.Timestamp(start).value
+        if end is not None:
+            mask &= ts <= pd.Timestamp(end).value
+        for name, value in where.items():
+            if isinstance(value, (str, bytes)) or not isinstance(value, Iterable):
+                mask &= arrays[name] == value
+            else:
+                mask &= np.isin(arrays[name], list(value))
+        order = np.argsort(ts[mask], kind="stable")
+        return {name: arrays[name][mask][order] for name in columns}
+
+    def to_frame(self, start=None, end=None, columns: List[str] = None,
+                 where: Dict[str, Union[object, Iterable]] = None) -> pd.DataFrame:
+        frame = pd.DataFrame(self.read(start, end, columns, where))
+        if self._time_column in frame:
+            frame[self._time_column] = pd.to_datetime(frame[self._time_column])
+        return frame
+
+    def compact(self, day: str = None) -> int:
+        """
+        Merge the parts of a day (every day by default) in a single part, the many small parts written by
+        frequent snapshots make the reads slower, run it when no other process reads or writes the day
+        :return: number of days compacted
+        """
+        compacted = 0
+        for partition in self.partitions() if day is None else [day]:
+            parts = self._parts(partition)
+            if len(parts) < 2:
+                continue
+            chunks = {name: list() for name in self._schema}
+            for path in parts:
+                with np.load(path, allow_pickle=False) as part:
+                    for name in self._schema:
+                        chunks[name].append(part[name])
+            self._write(partition, {name: np.concatenate(chunk) for name, chunk in chunks.items()})
+            for path in parts:
+                os.remove(path)
+            compacted += 1
+        return compacted
@@ -0,0 +1,136 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from models.gecko import TickersCoin
+
+
+class CostModel(object):
+    """
+    class CostModel of the cost of rebalancing, as a rate of the traded notional per asset:
+    a fee plus a slippage of slippage_factor times the bid/ask spread (half the spread by default, crossing it
+    from the mid)
+
+    eg: CostModel(fee=0.001, spread=0.002)
+        CostModel.from_tickers(client.get_tickers_by_id("bitcoin"), fee=0.001)
+    """
+    def __init__(
+            self,
+            fee: float = 0.0,
+            spread: float = 0.0,
+            fee_by_code: Dict[str, float] = None,
+            spread_by_code: Dict[str, float] = None,
+            slippage_factor: float = 0.5
+    ):
+        """
+        :param fee: fee rate of the assets without a specific fee, 0.001 for 10bp
+        :param spread: relative bid/ask spread of the assets without a specific spread
+        :param fee_by_code: fee rate per product code
+        :param spread_by_code: relative bid/ask spread per product code
+        """
+        self._fee = fee
+        self._spread = spread
+        self._fee_by_code = dict() if fee_by_code is None else fee_by_code
+        self._spread_by_code = dict() if spread_by_code is None else spread_by_code
+        self._slippage_factor = slippage_factor
+
+    @property
+    def fee_by_code(self) -> Dict[str, float]:
+        return self._fee_by_code
+
+    @property
+    def spread_by_code(self) -> Dict[str, float]:
+        return self._spread_by_code
+
+    @classmethod
+    def from_tickers(
+            cls,
+            tickers: Iterable[TickersCoin],
+            code_func: Callable[[TickersCoin], str] = lambda ticker: ticker.coin_id,
+            **kwargs
+    ) -> "CostModel":
+        """
+        Cost model using the median bid_ask_spread_percentage of the tickers of every coin,
+        the anomalous and stale tickers are ignored
+        :param code_func: product code of a ticker, the coin id by default
+        :param kwargs: other arguments of CostModel
+        """
+        spreads: Dict[str, List[float]] = dict()
+        for ticker in tickers:
+            if ticker.bid_ask_spread_percentage is None or ticker.is_anomaly or ticker.is_stale:
+                continue
+            spreads.setdefault(code_func(ticker), list()).append(ticker.bid_ask_spread_percentage / 100)
+        spread_by_code = {code: float(np.median(values)) for code, values in spreads.items()}
+        spread_by_code.update(kwargs.pop("spread_by_code", None) or dict())
+        return cls(spread_by_code=spread_by_code, **kwargs)
+
+    def rates(self, product_codes: List[str]) -> np.ndarray:
+        """
+        :return: cost rate per unit of traded weight of every product code
+        """
+        fees = np.array([self._fee_by_code.get(code, self._fee) for code in product_codes], dtype=np.float64)
+        spreads = np.array([self._spread_by_code.get(code, self._spread) for code in product_codes], dtype=np.float64)
+        return fees + self._slippage_factor * spreads
+
+
+def returns(prices: np.ndarray) -> np.ndarray:
+    """
+    :param prices: (T, N) prices, NaN before the first quote of an asset
+    :return: (T, N) simple returns from the previous bar, 0 on the first bar and where a price is missing
+    """
+    result = np.zeros_like(prices, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result[1:] = prices[1:] / prices[:-1] - 1
+    return np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def traded_weights(weights: np.ndarray, asset_returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param weights: (T, N) target weights set at the close of every bar, the rest is cash
+    :param asset_returns: (T, N) returns, see returns
+    :return: (gross return of the portfolio per bar, (T, N) absolute weights traded at every close to go from the
+             drifted weights back to the targets), the first bar trades in from cash
+    """
+    gross = np.zeros(len(weights), dtype=np.float64)
+    gross[1:] = np.einsum("tn,tn->t", weights[:-1], asset_returns[1:])
+    drifted = np.zeros_like(weights, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drifted[1:] = weights[:-1] * (1 + asset_returns[1:]) / (1 + gross[1:, None])
+    return gross, np.abs(weights - np.nan_to_num(drifted, nan=0.0))
+
+
+def level_path(
+        prices: np.ndarray,
+        weights: np.ndarray,
+        rates: np.ndarray = None,
+        basis: float = 100.0,
+        rebalance: np.ndarray = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Levels of a strategy holding weights from close to close, net of the trading costs, in one vectorized pass
+    level[t] = level[t - 1] * (1 - cost[t - 1]) * (1 + sum(weights[t - 1] * returns[t]))
+
+    :param prices: (T, N) prices
+    :param weights: (T, N) weights held after the close of every bar, NaN are no position
+    :param rates: (N,) cost rate per asset (see CostModel.rates), or (K, N) to evaluate K cost scenarios at once,
+                  no cost by default
+    :param basis: level of the first bar
+    :param rebalance: (T,) boolean mask of the dates where the portfolio trades, every date by default,
+                      the weights of the other dates should be the drifted ones (see rebalancing.hold_weights)
+    :return: (levels, turnover, costs), levels and costs are (T,) or (K, T) following rates, turnover is (T,)
+    """
+    weights = np.nan_to_num(np.asarray(weights, dtype=np.float64), nan=0.0)
+    gross, traded = traded_weights(weights, returns(np.asarray(prices, dtype=np.float64)))
+    if rebalance is not None:
+        # only rounding errors are left between the held and the drifted weights of the other dates
+        traded[~np.asarray(rebalance, dtype=bool)] = 0.0
+    turnover = traded.sum(axis=1)
+    rates = np.zeros(weights.shape[1]) if rates is None else np.asarray(rates, dtype=np.float64)
+    costs = (traded @ rates.T).T
+    if len(weights) == 0:
+        return np.empty(costs.shape), turnover, costs
+    growth = (1 - costs[..., :-1]) * (1 + gross[1:])
+    levels = np.empty_like(costs)
+    levels[..., 0] = basis
+    levels[..., 1:] = basis * np.cumprod(growth, axis=-1)
+    return levels, turnover, costs
@@ -0,0 +1,128 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+from pandas import Timedelta, Timestamp
+
+from datasources import OHLCBatch
+from providers import Provider, provider_registry
+
+
+class CurrencyConverter(object):
+    """
+    class CurrencyConverter re-denominating price arrays from one quote currency to another, so the coins are
+    fetched once in a base currency and the other currencies are derived locally
+
+    Rates come from CoinGecko, denominated in BTC:
+    - spot rates of /exchange_rates, cached for ttl seconds
+    - historical rates from the market chart of the anchor coin (bitcoin) in every currency, one fetch per
+      currency whatever the number of coins, cached and only refetched when a wider range is needed
+    the rate from base to target at a date is anchor_price_in_target / anchor_price_in_base
+
+    eg: converter = CurrencyConverter()
+        converter.convert(prices, ts, base="usd", target="eur")
+    """
+    def __init__(self, client=None, ttl: float = 300.0, anchor: str = "bitcoin"):
+        """
+        :param client: CoinGeckoClient, a new one by default
+        :param ttl: seconds the spot rates are kept
+        :param anchor: coin id whose market chart gives the historical rates
+        """
+        self._client = client
+        self._ttl = ttl
+        self._anchor = anchor
+        self._lock = threading.Lock()
+        self._spot: Dict[str, float] = dict()
+        self._spot_time = None
+        # currency -> (first and last ns requested, timestamps, prices), the history may start later than requested
+        self._history: Dict[str, Tuple[int, int, np.ndarray, np.ndarray]] = dict()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = provider_registry.get(Provider.COINGECKO)()
+        return self._client
+
+    def spot_rates(self) -> Dict[str, float]:
+        """
+        :return: units of every currency for one BTC
+        """
+        with self._lock:
+            if self._spot_time is None or time.monotonic() - self._spot_time > self._ttl:
+                rates = self.client.get_exchange_rate_by_currency()
+                self._spot = {currency: rate.value for currency, rate in rates.items()}
+                self._spot_time = time.monotonic()
+            return self._spot
+
+    def spot_rate(self, base: str, target: str) -> float:
+        """
+        :return: units of target for one unit of base
+        """
+        rates = self.spot_rates()
+        for currency in (base, target):
+            if currency not in rates:
+                raise KeyError(f"currency {currency} is not supported, available : {sorted(rates)}")
+        return rates[target] / rates[base]
+
+    def history(self, currency: str, start: Timestamp, end: Timestamp) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (int64 ns timestamps, price of the anchor coin in the currency) covering start to end
+        """
+        # one day of margin before start so the first dates have a rate to look back to
+        first, last = (Timestamp(start) - Timedelta(days=1)).value, Timestamp(end).value
+        with self._lock:
+            cached = self._history.get(currency)
+        if cached is not None:
+            if cached[0] <= first and cached[1] >= last:
+                return cached[2], cached[3]
+            first, last = min(first, cached[0]), max(last, cached[1])
+        chart = self.client.get_market_chart_by_range(self._anchor, currency, str(first // 10 ** 9),
+                                                      str(last // 10 ** 9))
+        points = np.array([point.prices for point in chart], dtype=np.float64).reshape(-1, 2)
+        ts = (points[:, 0] * 1_000_000).astype(np.int64)
+        order = np.argsort(ts, kind="stable")
+        with self._lock:
+            self._history[currency] = (first, last, ts[order], points[order, 1])
+        return ts[order], points[order, 1]
+
+    def _asof(self, currency: str, ts: np.ndarray) -> np.ndarray:
+        history_ts, prices = self.history(currency, Timestamp(int(ts.min())), Timestamp(int(ts.max())))
+        if len(history_ts) == 0:
+            raise ValueError(f"no {self._anchor} history in {currency} between {ts.min()} and {ts.max()}")
+        # last rate at or before every date, the first one for the dates before the history
+        position = np.clip(np.searchsorted(history_ts, ts, side="right") - 1, 0, None)
+        return prices[position]
+
+    def historical_rate(self, base: str, target: str, ts: np.ndarray) -> np.ndarray:
+        """
+        :param ts: int64 ns timestamps
+        :return: units of target for one unit of base at every timestamp
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        if base == target:
+            return np.ones(len(ts))
+        return self._asof(target, ts) / self._asof(base, ts)
+
+    def convert(self, prices: np.ndarray, ts: np.ndarray = None, base: str = "usd", target: str = "usd") -> np.ndarray:
+        """
+        :param prices: (T,) or (T, N) prices in base
+        :param ts: int64 ns timestamps of the rows, the spot rate is used for every row when None
+        :return: prices in target
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        if base == target:
+            return prices
+        if ts is None:
+            return prices * self.spot_rate(base, target)
+        rate = self.historical_rate(base, target, ts)
+        return prices * (rate if prices.ndim == 1 else rate[:, None])
+
+    def convert_batch(self, batch: OHLCBatch, base: str, target: str) -> OHLCBatch:
+        """
+        :return: batch with the open, high, low and close converted at the rate of every bar, volume unchanged
+        """
+        rate = self.historical_rate(base, target, batch.ts) if len(batch) else np.ones(0)
+        return OHLCBatch(product_code=batch.product_code, ts=batch.ts, open=batch.open * rate,
+                         high=batch.high * rate, low=batch.low * rate, close=batch.close * rate,
+                         volume=batch.volume)
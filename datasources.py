@@ -0,0 +1,217 @@
+import json
+import os
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas import Timestamp
+
+from providers import Provider, ProviderRegistry, provider_registry
+
+
+@dataclass
+class OHLCBatch:
+    """
+    Columnar OHLC bars of one product, every data source returns this structure
+    ts are int64 nanoseconds since epoch (naive UTC, same convention as the Calendar), sorted ascending
+    """
+    product_code: str
+    ts: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        self.ts = np.asarray(self.ts, dtype=np.int64)
+        for name in ("open", "high", "low", "close", "volume"):
+            if getattr(self, name) is not None:
+                setattr(self, name, np.asarray(getattr(self, name), dtype=np.float64))
+        if len(self.ts) > 1 and np.any(self.ts[1:] < self.ts[:-1]):
+            order = np.argsort(self.ts, kind="stable")
+            self.ts = self.ts[order]
+            for name in ("open", "high", "low", "close", "volume"):
+                if getattr(self, name) is not None:
+                    setattr(self, name, getattr(self, name)[order])
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.ts.astype("datetime64[ns]"))
+
+    def slice(self, start: Timestamp = None, end: Timestamp = None) -> "OHLCBatch":
+        """
+        Bars between start and end (both included) found by binary search
+        """
+        lo = 0 if start is None else np.searchsorted(self.ts, Timestamp(start).value, side="left")
+        hi = len(self.ts) if end is None else np.searchsorted(self.ts, Timestamp(end).value, side="right")
+        return OHLCBatch(product_code=self.product_code,
+                         ts=self.ts[lo:hi],
+                         open=self.open[lo:hi],
+                         high=self.high[lo:hi],
+                         low=self.low[lo:hi],
+                         close=self.close[lo:hi],
+                         volume=None if self.volume is None else self.volume[lo:hi])
+
+    @classmethod
+    def from_frame(cls, product_code: str, frame: pd.DataFrame):
+        """
+        :param frame: DataFrame with Date, Open, High, Low, Close (and optionally Volume) columns,
+                      the layout of the csv files downloaded from yahoo finance
+        """
+        if "Date" not in frame.columns:
+            frame = frame.reset_index()
+        dates = pd.to_datetime(frame["Date"])
+        if getattr(dates.dt, "tz", None) is not None:
+            dates = dates.dt.tz_convert("UTC").dt.tz_localize(None)
+        return cls(product_code=product_code,
+                   ts=dates.values.astype("datetime64[ns]").astype(np.int64),
+                   open=frame["Open"].values,
+                   high=frame["High"].values,
+                   low=frame["Low"].values,
+                   close=frame["Close"].values,
+                   volume=frame["Volume"].values if "Volume" in frame.columns else None)
+
+    @classmethod
+    def from_records(cls, product_code: str, records: List[list]):
+        """
+        :param records: CoinGecko ohlc payload [[timestamp in ms, open, high, low, close], ...]
+        """
+        data = np.asarray(records, dtype=np.float64).reshape(-1, 5)
+        return cls(product_code=product_code,
+                   ts=data[:, 0].astype(np.int64) * 1_000_000,
+                   open=data[:, 1],
+                   high=data[:, 2],
+                   low=data[:, 3],
+                   close=data[:, 4])
+
+    def to_records(self) -> List[list]:
+        return np.column_stack([self.ts // 1_000_000, self.open, self.high, self.low, self.close]).tolist()
+
+
+class DataSource(metaclass=ABCMeta):
+    """
+    Interface of the data sources selected through the Provider of the BacktesterConfig
+    """
+
+    @abstractmethod
+    def load(
+            self,
+            product_code: str,
+            params: object = None,
+            start: Timestamp = None,
+            end: Timestamp = None
+    ) -> OHLCBatch:
+        """
+        this method must be implemented in subclasses
+        :param product_code: code of the product in the provider referential
+        :param params: provider specific parameters, the file_path of the BacktesterConfig
+        :param start: first bar needed, None to get everything available
+        :param end: last bar needed, None to get everything available
+        :return: OHLCBatch
+        """
+        raise NotImplementedError
+
+
+class CoinGeckoSource(DataSource):
+    """
+    OHLC bars from the CoinGecko API, params is a CGParams giving vs_currency and days
+    """
+
+    def load(self, product_code, params=None, start=None, end=None) -> OHLCBatch:
+        client = provider_registry.get(Provider.COINGECKO)()
+        ohlc = client.get_ohlc(product_code, getattr(params, "vs_currency", None) or "usd",
+                               getattr(params, "days", None) or "max")
+        records = [[bar.Date, bar.Open, bar.High, bar.Low, bar.Close] for bar in ohlc]
+        return OHLCBatch.from_records(product_code, records).slice(start, end)
+
+
+class YahooSource(DataSource):
+    """
+    OHLC bars from yahoo finance, params is unused
+    """
+    def __init__(self, interval: str = "1d"):
+        self.interval = interval
+
+    def load(self, product_code, params=None, start=None, end=None) -> OHLCBatch:
+        yf = provider_registry.get(Provider.YAHOO)
+        frame = yf.Ticker(product_code).history(start=start, end=end, interval=self.interval)
+        return OHLCBatch.from_frame(product_code, frame).slice(start, end)
+
+
+class LocalFileSource(DataSource):
+    """
+    OHLC bars from local csv, parquet or memory-mapped bar archive (.bars, see barstore.py) files
+    params is the path of the file, "{product_code}" in the path is replaced by the product code
+    so several products can be read from one directory: "data/{product_code}.parquet"
+    """
+    def __init__(self):
+        self._stores = dict()
+
+    def load(self, product_code, params=None, start=None, end=None) -> OHLCBatch:
+        if not isinstance(params, str):
+            raise TypeError(f"Path should be string typed current type is : {type(params)}")
+        path = params.format(product_code=product_code)
+        if path.endswith(".bars"):
+            if path not in self._stores:
+                from barstore import BarStore
+                self._stores[path] = BarStore.open(path)
+            return self._stores[path].batch(product_code, start, end)
+        if path.endswith(".parquet"):
+            frame = pd.read_parquet(path)
+        else:
+            frame = pd.read_csv(path)
+        return OHLCBatch.from_frame(product_code, frame).slice(start, end)
+
+
+class FixtureSource(DataSource):
+    """
+    Recorded payloads replayed for offline backtests and tests
+    params is a directory containing one {product_code}.json file per product in the CoinGecko ohlc format,
+    payloads recorded in memory with record() take precedence over the files
+    """
+    def __init__(self, fixtures: Dict[str, Union[List[list], OHLCBatch]] = None):
+        self._fixtures = dict() if fixtures is None else fixtures
+
+    def record(self, product_code: str, records: Union[List[list], OHLCBatch]):
+        self._fixtures[product_code] = records
+
+    def clear(self):
+        self._fixtures.clear()
+
+    @staticmethod
+    def save(batch: OHLCBatch, directory: str) -> str:
+        """
+        Persist a batch loaded from any source so it can be replayed offline
+        :return: path of the fixture
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{batch.product_code}.json")
+        with open(path, "w") as file:
+            json.dump(batch.to_records(), file)
+        return path
+
+    def load(self, product_code, params=None, start=None, end=None) -> OHLCBatch:
+        records = self._fixtures.get(product_code)
+        if records is None:
+            if not isinstance(params, str):
+                raise KeyError(f"No fixture recorded for {product_code}")
+            with open(os.path.join(params, f"{product_code}.json")) as file:
+                records = json.load(file)
+        if isinstance(records, OHLCBatch):
+            return records.slice(start, end)
+        return OHLCBatch.from_records(product_code, records).slice(start, end)
+
+
+data_source_registry = ProviderRegistry()
+data_source_registry.register(Provider.COINGECKO, CoinGeckoSource())
+data_source_registry.register(Provider.YAHOO, YahooSource())
+data_source_registry.register(Provider.LOCAL, LocalFileSource())
+data_source_registry.register(Provider.FIXTURE, FixtureSource())
+# category indices built from the CoinGecko categories, see indices.py
+data_source_registry.register(Provider.INDEX, "indices:index_source")
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from dataclasses import asdict
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from columnstore import ColumnTable
+from models.gecko import CoinGeckoDerivativesTickers
+from providers import Provider, provider_registry
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_SCHEMA = {
+    "ts": "int64",
+    "market": "U",
+    "symbol": "U",
+    "index_id": "U",
+    "contract_type": "U",
+    "price": "float64",
+    "index": "float64",
+    "basis": "float64",
+    "spread": "float64",
+    "funding_rate": "float64",
+    "open_interest": "float64",
+    "volume_24h": "float64",
+    "last_traded_at": "int64",
+}
+NUMERIC_FIELDS = ("price", "index", "basis", "spread", "funding_rate", "open_interest", "volume_24h")
+
+
+def tickers_to_columns(tickers: List[CoinGeckoDerivativesTickers], ts: int) -> Dict[str, np.ndarray]:
+    """
+    :param ts: snapshot time in ns since epoch, shared by every row
+    :return: {column: array} in the layout of DERIVATIVES_SCHEMA, missing numbers are NaN (0 for last_traded_at)
+    """
+    frame = pd.DataFrame([asdict(ticker) for ticker in tickers],
+                         columns=[field for field in DERIVATIVES_SCHEMA if field != "ts"])
+    columns = {"ts": np.full(len(frame), ts, dtype=np.int64)}
+    for field, dtype in DERIVATIVES_SCHEMA.items():
+        if field == "ts":
+            continue
+        if dtype == "U":
+            columns[field] = frame[field].fillna("").astype(str).to_numpy()
+        else:
+            values = pd.to_numeric(frame[field], errors="coerce")
+            columns[field] = (values.fillna(0) if dtype == "int64" else values).to_numpy(dtype=dtype)
+    return columns
+
+
+class DerivativesCollector(object):
+    """
+    class DerivativesCollector snapshotting the derivatives tickers of CoinGecko into a ColumnTable partitioned by
+    day, to build the funding rate and basis history of every market/symbol over months
+
+    eg: collector = DerivativesCollector("data/derivatives", interval=3600)
+        collector.collect()  # or await collector.run() / collector.start() in an event loop
+        collector.funding_history(start="2022-01-01", symbol="BTCUSDT")
+    """
+    def __init__(self, root: str, client=None, interval: float = 3600.0):
+        """
+        :param root: directory of the table
+        :param client: CoinGeckoClient, a new one by default
+        :param interval: seconds between two snapshots
+        """
+        self._table = ColumnTable(root, DERIVATIVES_SCHEMA)
+        self._client = client
+        self._interval = interval
+        self._task = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = provider_registry.get(Provider.COINGECKO)()
+        return self._client
+
+    @property
+    def table(self) -> ColumnTable:
+        return self._table
+
+    def collect(self, ts: int = None) -> int:
+        """
+        Fetch one snapshot of the tickers and append it
+        :param ts: snapshot time in ns since epoch, now by default
+        :return: number of rows written
+        """
+        tickers = self.client.get_derivatives_tickers()
+        return self._table.append(tickers_to_columns(tickers, time.time_ns() if ts is None else ts))
+
+    async def run(self):
+        """
+        Collect forever, the blocking http calls and writes run in the default executor
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                logger.info("derivatives snapshot : %s rows", await loop.run_in_executor(None, self.collect))
+            except Exception:
+                logger.exception("derivatives snapshot failed")
+            await asyncio.sleep(max(self._interval - (loop.time() - started), 0))
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def history(self, field: str, start=None, end=None, market: Union[str, Iterable[str]] = None,
+                symbol: Union[str, Iterable[str]] = None) -> pd.DataFrame:
+        """
+        :param field: one of NUMERIC_FIELDS
+        :param market: market(s) kept, all by default
+        :param symbol: symbol(s) kept, all by default
+        :return: values of the field indexed by snapshot time, one column per (market, symbol)
+        """
+        if field not in NUMERIC_FIELDS:
+            raise ValueError(f"field should be one of {NUMERIC_FIELDS} current value is : {field}")
+        where = {name: value for name, value in (("market", market), ("symbol", symbol)) if value is not None}
+        data = self._table.read(start, end, columns=["ts", "market", "symbol", field], where=where)
+        # factorize the snapshots and the series then scatter the values in a dense matrix
+        ts, row = np.unique(data["ts"], return_inverse=True)
+        keys = pd.MultiIndex.from_arrays([data["market"], data["symbol"]], names=["market", "symbol"])
+        column, series = pd.factorize(keys, sort=True)
+        values = np.full((len(ts), len(series)), np.nan)
+        values[row, column] = data[field]
+        return pd.DataFrame(values, index=pd.DatetimeIndex(ts.astype("datetime64[ns]"), name="ts"),
+                            columns=pd.MultiIndex.from_tuples(list(series), names=["market", "symbol"]))
+
+    def funding_history(self, start=None, end=None, market: Union[str, Iterable[str]] = None,
+                        symbol: Union[str, Iterable[str]] = None) -> pd.DataFrame:
+        return self.history("funding_rate", start, end, market, symbol)
+
+    def basis_history(self, start=None, end=None, market: Union[str, Iterable[str]] = None,
+                      symbol: Union[str, Iterable[str]] = None) -> pd.DataFrame:
+        return self.history("basis", start, end, market, symbol)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="collect the CoinGecko derivatives tickers")
+    parser.add_argument("root", help="directory of the table")
+    parser.add_argument("--interval", type=float, default=3600.0, help="seconds between two snapshots")
+    parser.add_argument("--once", action="store_true", help="collect one snapshot and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    collector = DerivativesCollector(args.root, interval=args.interval)
+    if args.once:
+        print(collector.collect())
+    else:
+        asyncio.run(collector.run())
@@ -0,0 +1,231 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from columnstore import ColumnTable
+from models.gecko import CoinGeckoExchange
+from providers import Provider, provider_registry
+
+logger = logging.getLogger(__name__)
+
+VOLUME_SCHEMA = {
+    "ts": "int64",
+    "exchange": "U",
+    "volume_btc": "float64",
+}
+EXCHANGE_SCHEMA = {
+    "ts": "int64",
+    "exchange": "U",
+    "name": "U",
+    "country": "U",
+    "year_established": "float64",
+    "trust_score": "float64",
+    "trust_score_rank": "float64",
+    "trade_volume_24h_btc": "float64",
+    "trade_volume_24h_btc_normalized": "float64",
+}
+EXCHANGES_PER_PAGE = 250
+
+
+def exchanges_to_columns(exchanges: List[CoinGeckoExchange], ts: int) -> Dict[str, np.ndarray]:
+    """
+    :param ts: snapshot time in ns since epoch, shared by every row
+    :return: {column: array} in the layout of EXCHANGE_SCHEMA, missing numbers are NaN
+    """
+    frame = pd.DataFrame([asdict(exchange) for exchange in exchanges],
+                         columns=[field for field in CoinGeckoExchange.__dataclass_fields__])
+    columns = {"ts": np.full(len(frame), ts, dtype=np.int64),
+               "exchange": frame["id"].fillna("").astype(str).to_numpy()}
+    for field, dtype in EXCHANGE_SCHEMA.items():
+        if field in columns:
+            continue
+        if dtype == "U":
+            columns[field] = frame[field].fillna("").astype(str).to_numpy()
+        else:
+            columns[field] = pd.to_numeric(frame[field], errors="coerce").to_numpy(dtype=dtype)
+    return columns
+
+
+class ExchangeVolumeCollector(object):
+    """
+    class ExchangeVolumeCollector gathering the volume charts of every exchange of CoinGecko in a ColumnTable
+    partitioned by day, rows keyed by (exchange, ts), for market shares and rolling volumes over all the exchanges
+
+    The metadata and the 24h volumes of the exchanges come from the /exchanges pages (250 exchanges per request)
+    and are stored in a second table, /exchanges/{id} is never fetched
+
+    eg: collector = ExchangeVolumeCollector("data/exchanges")
+        collector.collect(days=90)
+        collector.market_share(start="2022-03-01"), collector.rolling_volume(7)
+    """
+    def __init__(self, root: str, client=None, max_workers: int = 8):
+        """
+        :param root: directory of the tables, volumes/ and exchanges/ below it
+        :param client: CoinGeckoClient, a new one by default
+        :param max_workers: volume charts fetched at the same time
+        """
+        self._volumes = ColumnTable(f"{root}/volumes", VOLUME_SCHEMA)
+        self._exchanges = ColumnTable(f"{root}/exchanges", EXCHANGE_SCHEMA)
+        self._client = client
+        self._max_workers = max_workers
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = provider_registry.get(Provider.COINGECKO)()
+        return self._client
+
+    @property
+    def volumes_table(self) -> ColumnTable:
+        return self._volumes
+
+    @property
+    def exchanges_table(self) -> ColumnTable:
+        return self._exchanges
+
+    def exchange_ids(self) -> List[str]:
+        """
+        :return: ids of every exchange, see get_exchanges_id
+        """
+        return [exchange.id for exchange in self.client.get_exchanges_id()]
+
+    def collect_exchanges(self, ts: int = None, per_page: int = EXCHANGES_PER_PAGE) -> int:
+        """
+        Fetch the metadata and 24h volumes of every exchange, page by page, and append one snapshot
+        :param ts: snapshot time in ns since epoch, now by default
+        :return: number of rows written
+        """
+        exchanges, seen, page = list(), set(), 1
+        while True:
+            wave = [exchange for exchange in self.client.get_exchanges(per_page=per_page, page=page)
+                    if exchange.id not in seen]
+            exchanges += wave
+            seen.update(exchange.id for exchange in wave)
+            # the last page is incomplete, a failed page (empty) or exchanges already seen (the same page served
+            # again) also end it
+            if len(wave) < per_page:
+                break
+            page += 1
+        return self._exchanges.append(exchanges_to_columns(exchanges, time.time_ns() if ts is None else ts))
+
+    def _chart(self, exchange: str, days: int) -> Dict[str, np.ndarray]:
+        try:
+            chart = self.client.get_exchange_volume_chart(exchange, str(days))
+        except Exception:
+            logger.exception("volume chart of %s failed", exchange)
+            chart = list()
+        points = np.array([[point.timestamp, point.volume] for point in chart], dtype=np.float64).reshape(-1, 2)
+        return {"ts": (points[:, 0] * 1_000_000).astype(np.int64), "exchange": np.full(len(points), exchange),
+                "volume_btc": points[:, 1]}
+
+    def _new_rows(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        :return: columns without the (exchange, ts) already stored, so collecting overlapping ranges is idempotent
+        """
+        if len(columns["ts"]) == 0:
+            return columns
+        stored = self._volumes.read(int(columns["ts"].min()), int(columns["ts"].max()), columns=["ts", "exchange"])
+        keys = pd.MultiIndex.from_arrays([columns["exchange"], columns["ts"]])
+        new = ~keys.isin(pd.MultiIndex.from_arrays([stored["exchange"], stored["ts"]]))
+        # a chart may repeat its last point
+        new &= ~keys.duplicated(keep="last")
+        return {name: values[new] for name, values in columns.items()}
+
+    def collect(self, days: int = 30, exchanges: Iterable[str] = None, metadata: bool = True) -> int:
+        """
+        Fetch the volume charts of the exchanges concurrently and append the points not stored yet
+        :param days: days of the charts (CoinGecko returns one point per day above 30 days)
+        :param exchanges: exchange ids, all of get_exchanges_id by default
+        :param metadata: also snapshot the metadata and 24h volumes of every exchange, see collect_exchanges
+        :return: number of volume rows written
+        """
+        if metadata:
+            self.collect_exchanges()
+        exchanges = self.exchange_ids() if exchanges is None else list(exchanges)
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            charts = list(executor.map(lambda exchange: self._chart(exchange, days), exchanges))
+        if not charts:
+            return 0
+        columns = {name: np.concatenate([chart[name] for chart in charts]) for name in VOLUME_SCHEMA}
+        return self._volumes.append(self._new_rows(columns))
+
+    def metadata(self) -> pd.DataFrame:
+        """
+        :return: last snapshot of the metadata and 24h volumes indexed by exchange id, ts is the snapshot time
+        """
+        days = self._exchanges.partitions()
+        if not days:
+            return pd.DataFrame(columns=[field for field in EXCHANGE_SCHEMA if field != "exchange"])
+        frame = pd.DataFrame(self._exchanges.read(start=days[-1]))
+        frame = frame[frame["ts"] == frame["ts"].max()].set_index("exchange")
+        frame["ts"] = pd.to_datetime(frame["ts"], unit="ns")
+        return frame
+
+    def volumes(self, start=None, end=None, exchanges: Union[str, Iterable[str]] = None,
+                frequency: str = "D") -> pd.DataFrame:
+        """
+        :param exchanges: exchange(s) kept, all by default
+        :param frequency: the points are averaged by period of this fixed pandas frequency (D, 7D, h...),
+                          the charts of different exchanges are not sampled at the same instants
+        :return: volumes in BTC indexed by period, one column per exchange
+        """
+        where = dict() if exchanges is None else {"exchange": exchanges}
+        data = self._volumes.read(start, end, columns=["ts", "exchange", "volume_btc"], where=where)
+        # factorize the periods and the exchanges then average the values in a dense matrix
+        step = to_offset(frequency).nanos
+        period, row = np.unique(data["ts"] // step * step, return_inverse=True)
+        column, names = pd.factorize(data["exchange"], sort=True)
+        totals = np.zeros((len(period), len(names)))
+        counts = np.zeros((len(period), len(names)))
+        np.add.at(totals, (row, column), data["volume_btc"])
+        np.add.at(counts, (row, column), 1.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = totals / counts
+        return pd.DataFrame(values, index=pd.DatetimeIndex(period.astype("datetime64[ns]"), name="ts"),
+                            columns=pd.Index(names, name="exchange"))
+
+    def market_share(self, start=None, end=None, exchanges: Union[str, Iterable[str]] = None,
+                     frequency: str = "D") -> pd.DataFrame:
+        """
+        :return: share of every exchange in the volume of all the exchanges stored, by period
+        """
+        volumes = self.volumes(start, end, frequency=frequency)
+        shares = volumes.div(volumes.sum(axis=1, min_count=1), axis=0)
+        if exchanges is None:
+            return shares
+        return shares[[exchanges] if isinstance(exchanges, str) else list(exchanges)]
+
+    def rolling_volume(self, window: int, start=None, end=None, exchanges: Union[str, Iterable[str]] = None,
+                       frequency: str = "D") -> pd.DataFrame:
+        """
+        :param window: periods summed
+        :return: volume of every exchange summed over the last window periods, missing periods count as 0,
+                 NaN until the window is full
+        """
+        if window < 1:
+            raise ValueError(f"window should be a positive number of periods current value is : {window}")
+        volumes = self.volumes(start, end, exchanges, frequency)
+        values = np.nan_to_num(volumes.to_numpy(), nan=0.0)
+        total = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+        rolling = np.full(values.shape, np.nan)
+        rolling[window - 1:] = total[window:] - total[:-window]
+        return pd.DataFrame(rolling, index=volumes.index, columns=volumes.columns)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="collect the volume charts of the CoinGecko exchanges")
+    parser.add_argument("root", help="directory of the tables")
+    parser.add_argument("--days", type=int, default=30, help="days of the volume charts")
+    parser.add_argument("--workers", type=int, default=8, help="volume charts fetched at the same time")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(ExchangeVolumeCollector(args.root, max_workers=args.workers).collect(args.days))
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from providers import Provider, provider_registry
+
+logger = logging.getLogger(__name__)
+
+
+class PriceFeed(object):
+    """
+    class PriceFeed polling the prices of a universe of coins with one CoinGeckoClient and pushing only the prices
+    which changed since the previous poll to every subscriber (asyncio queues), so many consumers share one
+    upstream poller
+
+    Messages are dicts {"ts": poll time in epoch seconds, "prices": {id: {currency: price}}}, the first message of
+    a new subscriber is the full current snapshot
+
+    With on_demand the poller only runs while there are subscribers: the first one starts it and it is stopped
+    when the last one leaves, so an idle server does not spend the upstream rate limit
+    """
+    def __init__(
+            self,
+            ids: Iterable[str],
+            vs_currencies: Union[str, Iterable[str]] = "usd",
+            interval: float = 60.0,
+            client=None,
+            tolerance: float = 0.0,
+            on_demand: bool = False
+    ):
+        """
+        :param interval: seconds between two polls
+        :param client: CoinGeckoClient, a new one on the first poll by default
+        :param tolerance: relative change under which a price is not considered as changed
+        :param on_demand: poll only while there are subscribers, subscribe is then called in a running event loop
+        """
+        self._ids = list(ids)
+        self._vs_currencies = vs_currencies if isinstance(vs_currencies, str) else ",".join(vs_currencies)
+        self._interval = interval
+        self._client = client
+        self._tolerance = tolerance
+        self._on_demand = on_demand
+        self._snapshot = pd.DataFrame()
+        self._subscribers: List[asyncio.Queue] = list()
+        self._task = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = provider_registry.get(Provider.COINGECKO)()
+        return self._client
+
+    @property
+    def on_demand(self) -> bool:
+        return self._on_demand
+
+    @property
+    def snapshot(self) -> pd.DataFrame:
+        """
+        :return: last polled prices, indexed by coin id with one column per currency
+        """
+        return self._snapshot
+
+    def subscribe(self, maxsize: int = 100) -> asyncio.Queue:
+        """
+        :param maxsize: messages kept for a slow subscriber, the oldest one is dropped when the queue is full
+        """
+        queue = asyncio.Queue(maxsize=maxsize)
+        if not self._snapshot.empty:
+            queue.put_nowait(self._message(self._snapshot, time.time()))
+        self._subscribers.append(queue)
+        if self._on_demand:
+            self.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+        if self._on_demand and not self._subscribers and self._task is not None:
+            # a poll already running in the executor completes, its result is dropped with the task
+            self._task.cancel()
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @staticmethod
+    def _message(prices: pd.DataFrame, ts: float) -> Dict:
+        return {"ts": ts, "prices": {id: {currency: price for currency, price in row.items() if not pd.isna(price)}
+                                     for id, row in prices.to_dict(orient="index").items()}}
+
+    def diff(self, current: pd.DataFrame) -> pd.DataFrame:
+        """
+        :return: rows of current with at least one price changed (or new) compared with the last snapshot,
+                 unchanged prices of these rows are masked with NaN
+        """
+        previous = self._snapshot.reindex(index=current.index, columns=current.columns)
+        now, before = current.to_numpy(dtype=np.float64), previous.to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moved = np.abs(now - before) > self._tolerance * np.abs(before)
+        changed = (moved | np.isnan(before)) & ~np.isnan(now)
+        rows = changed.any(axis=1)
+        return current.where(changed)[rows]
+
+    def poll(self) -> pd.DataFrame:
+        """
+        Fetch the universe once and merge the prices returned into the snapshot, the coins (or currencies) missing
+        from a partial response (a chunk failed) keep their last price and are not republished on the next poll
+        :return: changed prices among the ones returned, see diff
+        """
+        # imported with the client, geckoclient stays out of the import path of the server
+        from geckoclient import IncompleteBatchError
+
+        try:
+            current = self.client.get_price_batch(self._ids, self._vs_currencies)
+        except IncompleteBatchError as error:
+            logger.warning("price feed poll incomplete: %s", error)
+            current = error.partial
+        changes = self.diff(current)
+        self._snapshot = current if self._snapshot.empty else current.combine_first(self._snapshot)
+        return changes
+
+    def publish(self, changes: pd.DataFrame, ts: float = None):
+        if changes.empty:
+            return
+        message = self._message(changes, time.time() if ts is None else ts)
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def run(self):
+        """
+        Poll forever, the blocking http calls run in the default executor
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                self.publish(await loop.run_in_executor(None, self.poll))
+            except Exception:
+                logger.exception("price feed poll failed")
+            await asyncio.sleep(max(self._interval - (loop.time() - started), 0))
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,20 +1,44 @@
-import ast
-from typing import List
-import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Dict, Iterable, List, Union
 import pandas as pd
 import requests
 from datetime import datetime, tzinfo, timedelta
-from base import BaseClient
+from urllib.parse import quote
+from base import BaseClient, RequestSpec
 from requests import *
 
 from models.gecko import *
 
 
+# conservative limit for the length of the urls, proxies and CDNs start rejecting them around 2k-8k characters
+MAX_URL_LENGTH = 2000
+# /coins/markets returns at most 250 coins per page
+MARKETS_PER_PAGE = 250
+
+
+class IncompleteBatchError(Exception):
+    """
+    A chunk of ids or a page of a batch request failed (rate limit, server error...)
+    failed holds the ids (or page numbers) not fetched and partial the DataFrame of the ones fetched
+    """
+    def __init__(self, message: str, failed: list, partial: pd.DataFrame):
+        super().__init__(message)
+        self.failed = failed
+        self.partial = partial
+
+
 class CoinGeckoClient(BaseClient):
     __base_url = 'https://api.coingecko.com/api/v3/'
 
-    def __init__(self, base_url=__base_url):
+    def __init__(self, base_url=__base_url, session: Session = None):
+        """
+        :param base_url: root of the API, points to a local mock server in benchmarks
+        :param session: shared Session reusing its connection pool across requests,
+                        a new Session is opened for each request when None
+        """
         self.base_url = base_url
+        self._session = session
 
     #@property
     #def credentials(self):
@@ -22,13 +46,17 @@ class CoinGeckoClient(BaseClient):
 
     @property
     def session(self):
-        return Session()
+        return Session() if self._session is None else self._session
+
+    def _flight_scope(self):
+        # the clients without a session all send their requests with a new default Session, they can share them
+        return type(self).__name__, None if self._session is None else id(self._session)
 
     def _get_url(self, route):
         return self.base_url + route
 
     def ping(self):
-        response = self._get(f"ping")
+        response = self._fetch(RequestSpec("ping"))
         return response
 
     # ========= SIMPLE =============
@@ -54,8 +82,14 @@ class CoinGeckoClient(BaseClient):
                  include_24hr_change : str = 'false',
                  include_last_updated_at : str = 'false'
          """
-        url = f'{self.base_url}simple/token_price/{id}?&contract_addresses={contract_addresses}&vs_currencies={vs_currencies}&include_market_cap={include_market_cap}&include_24hr_vol={include_24hr_vol}&include_24hr_change={include_24hr_change}&include_last_updated_at={include_last_updated_at} '
-        response = self._geturl(url)
+        response = self._fetch(RequestSpec("simple/token_price/{id}",
+                                           id=id,
+                                           contract_addresses=contract_addresses,
+                                           vs_currencies=vs_currencies,
+                                           include_market_cap=include_market_cap,
+                                           include_24hr_vol=include_24hr_vol,
+                                           include_24hr_change=include_24hr_change,
+                                           include_last_updated_at=include_last_updated_at))
         df = pd.DataFrame(response)
         return df
 
@@ -63,15 +97,56 @@ class CoinGeckoClient(BaseClient):
         """
         Function that fetches and returns supported coins id, name and symbol
         """
-        ids = ids.replace(' ', '')
-        vs_currencies = vs_currencies.replace(' ', '')
-        url = '{a}simple/price?ids={b}&vs_currencies={c}'.format(a=self.base_url, b=ids, c=vs_currencies)
-        response = self._geturl(url)
+        response = self._fetch(RequestSpec("simple/price", ids=ids, vs_currencies=vs_currencies))
         # prices = json.dumps([{"asset": b[0], "prices": b[1]} for b in response])
         # prices = ast.literal_eval(prices)
         # prices = list(map(lambda x: CoinGeckoPrice.from_json(**x), prices))
         return response
 
+    def get_price_batch(self,
+                        ids: Iterable[str],
+                        vs_currencies: Union[str, Iterable[str]],
+                        max_url_length: int = MAX_URL_LENGTH,
+                        max_workers: int = 8) -> pd.DataFrame:
+        """
+        get_price for an arbitrary number of coins: ids are split in chunks keeping the urls under max_url_length,
+        the chunks are fetched concurrently and merged
+
+        :return: DataFrame indexed by coin id with one column per currency (and per include_* field)
+        :raises IncompleteBatchError: when a chunk failed, with the prices of the other chunks
+        """
+        prefix = RequestSpec("simple/price", vs_currencies=vs_currencies).url(self.base_url) + '&ids='
+        chunks = self._chunk_ids(ids, max_url_length - len(prefix))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(lambda chunk: self.get_price(','.join(chunk), vs_currencies), chunks))
+        prices = dict()
+        for response in responses:
+            prices.update(response or dict())
+        frame = pd.DataFrame.from_dict(prices, orient='index')
+        failed = [id for chunk, response in zip(chunks, responses) if response is None for id in chunk]
+        if failed:
+            raise IncompleteBatchError(f"get_price failed for {len(failed)} of {len(frame) + len(failed)} ids",
+                                       failed, frame)
+        return frame
+
+    @staticmethod
+    def _chunk_ids(ids: Iterable[str], max_length: int, max_size: int = None) -> List[List[str]]:
+        """
+        Split ids in chunks whose comma separated length in the url (percent-encoded) stays under max_length
+        (and count under max_size)
+        """
+        chunks, chunk, length = list(), list(), 0
+        for id in dict.fromkeys(id.strip() for id in ids if id.strip()):
+            size = len(quote(id, safe=''))
+            if chunk and (length + size + 1 > max_length or (max_size is not None and len(chunk) == max_size)):
+                chunks.append(chunk)
+                chunk, length = list(), 0
+            chunk.append(id)
+            length += size + 1
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
     # ========= COINS ==============
 
     def get_list(self, include_platform="false"):
@@ -79,9 +154,7 @@ class CoinGeckoClient(BaseClient):
         Function that fetches and returns supported coins id, name and symbol
 
         """
-        url = '{a}coins/list?{b}'.format(a=self.base_url, b=include_platform)
-        response = self.session.get(url)
-        content = json.loads(response.content.decode('utf-8'))
+        content = self._fetch(RequestSpec("coins/list", include_platform=include_platform))
         data = list(map(lambda x: CoinGeckoList.from_json(**x), content))
         return data
 
@@ -94,12 +167,68 @@ class CoinGeckoClient(BaseClient):
         ids:    The ids of the coin, comma separated cryptocurrency symbols (base). refers to /coins/list.
                 When left empty, returns numbers the coins observing the params limit and start
                 eg: bitcoin,etherum
-        """
-        ids = ids.replace(' ', '')
-        url = '{a}coins/markets?vs_currency={b}&ids={c}'.format(a=self.base_url, b=vs_currency, c=ids)
-        response = self._geturl(url)
-        data = list(map(lambda x: CoinGeckoMarkets.from_json(**x), response))
-        return data
+        kwargs: other query parameters: per_page (max 250), page, order, category...
+        """
+        return self._markets_page(vs_currency, ids, **kwargs) or list()
+
+    def _markets_page(self, vs_currency: str = None, ids: str = None, **kwargs) -> List[CoinGeckoMarkets]:
+        """
+        :return: markets of one request, None when it failed
+        """
+        response = self._fetch(RequestSpec("coins/markets", vs_currency=vs_currency, ids=ids, **kwargs))
+        if response is None:
+            return None
+        return list(map(lambda x: CoinGeckoMarkets.from_json(**x), response))
+
+    def get_markets_batch(self,
+                          vs_currency: str,
+                          ids: Iterable[str] = None,
+                          per_page: int = MARKETS_PER_PAGE,
+                          max_pages: int = None,
+                          max_url_length: int = MAX_URL_LENGTH,
+                          max_workers: int = 8,
+                          **kwargs) -> pd.DataFrame:
+        """
+        get_markets for an arbitrary number of coins, fetched concurrently and merged
+
+        ids given: they are split in chunks of at most per_page ids keeping the urls under max_url_length
+        ids None: the whole market is paginated, pages are requested max_workers at a time
+                  until a page comes back incomplete (or max_pages is reached)
+        :return: DataFrame indexed by coin id with one column per CoinGeckoMarkets field
+        :raises IncompleteBatchError: when a chunk (failed holds its ids) or a page (failed holds its number)
+                                      failed, with the markets fetched, the pagination stops after the wave
+        """
+        failed = list()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if ids is not None:
+                prefix = RequestSpec("coins/markets", vs_currency=vs_currency, per_page=per_page,
+                                     **kwargs).url(self.base_url) + '&ids='
+                chunks = self._chunk_ids(ids, max_url_length - len(prefix), per_page)
+                pages = list(executor.map(
+                    lambda chunk: self._markets_page(vs_currency, ','.join(chunk), per_page=per_page, **kwargs),
+                    chunks))
+                failed = [id for chunk, markets in zip(chunks, pages) if markets is None for id in chunk]
+            else:
+                pages, page = list(), 1
+                while max_pages is None or page <= max_pages:
+                    numbers = range(page, page + max_workers if max_pages is None
+                                    else min(page + max_workers, max_pages + 1))
+                    wave = list(executor.map(
+                        lambda number: self._markets_page(vs_currency, per_page=per_page, page=number, **kwargs),
+                        numbers))
+                    pages += wave
+                    page += len(numbers)
+                    failed = [number for number, markets in zip(numbers, wave) if markets is None]
+                    # a failed page says nothing about the end of the market: stop, and raise below
+                    if failed or any(len(markets) < per_page for markets in wave):
+                        break
+        markets = [asdict(market) for page_markets in pages if page_markets for market in page_markets]
+        frame = pd.DataFrame(markets, columns=[field for field in CoinGeckoMarkets.__dataclass_fields__])
+        frame = frame.drop_duplicates(subset='id').set_index('id')
+        if failed:
+            raise IncompleteBatchError(f"get_markets failed for {'ids' if ids is not None else 'pages'} "
+                                       f"{failed[:10]}{'...' if len(failed) > 10 else ''}", failed, frame)
+        return frame
 
     def get_ohlc(self, id: str = None, vs_currency: str = None, days: str = None):
         """
@@ -112,12 +241,8 @@ class CoinGeckoClient(BaseClient):
             31 and before: 4 days
 
         """
-        url = '{a}coins/{b}/ohlc?vs_currency={c}&days={d}'.format(a=self.base_url, b=id, c=vs_currency, d=days)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
-        ohlc = json.dumps([{"Date": b[0], "Open": b[1], "High": b[2], "Low": b[3], "Close": b[4]} for b in data])
-        data = ast.literal_eval(ohlc)
-        ohlc = list(map(lambda x: CoinGeckoOHLC.from_json(**x), data))
+        data = self._fetch(RequestSpec("coins/{id}/ohlc", id=id, vs_currency=vs_currency, days=days))
+        ohlc = [CoinGeckoOHLC.from_json(Date=b[0], Open=b[1], High=b[2], Low=b[3], Close=b[4]) for b in data]
         return ohlc
 
     def get_tickers_by_id(self, id: str = None, exchange_ids: str = None, **kwargs):
@@ -133,8 +258,7 @@ class CoinGeckoClient(BaseClient):
         (e.g. footnote, different background, change opacity, hide)
         """
 
-        url = '{a}coins/{b}/tickers?exchange_ids={c}'.format(a=self.base_url, b=id, c=exchange_ids)
-        response = self._geturl(url)
+        response = self._fetch(RequestSpec("coins/{id}/tickers", id=id, exchange_ids=exchange_ids))
         data = response.get("tickers")
         data = list(map(lambda x: TickersCoin.from_json(**x), data))
         return data
@@ -144,9 +268,8 @@ class CoinGeckoClient(BaseClient):
         """
         Function that fetches and returns historical data by range
         """
-        url = '{a}coins/{b}/market_chart/range?vs_currency={c}&from={d}&to={e}'.format(a=self.base_url, b=id,
-                                                                                       c=vs_currency, d=start, e=end)
-        response = self._geturl(url)
+        response = self._fetch(RequestSpec("coins/{id}/market_chart/range", id=id, vs_currency=vs_currency,
+                                           **{"from": start, "to": end}))
         data = [dict(zip(response, t)) for t in zip(*response.values())]
         market_chart_range = list(map(lambda x: CoinGeckoMarketChart.from_json(**x), data))
 
@@ -156,8 +279,7 @@ class CoinGeckoClient(BaseClient):
         """
         Function that fetches and returns historical data (name, price, market, stats) at a given date for a coin
         """
-        url = '{a}coins/{b}/market_chart?vs_currency={c}&days={d}'.format(a=self.base_url, b=id, c=vs_currency, d=days)
-        response = self._geturl(url)
+        response = self._fetch(RequestSpec("coins/{id}/market_chart", id=id, vs_currency=vs_currency, days=days))
         data = [dict(zip(response, t)) for t in zip(*response.values())]
         market_chart = list(map(lambda x: CoinGeckoMarketChart.from_json(**x), data))
         return market_chart
@@ -170,9 +292,7 @@ class CoinGeckoClient(BaseClient):
 
 
         """
-        url = '{0}asset_platforms'.format(self.base_url)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
+        data = self._fetch(RequestSpec("asset_platforms"))
         data = list(map(lambda x: CoinGeckoAssetPlatforms.from_json(**x), data))
         return data
 
@@ -182,7 +302,7 @@ class CoinGeckoClient(BaseClient):
         """
         Function that fetches and returns categories
         """
-        response = self._get(f"coins/categories/list")
+        response = self._fetch(RequestSpec("coins/categories/list"))
         data = list(map(lambda x: CoinGeckoCategory.from_json(**x), response))
         return data
 
@@ -190,21 +310,22 @@ class CoinGeckoClient(BaseClient):
         """
         Function that fetches and returns categories with market data
         """
-        response = self._get(f"coins/categories")
+        response = self._fetch(RequestSpec("coins/categories"))
         data = list(map(lambda x: CoinGeckoCategoriesData.from_json(**x), response))
         return data
 
     # ========= EXCHANGES  =========
 
-    def get_exchanges(self):
+    def get_exchanges(self, per_page: int = None, page: int = None):
         """
-        Function that fetches and returns exchanges
+        Function that fetches and returns exchanges with their metadata and 24h volumes in BTC
 
+        :param per_page: exchanges per page (max 250), 100 by default
+        :param page: page number, the first one by default
+        :return: exchanges of the page, empty when the request failed
         """
-        url = '{0}exchanges'.format(self.base_url)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
-        exchanges = list(map(lambda x: CoinGeckoExchange.from_json(**x), data))
+        data = self._fetch(RequestSpec("exchanges", per_page=per_page, page=page))
+        exchanges = list(map(lambda x: CoinGeckoExchange.from_json(**x), data or list()))
         return exchanges
 
     def get_exchanges_id(self):
@@ -213,9 +334,7 @@ class CoinGeckoClient(BaseClient):
 
         :returns list of exchanges with ids and names
         """
-        url = '{0}exchanges/list'.format(self.base_url)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
+        data = self._fetch(RequestSpec("exchanges/list"))
         data = list(map(lambda x: CoinGeckoExchangeID.from_json(**x), data))
         return data
 
@@ -230,9 +349,7 @@ class CoinGeckoClient(BaseClient):
         You are responsible for managing how you want to display these information (e.g. footnote, different
         background, change opacity, hide)
         """
-        url = '{a}exchanges/{b}'.format(a=self.base_url, b=id)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
+        data = self._fetch(RequestSpec("exchanges/{id}", id=id))
         volume = [{"name": data['name'], "trade_volume_24h_btc": data['trade_volume_24h_btc'],
                    "trade_volume_24h_btc_normalized": data['trade_volume_24h_btc_normalized']}]
         volume = list(map(lambda x: CoinGeckoExchangeVolume.from_json(**x), volume))
@@ -243,12 +360,8 @@ class CoinGeckoClient(BaseClient):
         Function that fetches and returns exchanges volume chart data for a given exchange
 
         """
-        url = '{a}exchanges/{b}/volume_chart?days={c}'.format(a=self.base_url, b=id, c=days)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
-        volume_chart = json.dumps([{"timestamp": b[0], "volume": b[1]} for b in data])
-        data = ast.literal_eval(volume_chart)
-        volume_chart = list(map(lambda x: CoinGeckVolumeChart.from_json(**x), data))
+        data = self._fetch(RequestSpec("exchanges/{id}/volume_chart", id=id, days=days))
+        volume_chart = [CoinGeckVolumeChart.from_json(timestamp=b[0], volume=b[1]) for b in data]
         return volume_chart
 
     # ========= INDEXES ===========
@@ -257,9 +370,7 @@ class CoinGeckoClient(BaseClient):
         """
         List all markets indexes
         """
-        url = '{a}indexes'.format(a=self.base_url)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
+        data = self._fetch(RequestSpec("indexes"))
         data = list(map(lambda x: CoinGeckoIndexes.from_json(**x), data))
         return data
 
@@ -269,20 +380,15 @@ class CoinGeckoClient(BaseClient):
         """
         List all derivative tickers
         """
-        url = '{a}derivatives'.format(a=self.base_url)
-        response = self.session.get(url)
-        data = json.loads(response.content.decode('utf-8'))
+        data = self._fetch(RequestSpec("derivatives"))
         data = list(map(lambda x: CoinGeckoDerivativesTickers.from_json(**x), data))
-        print(data)
         return data
 
     def get_derivatives_by_id(self, id: str = None):
         """
         Show derivative exchange data
         """
-        url = '{a}derivatives/exchanges/{b}'.format(a=self.base_url, b=id)
-        response = self.session.get(url)
-        data = [json.loads(response.content.decode('utf-8'))]
+        data = [self._fetch(RequestSpec("derivatives/exchanges/{id}", id=id))]
         data = list(map(lambda x: CoinGeckoDerivativesExchangeData.from_json(**x), data))
         return data
 
@@ -292,12 +398,14 @@ class CoinGeckoClient(BaseClient):
         """
         Function that fetches and returns BTC-to-Currency exchange rates
         """
-        response = self._get(f"exchange_rates")
-        for value in response.values():
-            rates = value
-        rates = [value for value in rates.values()]
-        rates = list(map(lambda x: CoinGeckoExchangeRate.from_json(**x), rates))
-        return rates
+        return list(self.get_exchange_rate_by_currency().values())
+
+    def get_exchange_rate_by_currency(self) -> Dict[str, CoinGeckoExchangeRate]:
+        """
+        Function that fetches and returns BTC-to-Currency exchange rates keyed by currency code (usd, eur, ...)
+        """
+        response = self._fetch(RequestSpec("exchange_rates"))
+        return {currency: CoinGeckoExchangeRate.from_json(**rate) for currency, rate in response["rates"].items()}
 
     # ========= GLOBAL ==============
 
@@ -306,8 +414,7 @@ class CoinGeckoClient(BaseClient):
         Get cryptocurrency global data
         request : https://api.coingecko.com/api/v3/global
         """
-        url = 'global'
-        response = self._get(url)
+        response = self._fetch(RequestSpec("global"))
         for value in response.values():
             global_data = [value]
         data = list(map(lambda x: CoinGeckoGlobal.from_json(**x), global_data))
@@ -318,8 +425,7 @@ class CoinGeckoClient(BaseClient):
         Get cryptocurrency global data
         request : https://api.coingecko.com/api/v3/global/decentralized_finance_defi
         """
-        url = 'global/decentralized_finance_defi'
-        response = self._get(url)
+        response = self._fetch(RequestSpec("global/decentralized_finance_defi"))
         for value in response.values():
             global_defi = [value]
         global_defi = list(map(lambda x: CoinGeckoGlobalDeFi.from_json(**x), global_defi))
@@ -0,0 +1,82 @@
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+
+class GroupIndex(object):
+    """
+    class GroupIndex: result of a grouping over integer codes (timestamps in nanoseconds, product ids...)
+    groups are given as index ranges [start, end) over the order permutation instead of sets of objects
+    """
+    def __init__(self, keys: np.ndarray, order: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+        self._keys = keys
+        self._order = order
+        self._starts = starts
+        self._ends = ends
+
+    @property
+    def keys(self) -> np.ndarray:
+        """
+        :return: unique codes sorted ascending
+        """
+        return self._keys
+
+    @property
+    def order(self) -> np.ndarray:
+        """
+        :return: permutation of the original positions sorting them by code
+        """
+        return self._order
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self._starts
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self._ends
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._ends - self._starts
+
+    def __len__(self):
+        return len(self._keys)
+
+    def indices(self, group: int) -> np.ndarray:
+        """
+        :return: original positions of the items of the group-th group
+        """
+        return self._order[self._starts[group]:self._ends[group]]
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        for group in range(len(self._keys)):
+            yield self._keys[group], self.indices(group)
+
+
+def group_codes(codes: np.ndarray) -> GroupIndex:
+    """
+    Group positions by integer code with one stable argsort, no Python level comparison
+    :param codes: integer codes, one per item
+    :return: GroupIndex
+    """
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    boundaries = np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1
+    starts = np.concatenate(([0], boundaries)).astype(np.int64)
+    ends = np.concatenate((boundaries, [len(codes)])).astype(np.int64)
+    if len(codes) == 0:
+        starts, ends = starts[:0], ends[:0]
+    return GroupIndex(keys=sorted_codes[starts], order=order, starts=starts, ends=ends)
+
+
+def bucket_by(iterable: Iterable, key_func: Callable, reverse: bool = True) -> Dict[Hashable, List]:
+    """
+    Group objects by key in one hash pass, only the distinct keys are sorted
+    :return: dict of key to list of objects, keys sorted (descending by default)
+    """
+    buckets = dict()
+    for item in iterable:
+        buckets.setdefault(key_func(item), list()).append(item)
+    return {key: buckets[key] for key in sorted(buckets, reverse=reverse)}
@@ -0,0 +1,299 @@
+"""
+Category and sector indices built from the CoinGecko categories: the constituents of a category are resolved with
+/coins/markets, their price and market cap histories are fetched concurrently and the market cap weighted levels
+are computed on the price matrix in one vectorized pass, then published as product codes of the Provider.INDEX
+data source so a BacktesterConfig can trade them like any coin
+
+eg: builder = IndexBuilder(top=20, cap=0.25)
+    index = builder.build("decentralized-finance-defi", Timestamp("2021-01-01"), Timestamp("2022-05-05"))
+    index_source.publish(index.batch)
+    BacktesterConfig(..., product_codes=[index.code, "bitcoin"],
+                     provider_by_code={index.code: Provider.INDEX})
+or directly product_codes=["index:decentralized-finance-defi"] with Provider.INDEX, built on first load
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import Timedelta, Timestamp
+
+from costs import level_path
+from datasources import DataSource, OHLCBatch
+from providers import Provider, provider_registry
+from rebalancing import Anchored, RebalancingSchedule, hold_weights
+
+INDEX_PREFIX = "index:"
+
+
+def cap_weights(market_caps: np.ndarray, cap: float = None, max_iter: int = 50) -> np.ndarray:
+    """
+    Market cap weights of every row, the weight above cap is redistributed to the other constituents in
+    proportion of their market caps until no weight exceeds it (all the rows at once)
+    :param market_caps: (T, N) market caps, NaN or 0 when the constituent is not listed
+    :param cap: highest weight of a constituent, raised to 1 / number of listed constituents when it is not
+                feasible, no cap by default
+    :return: (T, N) weights summing to 1 on the rows with a listed constituent
+    """
+    market_caps = np.nan_to_num(np.asarray(market_caps, dtype=np.float64), nan=0.0)
+    market_caps = np.maximum(market_caps, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.nan_to_num(market_caps / market_caps.sum(axis=1, keepdims=True), nan=0.0)
+    if cap is None:
+        return weights
+    listed = (market_caps > 0).sum(axis=1, keepdims=True)
+    limit = np.maximum(cap, 1 / np.maximum(listed, 1))
+    capped = np.zeros(weights.shape, dtype=bool)
+    for _ in range(max_iter):
+        over = weights > limit + 1e-12
+        if not over.any():
+            break
+        capped |= over
+        excess = np.where(over, weights - limit, 0.0).sum(axis=1, keepdims=True)
+        free = np.where(capped, 0.0, weights)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.nan_to_num(free / free.sum(axis=1, keepdims=True), nan=0.0)
+        weights = np.where(capped, limit, weights + excess * share)
+    return weights
+
+
+class CategoryIndex(object):
+    """
+    class CategoryIndex with the levels of a category index, its constituents and their weights
+    """
+    def __init__(self, code: str, category: str, calendar: pd.DatetimeIndex, levels: np.ndarray,
+                 constituents: List[str], weights: np.ndarray, rebalance: np.ndarray):
+        self._code = code
+        self._category = category
+        self._calendar = calendar
+        self._levels = levels
+        self._constituents = constituents
+        self._weights = weights
+        self._rebalance = rebalance
+
+    @property
+    def code(self) -> str:
+        """
+        :return: product code of the index in the Provider.INDEX data source
+        """
+        return self._code
+
+    @property
+    def category(self) -> str:
+        return self._category
+
+    @property
+    def constituents(self) -> List[str]:
+        return self._constituents
+
+    @property
+    def levels(self) -> pd.Series:
+        return pd.Series(self._levels, index=self._calendar, name=self._code)
+
+    @property
+    def weights(self) -> pd.DataFrame:
+        """
+        :return: weight of every constituent (columns) held after the close of every date
+        """
+        return pd.DataFrame(self._weights, index=self._calendar, columns=self._constituents)
+
+    @property
+    def rebalance_dates(self) -> pd.DatetimeIndex:
+        return self._calendar[self._rebalance]
+
+    @property
+    def batch(self) -> OHLCBatch:
+        """
+        :return: levels as bars (open, high, low and close are the level of the date)
+        """
+        ts = self._calendar.values.astype("datetime64[ns]").astype(np.int64)
+        return OHLCBatch(product_code=self._code, ts=ts, open=self._levels, high=self._levels, low=self._levels,
+                         close=self._levels)
+
+
+class IndexBuilder(object):
+    """
+    class IndexBuilder building market cap weighted indices of the CoinGecko categories
+
+    The histories are fetched max_workers coins at a time and kept by coin and range, so several indices sharing
+    constituents (eg: DeFi and Ethereum ecosystem) and the rebuilds of an index only fetch every coin once,
+    the requests made at the same time for the same coin are coalesced by the single flight of the client
+    """
+    def __init__(
+            self,
+            client=None,
+            vs_currency: str = "usd",
+            frequency: str = "D",
+            rebalancing: RebalancingSchedule = None,
+            top: int = None,
+            cap: float = None,
+            basis: float = 100.0,
+            max_workers: int = 8
+    ):
+        """
+        :param client: CoinGeckoClient, a new one by default
+        :param frequency: pandas frequency of the calendar of the levels
+        :param rebalancing: dates where the weights are reset to the market caps, monthly by default
+        :param top: largest market caps of the category kept as constituents, all by default
+        :param cap: highest weight of a constituent, see cap_weights
+        """
+        self._client = client
+        self._vs_currency = vs_currency
+        self._frequency = frequency
+        self._rebalancing = Anchored("M") if rebalancing is None else rebalancing
+        self._top = top
+        self._cap = cap
+        self._basis = basis
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        # (coin, first and last second requested) -> (ns timestamps, prices, market caps)
+        self._history: Dict[Tuple[str, int, int], Tuple[np.ndarray, np.ndarray, np.ndarray]] = dict()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = provider_registry.get(Provider.COINGECKO)()
+        return self._client
+
+    @property
+    def vs_currency(self) -> str:
+        return self._vs_currency
+
+    def categories(self) -> pd.DataFrame:
+        """
+        :return: categories with their market data (get_categories_data) indexed by category id,
+                 largest market cap first
+        """
+        frame = pd.DataFrame([vars(category) for category in self.client.get_categories_data()])
+        return frame.set_index("id").sort_values("market_cap", ascending=False)
+
+    def constituents(self, category: str, top: int = None) -> List[str]:
+        """
+        :param category: category id, see categories()
+        :return: coin ids of the category, largest market cap first
+        """
+        top = self._top if top is None else top
+        markets = self.client.get_markets_batch(self._vs_currency, category=category, order="market_cap_desc",
+                                                max_workers=self._max_workers)
+        ids = markets["market_cap"].astype(np.float64).sort_values(ascending=False, kind="stable").index
+        return list(ids if top is None else ids[:top])
+
+    def history(self, coin: str, start: Timestamp, end: Timestamp) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: (int64 ns timestamps, prices, market caps) of the coin between start and end
+        """
+        # one day of margin before start so the first date has a price to look back to
+        first = int((Timestamp(start) - Timedelta(days=1)).value // 10 ** 9)
+        last = int(Timestamp(end).value // 10 ** 9)
+        key = (coin, first, last)
+        with self._lock:
+            cached = self._history.get(key)
+        if cached is not None:
+            return cached
+        chart = self.client.get_market_chart_by_range(coin, self._vs_currency, str(first), str(last))
+        prices = np.array([point.prices for point in chart], dtype=np.float64).reshape(-1, 2)
+        market_caps = np.array([point.market_caps for point in chart], dtype=np.float64).reshape(-1, 2)
+        ts = (prices[:, 0] * 1_000_000).astype(np.int64)
+        order = np.argsort(ts, kind="stable")
+        history = (ts[order], prices[order, 1], market_caps[order, 1])
+        with self._lock:
+            self._history[key] = history
+        return history
+
+    def matrices(self, coins: List[str], start: Timestamp, end: Timestamp) -> Tuple[pd.DatetimeIndex, np.ndarray,
+                                                                                     np.ndarray]:
+        """
+        Histories of the coins fetched concurrently and aligned on the calendar, last point at or before every date
+        :return: (calendar, (T, N) prices, (T, N) market caps), NaN before the first point of a coin
+        """
+        calendar = pd.date_range(Timestamp(start), Timestamp(end), freq=self._frequency)
+        ts = calendar.values.astype("datetime64[ns]").astype(np.int64)
+        prices = np.full((len(ts), len(coins)), np.nan)
+        market_caps = np.full((len(ts), len(coins)), np.nan)
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            histories = list(executor.map(lambda coin: self.history(coin, start, end), coins))
+        for column, (history_ts, history_prices, history_caps) in enumerate(histories):
+            position = np.searchsorted(history_ts, ts, side="right") - 1
+            known = position >= 0
+            prices[known, column] = history_prices[position[known]]
+            market_caps[known, column] = history_caps[position[known]]
+        return calendar, prices, market_caps
+
+    def build(self, category: str, start: Timestamp, end: Timestamp, top: int = None,
+              code: str = None) -> CategoryIndex:
+        """
+        :param category: category id, see categories()
+        :param code: product code of the index, INDEX_PREFIX + category by default
+        :return: market cap weighted index of the category, reset to the (capped) market cap weights on the
+                 rebalancing dates and drifting with the prices in between
+        """
+        coins = self.constituents(category, top)
+        if not coins:
+            raise ValueError(f"category {category} has no constituent in {self._vs_currency}")
+        calendar, prices, market_caps = self.matrices(coins, start, end)
+        targets = cap_weights(market_caps, self._cap)
+        rebalance = self._rebalancing.mask(calendar, prices, targets)
+        weights = hold_weights(prices, targets, rebalance)
+        levels, _, _ = level_path(prices, weights, basis=self._basis, rebalance=rebalance)
+        return CategoryIndex(code=code or INDEX_PREFIX + category, category=category, calendar=calendar,
+                             levels=levels, constituents=coins, weights=weights, rebalance=rebalance)
+
+
+class IndexSource(DataSource):
+    """
+    Levels of the published indices, params is the CGParams of the config (its vs_currency)
+    A product code starting with INDEX_PREFIX which has not been published is built from its category by the
+    builder on first load, over the dates requested, and rebuilt over both ranges when a later load asks for dates
+    (or a currency) the built index does not cover
+    """
+    def __init__(self, builder: IndexBuilder = None):
+        self._builder = builder
+        self._batches: Dict[str, OHLCBatch] = dict()
+        # product code -> (start, end, vs_currency) of the indices built here, the published ones are kept as is
+        self._built: Dict[str, Tuple[Timestamp, Timestamp, str]] = dict()
+
+    @property
+    def product_codes(self) -> List[str]:
+        return list(self._batches)
+
+    def publish(self, batch: OHLCBatch):
+        self._batches[batch.product_code] = batch
+        self._built.pop(batch.product_code, None)
+
+    def unpublish(self, product_code: str):
+        self._batches.pop(product_code, None)
+        self._built.pop(product_code, None)
+
+    def _covers(self, product_code: str, start, end, vs_currency: str) -> bool:
+        if product_code not in self._batches:
+            return False
+        if product_code not in self._built:
+            return True
+        first, last, built_currency = self._built[product_code]
+        return built_currency == vs_currency and (start is None or Timestamp(start) >= first) \
+            and (end is None or Timestamp(end) <= last)
+
+    def load(self, product_code, params=None, start=None, end=None) -> OHLCBatch:
+        vs_currency = getattr(params, "vs_currency", None) or "usd"
+        if not self._covers(product_code, start, end, vs_currency):
+            if not product_code.startswith(INDEX_PREFIX):
+                raise KeyError(f"No index published for {product_code}")
+            if start is None or end is None:
+                raise ValueError(f"start and end are needed to build {product_code}")
+            start, end = Timestamp(start), Timestamp(end)
+            if product_code in self._built and self._built[product_code][2] == vs_currency:
+                # the levels are chained from the first date, the whole union is rebuilt rather than appended
+                first, last, _ = self._built[product_code]
+                first, last = min(first, start), max(last, end)
+            else:
+                first, last = start, end
+            if self._builder is None or self._builder.vs_currency != vs_currency:
+                self._builder = IndexBuilder(vs_currency=vs_currency)
+            index = self._builder.build(product_code[len(INDEX_PREFIX):], first, last, code=product_code)
+            self.publish(index.batch)
+            self._built[product_code] = (first, last, vs_currency)
+        return self._batches[product_code].slice(start, end)
+
+
+index_source = IndexSource()
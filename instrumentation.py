@@ -0,0 +1,146 @@
+import logging
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the histogram buckets, seconds for durations and bytes for response sizes
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+PHASES = ("ttfb", "download", "parse", "total")
+
+
+@dataclass
+class RequestEvent:
+    """
+    Measures of one HTTP request emitted by BaseClient to its hooks
+    ttfb is the time until the response headers are received, it includes name resolution and connection
+    when the pooled connection is not reused (requests does not expose them separately),
+    download is the time to read the body and parse the time to decode it
+    response_bytes is the size of the decompressed body, wire_bytes the size received when the server gives it
+    cache_hit is True when the response came from the cache of the session (requests-cache) and for the callers
+    which got the result of an identical request in flight (single flight), these have no status and total is
+    their wait, retries is the number of retries of the urllib3 Retry of the session adapter
+    """
+    endpoint: str
+    url: str
+    status: int = None
+    response_bytes: int = 0
+    wire_bytes: int = None
+    content_encoding: str = None
+    ttfb: float = None
+    download: float = None
+    parse: float = None
+    total: float = None
+    cache_hit: bool = None
+    retries: int = 0
+    error: str = None
+
+
+class Histogram(object):
+    """
+    class Histogram with fixed bucket upper bounds, in the cumulative layout of the Prometheus histograms
+    """
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = tuple(buckets)
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        :return: (upper bound, number of observations lower or equal) for every bucket and +Inf
+        """
+        total, result = 0, list()
+        for bound, count in zip(self._buckets + (float("inf"),), self._counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class MetricsRegistry(object):
+    """
+    class MetricsRegistry aggregating RequestEvent in per endpoint histograms and counters
+    register it on the client with BaseClient.add_hook(registry.observe)
+    """
+    def __init__(self, prefix: str = "coingecko_client"):
+        self._prefix = prefix
+        self._lock = threading.Lock()
+        self._durations: Dict[Tuple[str, str], Histogram] = dict()
+        self._sizes: Dict[str, Histogram] = dict()
+        self._requests: Dict[Tuple[str, str], int] = dict()
+        self._cache: Dict[Tuple[str, str], int] = dict()
+        self._retries: Dict[str, int] = dict()
+
+    def observe(self, event: RequestEvent):
+        status = event.error if event.status is None else str(event.status)
+        with self._lock:
+            for phase in PHASES:
+                value = getattr(event, phase)
+                if value is not None:
+                    self._durations.setdefault((event.endpoint, phase), Histogram(DURATION_BUCKETS)).observe(value)
+            # a result shared with an identical request in flight is not a request of its own
+            if not (event.cache_hit and event.status is None):
+                self._sizes.setdefault(event.endpoint, Histogram(SIZE_BUCKETS)).observe(event.response_bytes)
+                self._requests[(event.endpoint, status)] = self._requests.get((event.endpoint, status), 0) + 1
+            if event.cache_hit is not None:
+                key = (event.endpoint, "hit" if event.cache_hit else "miss")
+                self._cache[key] = self._cache.get(key, 0) + 1
+            self._retries[event.endpoint] = self._retries.get(event.endpoint, 0) + event.retries
+
+    def histogram(self, endpoint: str, phase: str = "total") -> Histogram:
+        return self._durations.get((endpoint, phase))
+
+    def to_prometheus(self) -> str:
+        """
+        :return: metrics in the Prometheus text exposition format
+        """
+        name = self._prefix
+        lines = [f"# HELP {name}_request_duration_seconds Duration of the requests by endpoint and phase",
+                 f"# TYPE {name}_request_duration_seconds histogram"]
+        with self._lock:
+            for (endpoint, phase), histogram in sorted(self._durations.items()):
+                lines += self._histogram_lines(f"{name}_request_duration_seconds", histogram,
+                                               endpoint=endpoint, phase=phase)
+            lines += [f"# HELP {name}_response_bytes Size of the response bodies by endpoint",
+                      f"# TYPE {name}_response_bytes histogram"]
+            for endpoint, histogram in sorted(self._sizes.items()):
+                lines += self._histogram_lines(f"{name}_response_bytes", histogram, endpoint=endpoint)
+            lines += [f"# HELP {name}_requests_total Requests by endpoint and status",
+                      f"# TYPE {name}_requests_total counter"]
+            lines += [f"{name}_requests_total{{{_labels(endpoint=endpoint, status=status)}}} {count}"
+                      for (endpoint, status), count in sorted(self._requests.items())]
+            lines += [f"# HELP {name}_cache_total Cache lookups by endpoint and result",
+                      f"# TYPE {name}_cache_total counter"]
+            lines += [f"{name}_cache_total{{{_labels(endpoint=endpoint, result=result)}}} {count}"
+                      for (endpoint, result), count in sorted(self._cache.items())]
+            lines += [f"# HELP {name}_retries_total Retries by endpoint",
+                      f"# TYPE {name}_retries_total counter"]
+            lines += [f"{name}_retries_total{{{_labels(endpoint=endpoint)}}} {count}"
+                      for endpoint, count in sorted(self._retries.items())]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(name: str, histogram: Histogram, **labels) -> List[str]:
+        lines = [f"{name}_bucket{{{_labels(**labels, le=bound)}}} {count}" for bound, count in histogram.cumulative()]
+        lines.append(f"{name}_sum{{{_labels(**labels)}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{_labels(**labels)}}} {histogram.count}")
+        return lines
@@ -0,0 +1,138 @@
+"""
+Path dependent kernels (stop losses, drawdown de-risking) on the columnar price and weight arrays of the Backtester
+
+A kernel walks the dates once and returns the weights held after every close and the mask of the dates where the
+portfolio trades, to be priced by costs.level_path. The kernels are compiled with Numba when it is installed,
+the same code runs as plain python otherwise (the loop is over the dates only, the assets are numpy operations)
+"""
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+
+def jit(func):
+    """
+    Compile the kernel with numba.njit when numba is installed, return it unchanged otherwise
+    """
+    return func if njit is None else njit(cache=True)(func)
+
+
+@jit
+def _drift(held, previous, current):
+    """
+    :return: (weights after the prices moved from previous to current without trading, growth of the portfolio)
+    """
+    growth = current / previous
+    growth = np.where(np.isnan(growth), 1.0, growth)
+    invested = held * growth
+    total = 1.0 - held.sum() + invested.sum()
+    if total <= 0.0:
+        return np.zeros_like(held), 0.0
+    return invested / total, total
+
+
+@jit
+def _stop_loss_kernel(prices, targets, rebalance, stop, trailing):
+    nb_dates, nb_assets = prices.shape
+    weights = np.zeros((nb_dates, nb_assets))
+    trades = np.zeros(nb_dates, dtype=np.bool_)
+    held = np.zeros(nb_assets)
+    reference = np.full(nb_assets, np.nan)
+    for t in range(nb_dates):
+        price = prices[t]
+        if t > 0:
+            held, _ = _drift(held, prices[t - 1], price)
+        if rebalance[t]:
+            held = targets[t].copy()
+            reference = price.copy()
+            trades[t] = True
+        else:
+            if trailing:
+                reference = np.fmax(reference, price)
+            hit = (held > 0.0) & (price <= reference * (1.0 - stop))
+            if hit.any():
+                held = np.where(hit, 0.0, held)
+                trades[t] = True
+        weights[t] = held
+    return weights, trades
+
+
+@jit
+def _drawdown_kernel(prices, targets, rebalance, max_drawdown, scale):
+    nb_dates, nb_assets = prices.shape
+    weights = np.zeros((nb_dates, nb_assets))
+    trades = np.zeros(nb_dates, dtype=np.bool_)
+    held = np.zeros(nb_assets)
+    value, peak, derisked = 1.0, 1.0, False
+    for t in range(nb_dates):
+        if t > 0:
+            held, growth = _drift(held, prices[t - 1], prices[t])
+            value *= growth
+        peak = max(peak, value)
+        drawdown = 1.0 - value / peak
+        if rebalance[t]:
+            derisked = drawdown > max_drawdown
+            held = targets[t] * (scale if derisked else 1.0)
+            trades[t] = True
+        elif not derisked and drawdown > max_drawdown:
+            held = held * scale
+            derisked = True
+            trades[t] = True
+        weights[t] = held
+    return weights, trades
+
+
+def _arrays(prices: np.ndarray, targets: np.ndarray, rebalance: np.ndarray):
+    rebalance = np.array(rebalance, dtype=np.bool_)
+    if len(rebalance):
+        rebalance[0] = True
+    return (np.ascontiguousarray(prices, dtype=np.float64),
+            np.ascontiguousarray(np.nan_to_num(targets, nan=0.0), dtype=np.float64), rebalance)
+
+
+class StopLoss(object):
+    """
+    class StopLoss closing a long position when its price falls by stop from the price of the last rebalancing,
+    or from its highest price since then with trailing=True, the position stays in cash until the next rebalancing
+
+    eg: BacktesterConfig(..., overlay=StopLoss(0.1, trailing=True))
+    """
+    def __init__(self, stop: float, trailing: bool = False):
+        if not 0 < stop < 1:
+            raise ValueError(f"stop should be a fraction of the price between 0 and 1 current value is : {stop}")
+        self._stop = stop
+        self._trailing = trailing
+
+    def __call__(self, prices: np.ndarray, targets: np.ndarray, rebalance: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param prices: (T, N) close prices
+        :param targets: (T, N) target weights
+        :param rebalance: (T,) boolean mask of the rebalancing dates
+        :return: ((T, N) weights held after every close, (T,) boolean mask of the dates where the portfolio trades)
+        """
+        prices, targets, rebalance = _arrays(prices, targets, rebalance)
+        return _stop_loss_kernel(prices, targets, rebalance, float(self._stop), bool(self._trailing))
+
+
+class DrawdownDerisk(object):
+    """
+    class DrawdownDerisk scaling the weights down by scale as soon as the drawdown of the portfolio (before costs)
+    exceeds max_drawdown, the rebalancings keep the targets scaled until the drawdown is back under max_drawdown
+    """
+    def __init__(self, max_drawdown: float, scale: float = 0.5):
+        self._max_drawdown = max_drawdown
+        self._scale = scale
+
+    def __call__(self, prices: np.ndarray, targets: np.ndarray, rebalance: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        see StopLoss.__call__
+        """
+        prices, targets, rebalance = _arrays(prices, targets, rebalance)
+        return _drawdown_kernel(prices, targets, rebalance, float(self._max_drawdown), float(self._scale))
@@ -0,0 +1,81 @@
+"""
+KPI of level series, every function takes levels of shape (T,) or (K, T) (K strategies at once, the time is the
+last axis) and returns a float or a (K,) array
+"""
+import numpy as np
+
+# crypto markets trade every day, keyed by Frequency.value
+PERIODS_PER_YEAR = {"HOURLY": 24 * 365, "DAILY": 365, "WEEKLY": 52}
+
+
+def level_returns(levels: np.ndarray) -> np.ndarray:
+    levels = np.asarray(levels, dtype=np.float64)
+    return levels[..., 1:] / levels[..., :-1] - 1
+
+
+def total_return(levels: np.ndarray) -> np.ndarray:
+    levels = np.asarray(levels, dtype=np.float64)
+    return levels[..., -1] / levels[..., 0] - 1
+
+
+def annualized_return(levels: np.ndarray, periods_per_year: float = 365) -> np.ndarray:
+    levels = np.asarray(levels, dtype=np.float64)
+    years = max(levels.shape[-1] - 1, 1) / periods_per_year
+    return (levels[..., -1] / levels[..., 0]) ** (1 / years) - 1
+
+
+def annualized_volatility(levels: np.ndarray, periods_per_year: float = 365) -> np.ndarray:
+    return np.std(level_returns(levels), axis=-1, ddof=1) * np.sqrt(periods_per_year)
+
+
+def sharpe_ratio(levels: np.ndarray, periods_per_year: float = 365, risk_free: float = 0.0) -> np.ndarray:
+    """
+    :param risk_free: annual risk free rate
+    """
+    excess = level_returns(levels) - risk_free / periods_per_year
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = excess.mean(axis=-1) / excess.std(axis=-1, ddof=1) * np.sqrt(periods_per_year)
+    return np.nan_to_num(ratio, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def sortino_ratio(levels: np.ndarray, periods_per_year: float = 365, risk_free: float = 0.0) -> np.ndarray:
+    excess = level_returns(levels) - risk_free / periods_per_year
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2, axis=-1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = excess.mean(axis=-1) / downside * np.sqrt(periods_per_year)
+    return np.nan_to_num(ratio, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def max_drawdown(levels: np.ndarray) -> np.ndarray:
+    """
+    :return: largest loss from a previous peak, as a positive fraction
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    return np.max(1 - levels / np.maximum.accumulate(levels, axis=-1), axis=-1)
+
+
+def calmar_ratio(levels: np.ndarray, periods_per_year: float = 365) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = annualized_return(levels, periods_per_year) / max_drawdown(levels)
+    return np.nan_to_num(ratio, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+KPIS = {
+    "total_return": total_return,
+    "annualized_return": annualized_return,
+    "annualized_volatility": annualized_volatility,
+    "sharpe_ratio": sharpe_ratio,
+    "sortino_ratio": sortino_ratio,
+    "max_drawdown": max_drawdown,
+    "calmar_ratio": calmar_ratio,
+}
+# KPI where a lower value is better
+LOWER_IS_BETTER = {"annualized_volatility", "max_drawdown"}
+# KPI depending on the number of periods per year
+ANNUALIZED = {"annualized_return", "annualized_volatility", "sharpe_ratio", "sortino_ratio", "calmar_ratio"}
+
+
+def compute_kpi(name: str, levels: np.ndarray, periods_per_year: float = 365) -> np.ndarray:
+    if name not in KPIS:
+        raise KeyError(f"kpi {name} is not supported, available : {list(KPIS)}")
+    return KPIS[name](levels, periods_per_year) if name in ANNUALIZED else KPIS[name](levels)
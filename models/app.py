@@ -1,10 +1,65 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 import uvicorn
 from routers import router
+from feed import PriceFeed
+
+# one poller for the whole server, every websocket/SSE client subscribes to it, it only polls while someone
+# listens unless PRICE_FEED_ON_DEMAND=0
+price_feed = PriceFeed(ids=os.environ.get("PRICE_FEED_IDS", "bitcoin,ethereum").split(","),
+                       vs_currencies=os.environ.get("PRICE_FEED_VS_CURRENCIES", "usd"),
+                       interval=float(os.environ.get("PRICE_FEED_INTERVAL", 60)),
+                       on_demand=os.environ.get("PRICE_FEED_ON_DEMAND", "1") != "0")
+
 
-app = FastAPI(title="CoinGecko API Wrapper")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not price_feed.on_demand:
+        price_feed.start()
+    yield
+    await price_feed.stop()
+
+
+app = FastAPI(title="CoinGecko API Wrapper", lifespan=lifespan)
 app.include_router(router)
 
+
+@app.websocket("/coingecko/feed/ws")
+async def price_feed_websocket(websocket: WebSocket):
+    await websocket.accept()
+    queue = price_feed.subscribe()
+    try:
+        while True:
+            await websocket.send_json(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        price_feed.unsubscribe(queue)
+
+
+@app.get("/coingecko/feed/sse", tags=["feed"])
+async def price_feed_events(request: Request):
+    queue = price_feed.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                    yield f"data: {json.dumps(message)}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            price_feed.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 if __name__ == '__main__':
     uvicorn.run(app)
     """
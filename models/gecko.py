@@ -255,7 +255,7 @@ class CoinGeckoDerivativesExchangeData:
 @dataclass
 class CoinGeckoDerivativesTickers:
     market: str = None
-    symbol: float = None
+    symbol: str = None
     index_id: str = None
     price: str = None
     price_percentage_change_24h: float = None
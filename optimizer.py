@@ -0,0 +1,223 @@
+from typing import Tuple
+
+import numpy as np
+
+
+class RollingCovariance(object):
+    """
+    class RollingCovariance of the returns over the last window dates, updated incrementally: moving the window
+    adds the cross products of the dates entering it and removes the ones of the dates leaving it, so the cost of
+    an update is proportional to the dates moved instead of the window
+    Returns missing (NaN, before the listing of an asset) are excluded pairwise
+    """
+    def __init__(self, returns: np.ndarray, window: int, min_periods: int = None):
+        """
+        :param returns: (T, N) returns
+        :param window: dates of the estimation window
+        :param min_periods: dates with a return needed for an asset to be estimated, window // 2 by default
+        """
+        self._valid = ~np.isnan(returns)
+        self._returns = np.where(self._valid, returns, 0.0)
+        self._window = window
+        self._min_periods = max(window // 2, 2) if min_periods is None else min_periods
+        nb_assets = returns.shape[1]
+        self._products = np.zeros((nb_assets, nb_assets))
+        # sums[i, j] is the sum of the returns of i on the dates where j has a return
+        self._sums = np.zeros((nb_assets, nb_assets))
+        self._counts = np.zeros((nb_assets, nb_assets))
+        self._start, self._end = 0, 0
+
+    def _add(self, rows: slice, sign: float):
+        returns, valid = self._returns[rows], self._valid[rows].astype(np.float64)
+        self._products += sign * (returns.T @ returns)
+        self._sums += sign * (returns.T @ valid)
+        self._counts += sign * (valid.T @ valid)
+
+    def update(self, end: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Move the window to the dates [end - window, end)
+        :return: ((N, N) covariance, (N,) mean returns, (N,) True for the assets with enough returns)
+        """
+        start = max(end - self._window, 0)
+        if start < self._start or end < self._end or start >= self._end:
+            # going back in time or jumping over the whole window: start again from an empty window
+            self._products[:], self._sums[:], self._counts[:] = 0.0, 0.0, 0.0
+            self._start, self._end = start, start
+        self._add(slice(self._end, end), 1.0)
+        self._add(slice(self._start, start), -1.0)
+        self._start, self._end = start, end
+
+        counts = np.maximum(self._counts, 1.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = (self._products - self._sums * self._sums.T / counts) / np.maximum(self._counts - 1, 1.0)
+        diagonal = np.diag(self._counts)
+        mean = np.diag(self._sums) / np.maximum(diagonal, 1.0)
+        return covariance, mean, diagonal >= self._min_periods
+
+
+def project(weights: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    """
+    :return: euclidean projection of weights on {lower <= w <= upper, sum(w) = 1}, clip(weights - shift) where
+             the sum is piecewise linear in the shift: found exactly between two of its breakpoints
+    """
+    breakpoints = np.sort(np.concatenate([weights - upper, weights - lower]))
+    sums = np.clip(weights[None, :] - breakpoints[:, None], lower, upper).sum(axis=1)
+    # sums decreases with the shift, from nb_assets * upper to nb_assets * lower
+    position = int(np.clip(np.searchsorted(-sums, -1.0), 1, len(sums) - 1))
+    low, high = breakpoints[position - 1], breakpoints[position]
+    total_low, total_high = sums[position - 1], sums[position]
+    shift = low if total_low == total_high else low + (total_low - 1) / (total_low - total_high) * (high - low)
+    return np.clip(weights - shift, lower, upper)
+
+
+def _quadratic(covariance: np.ndarray, linear: np.ndarray, lower: float, upper: float, start: np.ndarray,
+               max_iter: int, tol: float) -> np.ndarray:
+    """
+    :return: argmin w' covariance w - linear' w on the box constrained simplex (accelerated projected gradient,
+             restarted when the momentum goes uphill)
+    """
+    step = 1 / (2 * max(np.linalg.norm(covariance, 2), 1e-12))
+    weights, momentum, t = start, start, 1.0
+    for _ in range(max_iter):
+        updated = project(momentum - step * (2 * covariance @ momentum - linear), lower, upper)
+        if np.abs(updated - momentum).max() < tol:
+            return updated
+        if (momentum - updated) @ (updated - weights) > 0:
+            t = 1.0
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        momentum = updated + (t - 1) / t_next * (updated - weights)
+        weights, t = updated, t_next
+    return weights
+
+
+def min_variance(covariance: np.ndarray, lower: float = 0.0, upper: float = 1.0, max_iter: int = 200,
+                 tol: float = 1e-6) -> np.ndarray:
+    nb_assets = len(covariance)
+    return _quadratic(covariance, np.zeros(nb_assets), lower, upper, np.full(nb_assets, 1 / nb_assets), max_iter,
+                      tol)
+
+
+def max_sharpe(covariance: np.ndarray, mean: np.ndarray, lower: float = 0.0, upper: float = 1.0,
+               risk_free: float = 0.0, nb_points: int = 20, max_iter: int = 200, tol: float = 1e-6) -> np.ndarray:
+    """
+    The tangency portfolio lies on the efficient frontier: walk the frontier from the minimum variance portfolio
+    by increasing the weight of the expected returns (warm started) until the Sharpe ratio decreases
+    :param risk_free: risk free return per date
+    """
+    excess = mean - risk_free
+    weights = min_variance(covariance, lower, upper, max_iter, tol)
+    best, best_sharpe = weights, -np.inf
+    scale = np.linalg.norm(covariance, 2) / max(np.abs(excess).max(), 1e-12)
+    for aversion in np.logspace(-3, 3, nb_points):
+        weights = _quadratic(covariance, aversion * scale * excess, lower, upper, weights, max_iter, tol)
+        sharpe = excess @ weights / np.sqrt(max(weights @ covariance @ weights, 1e-24))
+        if sharpe < best_sharpe:
+            # the Sharpe ratio is unimodal along the frontier: past the tangency portfolio
+            break
+        best, best_sharpe = weights, sharpe
+    return best
+
+
+def risk_parity(covariance: np.ndarray, lower: float = 0.0, upper: float = 1.0, max_iter: int = 200,
+                tol: float = 1e-6) -> np.ndarray:
+    """
+    Equal risk contributions w_i (covariance w)_i: Newton steps on the convex 1/2 y' covariance y - sum(log(y)) / N
+    kept positive, then w = y / sum(y), projected on the bounds when they bind
+    """
+    nb_assets = len(covariance)
+    budget = 1 / nb_assets
+    y = 1 / np.sqrt(np.maximum(np.diag(covariance), 1e-24))
+    for _ in range(max_iter):
+        gradient = covariance @ y - budget / y
+        step = np.linalg.solve(covariance + np.diag(budget / (y * y)), gradient)
+        # fraction of the step keeping every y positive
+        shrinking = step > 0
+        fraction = min(1.0, 0.99 * np.min(y[shrinking] / step[shrinking])) if shrinking.any() else 1.0
+        y = y - fraction * step
+        if np.abs(step).max() < tol * np.abs(y).max():
+            break
+    weights = y / y.sum()
+    return weights if weights.min() >= lower and weights.max() <= upper else project(weights, lower, upper)
+
+
+class PortfolioOptimizer(object):
+    """
+    class PortfolioOptimizer computing the target weights of the BacktesterConfig on the rebalancing dates from
+    a rolling covariance of the returns: minimum variance, risk parity or max Sharpe, with long only / box bounds
+
+    eg: BacktesterConfig(..., optimizer=PortfolioOptimizer("risk_parity", window=90, upper=0.2),
+                         rebalancing=Anchored("W-FRI"))
+    """
+    METHODS = ("min_variance", "risk_parity", "max_sharpe")
+
+    def __init__(
+            self,
+            method: str = "min_variance",
+            window: int = 90,
+            min_periods: int = None,
+            lower: float = 0.0,
+            upper: float = 1.0,
+            risk_free: float = 0.0,
+            max_iter: int = 200,
+            tol: float = 1e-6
+    ):
+        """
+        :param window: dates of the covariance estimation, up to the rebalancing date included
+        :param min_periods: returns needed for an asset to be invested, window // 2 by default
+        :param lower: lowest weight of an invested asset, 0 for long only
+        :param upper: highest weight of an asset, raised to 1 / number of assets when it is not feasible
+        :param risk_free: risk free return per date, for max_sharpe
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"method should be one of {self.METHODS} current value is : {method}")
+        self._method = method
+        self._window = window
+        self._min_periods = min_periods
+        self._lower = lower
+        self._upper = upper
+        self._risk_free = risk_free
+        self._max_iter = max_iter
+        self._tol = tol
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    def weights(self, covariance: np.ndarray, mean: np.ndarray = None) -> np.ndarray:
+        """
+        :return: (N,) weights of the method for a covariance (and mean returns for max_sharpe)
+        """
+        nb_assets = len(covariance)
+        lower = min(self._lower, 1 / nb_assets)
+        upper = max(self._upper, 1 / nb_assets)
+        if self._method == "min_variance":
+            return min_variance(covariance, lower, upper, self._max_iter, self._tol)
+        if self._method == "risk_parity":
+            return risk_parity(covariance, lower, upper, self._max_iter, self._tol)
+        return max_sharpe(covariance, mean, lower, upper, self._risk_free, max_iter=self._max_iter, tol=self._tol)
+
+    def targets(self, prices: np.ndarray, quoted: np.ndarray, dates: np.ndarray) -> np.ndarray:
+        """
+        :param prices: (T, N) close prices
+        :param quoted: (T, N) True where the asset can be traded
+        :param dates: (T,) boolean mask of the dates where the weights are optimized
+        :return: (T, N) target weights, optimized on the dates and held until the next one
+        """
+        returns = np.full(prices.shape, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns[1:] = prices[1:] / prices[:-1] - 1
+        covariances = RollingCovariance(returns, self._window, self._min_periods)
+        targets = np.zeros(prices.shape)
+        rows = np.flatnonzero(dates)
+        for row in rows:
+            covariance, mean, estimated = covariances.update(row + 1)
+            assets = np.flatnonzero(estimated & quoted[row])
+            if len(assets) == 0:
+                # not enough history yet: equal weights of the quoted assets
+                assets = np.flatnonzero(quoted[row])
+                targets[row, assets] = 1 / max(len(assets), 1)
+                continue
+            targets[row, assets] = self.weights(covariance[np.ix_(assets, assets)], mean[assets])
+        # hold the optimized targets until the next optimization date
+        since = np.maximum.accumulate(np.where(dates, np.arange(len(dates)), 0)) if len(dates) else rows
+        return targets[since]
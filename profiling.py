@@ -0,0 +1,182 @@
+import gc
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from functools import wraps
+from typing import Dict, List
+
+
+@dataclass
+class StageProfile:
+    """
+    Measures of one stage of a run
+    allocated is the net memory allocated by the stage and peak the highest traced memory during the stage (bytes),
+    objects the net number of objects tracked by the garbage collector
+    """
+    name: str
+    wall: float
+    cpu: float
+    allocated: int
+    peak: int
+    objects: int
+
+
+class ProfileReport(object):
+    """
+    class ProfileReport listing the StageProfile of a run in execution order
+    """
+    def __init__(self, stages: List[StageProfile], trace_path: str = None):
+        self._stages = stages
+        self._trace_path = trace_path
+
+    @property
+    def stages(self) -> List[StageProfile]:
+        return self._stages
+
+    @property
+    def trace_path(self) -> str:
+        return self._trace_path
+
+    @property
+    def total_wall(self) -> float:
+        return sum(stage.wall for stage in self._stages)
+
+    def to_dict(self) -> Dict:
+        return {"stages": [asdict(stage) for stage in self._stages], "total_wall": self.total_wall,
+                "trace_path": self._trace_path}
+
+    def to_header(self) -> str:
+        """
+        :return: compact one line json, {stage name: [wall, cpu, allocated, peak, objects]}, for http headers
+        """
+        return json.dumps({stage.name: [round(stage.wall, 6), round(stage.cpu, 6), stage.allocated, stage.peak,
+                                        stage.objects] for stage in self._stages}, separators=(",", ":"))
+
+    def __repr__(self):
+        lines = [f"{'stage':<26}{'wall s':>10}{'cpu s':>10}{'alloc KiB':>12}{'peak KiB':>12}{'objects':>10}"]
+        lines += [f"{stage.name:<26}{stage.wall:>10.4f}{stage.cpu:>10.4f}{stage.allocated / 1024:>12.1f}"
+                  f"{stage.peak / 1024:>12.1f}{stage.objects:>10}" for stage in self._stages]
+        return "\n".join(lines)
+
+
+class Profiler(object):
+    """
+    class Profiler recording wall time, cpu time, allocations (tracemalloc) and object counts per stage
+    and optionally a cProfile or pyinstrument trace of the whole run
+    Profiling is opt-in: pass a Profiler to the BacktesterConfig, the stages cost nothing otherwise
+    The trace starts with the first stage and is written by dump at the end of the run, or by the outermost stage
+    when it raises
+    """
+    TRACERS = ("cprofile", "pyinstrument")
+
+    def __init__(self, trace: str = None, trace_dir: str = ".", count_objects: bool = True):
+        """
+        :param trace: None, "cprofile" or "pyinstrument"
+        :param trace_dir: directory where the trace of the run is written
+        :param count_objects: count the objects tracked by the gc around every stage, it walks the whole heap
+        """
+        if trace is not None and trace not in self.TRACERS:
+            raise ValueError(f"trace should be one of {self.TRACERS} current value is : {trace}")
+        self._trace = trace
+        self._trace_dir = trace_dir
+        self._count_objects = count_objects
+        self._stages: List[StageProfile] = list()
+        self._tracer = None
+        self._trace_path = None
+        self._depth = 0
+
+    @property
+    def report(self) -> ProfileReport:
+        return ProfileReport(list(self._stages), self._trace_path)
+
+    def _start_trace(self):
+        if self._trace == "cprofile":
+            import cProfile
+            self._tracer = cProfile.Profile()
+            self._tracer.enable()
+        elif self._trace == "pyinstrument":
+            from pyinstrument import Profiler as _Profiler
+            self._tracer = _Profiler()
+            self._tracer.start()
+
+    def dump(self, run_name: str = "backtest") -> str:
+        """
+        Stop the trace of the run and write it to trace_dir
+        :return: path of the trace, None when no trace is recorded
+        """
+        if self._tracer is None:
+            return None
+        os.makedirs(self._trace_dir, exist_ok=True)
+        name = "".join(char if char.isalnum() else "_" for char in run_name)
+        if self._trace == "cprofile":
+            self._tracer.disable()
+            self._trace_path = os.path.join(self._trace_dir, f"{name}.prof")
+            self._tracer.dump_stats(self._trace_path)
+        else:
+            self._tracer.stop()
+            self._trace_path = os.path.join(self._trace_dir, f"{name}.html")
+            with open(self._trace_path, "w") as file:
+                file.write(self._tracer.output_html())
+        self._tracer = None
+        return self._trace_path
+
+    @contextmanager
+    def stage(self, name: str):
+        if self._trace is not None and self._tracer is None and self._trace_path is None:
+            self._start_trace()
+        # objects are counted out of the traced section, the list built by gc.get_objects would inflate the peak
+        objects = len(gc.get_objects()) if self._count_objects else 0
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self._depth == 0 and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self._depth += 1
+        memory, _ = tracemalloc.get_traced_memory()
+        wall, cpu = time.perf_counter(), time.process_time()
+        failed = False
+        try:
+            yield self
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            current, peak = tracemalloc.get_traced_memory()
+            self._depth -= 1
+            if started_tracing:
+                tracemalloc.stop()
+            self._stages.append(StageProfile(
+                name=name,
+                wall=wall,
+                cpu=cpu,
+                allocated=current - memory,
+                peak=max(peak - memory, 0),
+                objects=len(gc.get_objects()) - objects if self._count_objects else 0
+            ))
+            if failed and self._depth == 0:
+                # a failed run never reaches its end-of-run dump, the tracer would stay enabled on the thread
+                self.dump(name)
+
+
+def profiled(name: str = None):
+    """
+    Decorator recording the method as a stage of the profiler of its object (self.profiler), if any
+    """
+    def decorator(func):
+        stage_name = func.__name__ if name is None else name
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, "profiler", None)
+            if profiler is None:
+                return func(self, *args, **kwargs)
+            with profiler.stage(stage_name):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
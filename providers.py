@@ -0,0 +1,71 @@
+from enum import Enum
+from importlib import import_module
+from typing import Dict, Union
+
+
+class Provider(Enum):
+    """
+    Enumeration of data provider for config parameters and future dynamic integration
+    """
+    YAHOO = "YAHOO"
+    COINGECKO = "CoinGecko"
+    CRYPTOCOMPARE = "CryptoCompare"
+    INVESTPY = "InvestPy"
+    COINMARKETCAP = "CoinMarketCap"
+    LOCAL = "Local"
+    FIXTURE = "Fixture"
+    INDEX = "Index"
+
+
+class ProviderRegistry(object):
+    """
+    class ProviderRegistry keeping track of the implementation behind each Provider
+    An implementation is registered as a "module:attribute" string and is only imported the first time the provider
+    is selected, so heavy third party libraries (yfinance, investpy, requests...) stay out of the import path
+    of the Backtester and of the API server until they are really needed
+    Objects which are cheap to import can also be registered directly
+    """
+    def __init__(self):
+        self._specs: Dict[Provider, Union[str, object]] = dict()
+        self._loaded: Dict[Provider, object] = dict()
+
+    def register(self, provider: Provider, spec: Union[str, object]):
+        """
+        :param provider: Provider the implementation is registered for
+        :param spec: "module" or "module:attribute" imported lazily on first use, or the implementation itself
+        """
+        if not isinstance(provider, Provider):
+            raise TypeError(f"provider should be Provider current type is : {type(provider)}")
+        self._specs[provider] = spec
+        self._loaded.pop(provider, None)
+        if not isinstance(spec, str):
+            self._loaded[provider] = spec
+
+    def get(self, provider: Provider) -> object:
+        """
+        Import (once) and return the implementation registered for the provider
+        :param provider:
+        :return: module or attribute of the module
+        """
+        if provider not in self._loaded:
+            spec = self._specs.get(provider)
+            if spec is None:
+                raise NotImplementedError(f"{provider} has not been implemented")
+            module_name, _, attribute = spec.partition(":")
+            implementation = import_module(module_name)
+            if attribute:
+                implementation = getattr(implementation, attribute)
+            self._loaded[provider] = implementation
+        return self._loaded[provider]
+
+    def is_loaded(self, provider: Provider) -> bool:
+        return provider in self._loaded
+
+    def __contains__(self, provider: Provider) -> bool:
+        return provider in self._specs
+
+
+provider_registry = ProviderRegistry()
+provider_registry.register(Provider.COINGECKO, "geckoclient:CoinGeckoClient")  # Custom CoinGecko API endpoints Wrapper
+provider_registry.register(Provider.YAHOO, "yfinance")
+provider_registry.register(Provider.INVESTPY, "investpy")
@@ -0,0 +1,214 @@
+"""
+Data quality stage of the Backtester, between the loading of the quotes and the positions: gap detection, fill
+policies and outlier flagging on the (T, N) close matrix of the calendar, with array operations only
+"""
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from bottleneck import move_median
+except ImportError:
+    move_median = None
+
+# scale of the median absolute deviation to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+
+class FillPolicy(Enum):
+    """
+    Enumeration of the prices used on the dates where a product has no quote
+    """
+    FORWARD = "forward"
+    NONE = "none"
+
+
+@dataclass
+class QualityReport:
+    """
+    Statistics of the data quality stage per product, and the (T, N) masks they are computed from,
+    valid is True where the product has a quote which is not a removed spike
+    """
+    product_codes: List[str]
+    calendar: pd.DatetimeIndex
+    quoted: np.ndarray
+    valid: np.ndarray
+    gaps: np.ndarray
+    filled: np.ndarray
+    outliers: np.ndarray
+    spikes: np.ndarray
+    longest_gap: np.ndarray
+
+    @property
+    def empty_dates(self) -> pd.DatetimeIndex:
+        """
+        :return: dates of the calendar where no product has a quote
+        """
+        return self.calendar[~self.quoted.any(axis=1)]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: quotes, gaps, filled prices, outliers, spikes and longest gap (in dates) of every product
+        """
+        return pd.DataFrame({"quotes": self.quoted.sum(axis=0), "gaps": self.gaps.sum(axis=0),
+                             "filled": self.filled.sum(axis=0), "outliers": self.outliers.sum(axis=0),
+                             "spikes": self.spikes.sum(axis=0), "longest_gap": self.longest_gap},
+                            index=pd.Index(self.product_codes, name="product_code"))
+
+
+def _since_last(valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: ((T, N) position of the last valid row at or before every row, -1 before the first one,
+              (T, N) rows since that one)
+    """
+    rows = np.arange(len(valid))[:, None]
+    last = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    return last, rows - last
+
+
+def _next_after(valid: np.ndarray) -> np.ndarray:
+    """
+    :return: (T, N) position of the first valid row strictly after every row, T after the last one
+    """
+    rows = np.arange(len(valid))[:, None]
+    following = np.full(valid.shape, len(valid))
+    following[:-1] = np.minimum.accumulate(np.where(valid, rows, len(valid))[::-1], axis=0)[::-1][1:]
+    return following
+
+
+def forward_fill(prices: np.ndarray) -> np.ndarray:
+    """
+    :return: (T, N) prices with the NaN replaced by the last price before them, NaN before the first one
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    last, _ = _since_last(~np.isnan(prices))
+    filled = prices[np.maximum(last, 0), np.arange(prices.shape[1])[None, :]]
+    return np.where(last >= 0, filled, np.nan)
+
+
+def _rolling_median(values: np.ndarray, window: int, min_periods: int) -> np.ndarray:
+    """
+    :return: (T, N) median of the window values before every row (the row itself excluded), NaN values are ignored,
+             with bottleneck when it is installed and pandas otherwise
+    """
+    if move_median is not None:
+        median = move_median(values, window, min_count=min_periods, axis=0)
+    else:
+        median = pd.DataFrame(values).rolling(window, min_periods=min_periods).median().to_numpy()
+    return np.concatenate([np.full((1, values.shape[1]), np.nan), median[:-1]])
+
+
+def rolling_mad(values: np.ndarray, window: int, min_periods: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rolling median of the window values before every row and rolling median of the absolute deviations of the
+    values from their own median: a streaming MAD, two rolling medians instead of one sort per window
+    :param values: (T, N)
+    :return: ((T, N) medians, (T, N) median absolute deviations), NaN with less than min_periods values
+    """
+    min_periods = max(window // 2, 1) if min_periods is None else min_periods
+    values = np.asarray(values, dtype=np.float64)
+    median = _rolling_median(values, window, min_periods)
+    return median, _rolling_median(np.abs(values - median), window, min_periods)
+
+
+class DataQuality(object):
+    """
+    class DataQuality cleaning the close matrix of the Backtester before the positions are computed
+
+    - gaps: dates of the calendar after the first quote of a product where it has no quote
+    - fill: FillPolicy.FORWARD keeps the last close for up to limit dates (no limit by default), FillPolicy.NONE
+      leaves NaN, in the prices seen by the strategy (Backtester.prices, the optimizer): the positions are always
+      valued at the last valid close and never opened on a date without a quote
+    - outliers: log returns further than threshold scaled MAD from the median of the window returns before them
+      (the same idea as the is_anomaly flag of the CoinGecko tickers), flagged in the report
+    - spikes: an outlier immediately reverted by an outlier of the opposite sign, a bad tick rather than a jump,
+      removed and filled like a gap with remove_spikes=True
+
+    eg: BacktesterConfig(..., quality=DataQuality(limit=3, remove_spikes=True))
+        backtester.quality_report.to_frame()
+    """
+    def __init__(
+            self,
+            fill: FillPolicy = FillPolicy.FORWARD,
+            limit: int = None,
+            window: int = 30,
+            threshold: float = 5.0,
+            remove_spikes: bool = False
+    ):
+        """
+        :param limit: dates a close is carried forward, no limit by default
+        :param window: returns of the rolling median and MAD
+        :param threshold: distance to the median, in standard deviations (MAD_SCALE * MAD), of an outlier
+        """
+        if not isinstance(fill, FillPolicy):
+            raise TypeError(f"fill should be FillPolicy current type is : {type(fill)}")
+        if window < 2:
+            raise ValueError(f"window should be at least 2 returns current value is : {window}")
+        self._fill = fill
+        self._limit = limit
+        self._window = window
+        self._threshold = threshold
+        self._remove_spikes = remove_spikes
+
+    @property
+    def fill(self) -> FillPolicy:
+        return self._fill
+
+    def outliers(self, prices: np.ndarray, quoted: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param prices: (T, N) close prices, forward filled
+        :param quoted: (T, N) True where the product has a quote
+        :return: ((T, N) outlier returns, (T, N) spikes), on the date of the quote ending the return
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_prices = np.log(np.where(prices > 0, prices, np.nan))
+        # return from the previous quote, whatever the number of dates in between
+        last, _ = _since_last(quoted)
+        previous = np.full(prices.shape, np.nan)
+        previous[1:] = np.take_along_axis(log_prices, np.maximum(last[:-1], 0), axis=0)
+        previous[1:][last[:-1] < 0] = np.nan
+        log_returns = np.where(quoted, log_prices - previous, np.nan)
+
+        median, mad = rolling_mad(log_returns, self._window)
+        with np.errstate(invalid="ignore"):
+            # a constant window (MAD of 0) has no scale to compare to, nothing is flagged
+            outliers = (mad > 0) & (np.abs(log_returns - median) > self._threshold * MAD_SCALE * mad)
+        # next quoted return of every date, the reversal of a spike even when bars are missing in between
+        after = _next_after(quoted)
+        known = after < len(prices)
+        after = np.minimum(after, len(prices) - 1)
+        following = known & np.take_along_axis(outliers, after, axis=0)
+        opposite = np.sign(np.take_along_axis(log_returns, after, axis=0)) == -np.sign(log_returns)
+        return outliers, outliers & following & opposite
+
+    def clean(self, calendar: pd.DatetimeIndex, prices: np.ndarray, quoted: np.ndarray,
+              product_codes: List[str]) -> Tuple[np.ndarray, QualityReport]:
+        """
+        :param prices: (T, N) last close at or before every date of the calendar, NaN before the first quote
+        :param quoted: (T, N) True where the product has a quote exactly on the date
+        :return: ((T, N) cleaned close prices, report)
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        quoted = np.asarray(quoted, dtype=bool)
+        outliers, spikes = self.outliers(prices, quoted)
+        valid = quoted & ~spikes if self._remove_spikes else quoted
+
+        last, since = _since_last(valid)
+        listed = np.maximum.accumulate(quoted, axis=0)
+        gaps = listed & ~quoted
+        missing = listed & ~valid
+        filled = missing & (last >= 0)
+        if self._fill == FillPolicy.NONE:
+            filled[:] = False
+        elif self._limit is not None:
+            filled &= since <= self._limit
+        columns = np.arange(prices.shape[1])[None, :]
+        cleaned = np.where(valid, prices, np.nan)
+        cleaned[filled] = prices[np.maximum(last, 0), columns][filled]
+        longest_gap = np.where(missing, since, 0).max(axis=0) if len(prices) else np.zeros(prices.shape[1], int)
+        return cleaned, QualityReport(product_codes=list(product_codes), calendar=pd.DatetimeIndex(calendar),
+                                      quoted=quoted, valid=valid, gaps=gaps, filled=filled, outliers=outliers,
+                                      spikes=spikes, longest_gap=longest_gap)
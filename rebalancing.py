@@ -0,0 +1,130 @@
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+
+class RebalancingSchedule(metaclass=ABCMeta):
+    """
+    Interface of the rebalancing calendars of the BacktesterConfig, independent from the Frequency of the data
+    A schedule is a boolean mask over the calendar, True on the dates where the positions are reset to their
+    target weights, the first date is always a rebalancing date
+    """
+
+    @abstractmethod
+    def mask(self, calendar: pd.DatetimeIndex, prices: np.ndarray = None, targets: np.ndarray = None) -> np.ndarray:
+        """
+        this method must be implemented in subclasses
+        :param calendar: dates of the backtest
+        :param prices: (T, N) close prices on the calendar
+        :param targets: (T, N) target weights on the calendar
+        :return: (T,) boolean mask of the rebalancing dates
+        """
+        raise NotImplementedError
+
+
+class EveryNBars(RebalancingSchedule):
+    """
+    Rebalance every n dates of the calendar, every date with n=1 (the default behaviour of the Backtester)
+    """
+    def __init__(self, n: int = 1, offset: int = 0):
+        if n < 1:
+            raise ValueError(f"n should be a positive number of bars current value is : {n}")
+        self._n = n
+        self._offset = offset
+
+    def mask(self, calendar: pd.DatetimeIndex, prices: np.ndarray = None, targets: np.ndarray = None) -> np.ndarray:
+        mask = (np.arange(len(calendar)) - self._offset) % self._n == 0
+        mask[:1] = True
+        return mask
+
+
+class Anchored(RebalancingSchedule):
+    """
+    Rebalance on the first (or last) date of the calendar in every period of a pandas frequency
+    eg: Anchored("W-FRI") weekly, weeks ending on friday, Anchored("M", on="last") at every month end
+    """
+    def __init__(self, frequency: str = "M", on: str = "first"):
+        if on not in ("first", "last"):
+            raise ValueError(f"on should be first or last current value is : {on}")
+        self._frequency = frequency
+        self._on = on
+
+    def mask(self, calendar: pd.DatetimeIndex, prices: np.ndarray = None, targets: np.ndarray = None) -> np.ndarray:
+        periods = pd.DatetimeIndex(calendar).to_period(self._frequency).asi8
+        mask = np.ones(len(periods), dtype=bool)
+        if self._on == "first":
+            mask[1:] = periods[1:] != periods[:-1]
+        else:
+            mask[:-1] = periods[1:] != periods[:-1]
+            mask[:1] = True
+        return mask
+
+
+class DriftThreshold(RebalancingSchedule):
+    """
+    Rebalance when a held weight drifts away from its target by more than threshold (absolute weight),
+    on top of an optional schedule
+    eg: DriftThreshold(0.05, schedule=Anchored("M")) monthly, and in between when a weight moves by 5%
+    """
+    def __init__(self, threshold: float, schedule: RebalancingSchedule = None, chunk: int = 256):
+        """
+        :param chunk: dates scanned at once when looking for the next breach
+        """
+        self._threshold = threshold
+        self._schedule = schedule
+        self._chunk = chunk
+
+    def mask(self, calendar: pd.DatetimeIndex, prices: np.ndarray = None, targets: np.ndarray = None) -> np.ndarray:
+        if prices is None or targets is None:
+            raise ValueError("DriftThreshold needs the prices and the target weights")
+        nb_dates = len(calendar)
+        mask = np.zeros(nb_dates, dtype=bool) if self._schedule is None \
+            else self._schedule.mask(calendar, prices, targets)
+        mask[:1] = True
+        targets = np.nan_to_num(targets, nan=0.0)
+        # the drift only depends on the last rebalancing: scan the dates after it by growing chunks for the first
+        # breach (or scheduled date), so the loop runs once per rebalancing instead of once per date
+        last, first, size = 0, 1, self._chunk
+        while first < nb_dates:
+            rows = np.arange(first, min(first + size, nb_dates))
+            held = drifted_weights(prices[last], targets[last], prices[rows])
+            breach = np.abs(held - targets[rows]).max(axis=1, initial=0.0) > self._threshold
+            events = np.flatnonzero(breach | mask[rows])
+            if len(events):
+                last = int(rows[events[0]])
+                mask[last] = True
+                first, size = last + 1, self._chunk
+            else:
+                first, size = int(rows[-1]) + 1, size * 2
+        return mask
+
+
+def drifted_weights(base_prices: np.ndarray, base_weights: np.ndarray, prices: np.ndarray) -> np.ndarray:
+    """
+    :param base_prices: prices when the weights were set, (N,) or (M, N)
+    :param base_weights: weights set, (N,) or (M, N), the part not invested is cash
+    :param prices: (M, N) current prices
+    :return: (M, N) weights after the prices moved from base_prices to prices without trading
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        held = np.nan_to_num(base_weights * (prices / base_prices), nan=0.0, posinf=0.0, neginf=0.0)
+        value = held.sum(axis=-1, keepdims=True) + 1 - np.sum(base_weights, axis=-1, keepdims=True)
+        return np.nan_to_num(held / value, nan=0.0)
+
+
+def hold_weights(prices: np.ndarray, targets: np.ndarray, rebalance: np.ndarray) -> np.ndarray:
+    """
+    Weights held on every date: reset to the targets on the rebalancing dates and drifting with the prices in
+    between, computed from the growth since the last rebalancing without a loop
+    :param prices: (T, N) close prices
+    :param targets: (T, N) target weights
+    :param rebalance: (T,) boolean mask of the rebalancing dates, see RebalancingSchedule
+    :return: (T, N) held weights
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    targets = np.nan_to_num(np.asarray(targets, dtype=np.float64), nan=0.0)
+    if len(prices) == 0:
+        return targets
+    since = np.maximum.accumulate(np.where(rebalance, np.arange(len(prices)), 0))
+    return drifted_weights(prices[since], targets[since], prices)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules live at the root of the repository, as when the Backtester or the server are run from it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+# the server is run from models/, its modules import each other by their bare names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models"))
+import app as server
+
+
+class _Client(object):
+    def get_price_batch(self, ids, vs_currencies):
+        return pd.DataFrame({"usd": [100.0]}, index=["bitcoin"])
+
+
+@pytest.fixture
+def price_feed(monkeypatch):
+    monkeypatch.setattr(server.price_feed, "_client", _Client())
+    monkeypatch.setattr(server.price_feed, "_interval", 0.01)
+    return server.price_feed
+
+
+def test_price_feed_polls_only_while_a_websocket_listens(price_feed):
+    with TestClient(server.app) as client:
+        assert not price_feed.running
+        with client.websocket_connect("/coingecko/feed/ws") as websocket:
+            assert websocket.receive_json()["prices"] == {"bitcoin": {"usd": 100.0}}
+            assert price_feed.running
+        # the server side of the websocket unsubscribes once it sees the disconnection
+        for _ in range(100):
+            if not price_feed.running:
+                break
+            time.sleep(0.01)
+        assert not price_feed.running
+    assert price_feed._task is None
+
+
+@pytest.fixture
+def bitcoin_bars(monkeypatch):
+    from datasources import FixtureSource, data_source_registry
+    from providers import Provider
+
+    day_ms = 86_400_000
+    start = pd.Timestamp("2022-04-01").value // 1_000_000
+    records = [[start + day * day_ms, 100.0 + day, 101.0 + day, 99.0 + day, 100.5 + day] for day in range(40)]
+    monkeypatch.setitem(data_source_registry._loaded, Provider.COINGECKO, FixtureSource({"bitcoin": records}))
+
+
+@pytest.mark.parametrize("route", ["IndexLevel-from-Backtester", "Quote-Backtester"])
+def test_debug_returns_the_profile_header(bitcoin_bars, route):
+    with TestClient(server.app) as client:
+        params = {"id": "bitcoin", "now": "2022-05-05", "startdelta": 30}
+        assert "X-Backtester-Profile" not in client.get(f"/coingecko/{route}", params=params).headers
+        response = client.get(f"/coingecko/{route}", params={**params, "debug": True})
+    assert response.status_code == 200
+    profile = json.loads(response.headers["X-Backtester-Profile"])
+    assert {"_load_quotes", "compute_positions", "compute_levels"} <= set(profile)
+    assert all(len(measures) == 5 for measures in profile.values())
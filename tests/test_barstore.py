@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import Timestamp
+
+from barstore import BarStore, convert_csv, write_bars
+from datasources import OHLCBatch
+
+DATES = pd.date_range("2022-01-01", periods=10, freq="D")
+
+
+def _frame(dates=DATES) -> pd.DataFrame:
+    close = np.arange(len(dates), dtype=np.float64) + 100
+    return pd.DataFrame({"Date": dates.strftime("%Y-%m-%d"), "Open": close - 1, "High": close + 1,
+                         "Low": close - 2, "Close": close, "Volume": close * 10})
+
+
+def _assert_batch(batch: OHLCBatch, frame: pd.DataFrame):
+    np.testing.assert_array_equal(batch.ts, pd.to_datetime(frame["Date"]).values.astype("datetime64[ns]")
+                                  .astype(np.int64))
+    for name in ("open", "high", "low", "close", "volume"):
+        np.testing.assert_array_equal(getattr(batch, name), frame[name.capitalize()].to_numpy())
+
+
+@pytest.fixture
+def csv_by_code(tmp_path):
+    paths = dict()
+    for code, frame in (("BTC", _frame()), ("ETH", _frame(DATES[:3]))):
+        paths[code] = str(tmp_path / f"{code}.csv")
+        frame.to_csv(paths[code], index=False)
+    return paths
+
+
+def test_convert_csv_round_trip(tmp_path, csv_by_code):
+    # chunks smaller than the files so they are streamed in several pieces
+    store = convert_csv(str(tmp_path / "bars.bin"), csv_by_code, chunksize=4)
+    assert store.product_codes == ["BTC", "ETH"] and "ETH" in store
+    _assert_batch(store.batch("BTC"), _frame())
+    _assert_batch(store.batch("ETH"), _frame(DATES[:3]))
+    with pytest.raises(KeyError):
+        store.batch("SOL")
+
+
+def test_write_bars_round_trip(tmp_path):
+    batches = [OHLCBatch.from_frame(code, frame) for code, frame in (("BTC", _frame()), ("ETH", _frame(DATES[:0])))]
+    store = write_bars(str(tmp_path / "bars.bin"), batches) or BarStore.open(str(tmp_path / "bars.bin"))
+    _assert_batch(store.batch("BTC"), _frame())
+    assert len(store.batch("ETH")) == 0
+
+
+def test_range_slicing(tmp_path, csv_by_code):
+    store = convert_csv(str(tmp_path / "bars.bin"), csv_by_code, chunksize=4)
+    _assert_batch(store.batch("BTC", DATES[2], DATES[5]), _frame().iloc[2:6])
+    # bounds between two bars and outside of the history
+    _assert_batch(store.batch("BTC", Timestamp("2022-01-03 12:00"), Timestamp("2022-01-05 12:00")),
+                  _frame().iloc[3:5])
+    _assert_batch(store.batch("BTC", end=DATES[1]), _frame().iloc[:2])
+    _assert_batch(store.batch("BTC", start=Timestamp("2021-06-01")), _frame())
+    assert len(store.batch("BTC", Timestamp("2023-01-01"))) == 0
+    assert len(store.batch("BTC", DATES[5], DATES[2])) == 0
+
+
+def test_dates_unsorted_across_chunks_are_rejected(tmp_path):
+    path = str(tmp_path / "BTC.csv")
+    _frame().iloc[[0, 1, 4, 5, 2, 3, 6, 7]].to_csv(path, index=False)
+    with pytest.raises(ValueError, match="sorted"):
+        convert_csv(str(tmp_path / "bars.bin"), {"BTC": path}, chunksize=4)
+    # a chunk alone is sorted like any OHLCBatch
+    _frame().iloc[[1, 0, 2, 3, 5, 4, 6, 7]].to_csv(path, index=False)
+    _assert_batch(convert_csv(str(tmp_path / "bars.bin"), {"BTC": path}, chunksize=4).batch("BTC"),
+                  _frame().iloc[:8])
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bootstrap import block_indices, bootstrap, stationary_indices
+
+
+def _returns(nb_dates: int = 200, nb_strategies: int = None) -> np.ndarray:
+    shape = nb_dates if nb_strategies is None else (nb_dates, nb_strategies)
+    return np.random.default_rng(0).normal(0.001, 0.02, shape)
+
+
+def test_stationary_indices():
+    indices = stationary_indices(50, 30, 5, np.random.default_rng(1), length=80)
+    assert indices.shape == (30, 80)
+    assert indices.min() >= 0 and indices.max() < 50
+    # inside a block the position moves forward by one date, wrapping around the end of the sample
+    steps = (indices[:, 1:] - indices[:, :-1]) % 50 == 1
+    assert steps.mean() == pytest.approx(1 - 1 / 5, abs=0.05)
+
+
+def test_block_indices():
+    indices = block_indices(50, 30, 7, np.random.default_rng(1), length=80)
+    assert indices.shape == (30, 80)
+    assert indices.min() >= 0 and indices.max() < 50
+    blocks = indices[:, :77].reshape(30, 11, 7)
+    assert ((np.diff(blocks, axis=-1) % 50) == 1).all()
+    assert block_indices(50, 3, 7, np.random.default_rng(1)).shape == (3, 50)
+
+
+@pytest.mark.parametrize("method", ["stationary", "block"])
+def test_same_seed_same_distributions(method):
+    first, second, other = (bootstrap(_returns(), nb_paths=300, method=method, seed=seed, batch_size=128)
+                            for seed in (7, 7, 8))
+    for kpi in ("sharpe_ratio", "max_drawdown"):
+        assert first.distributions[kpi].shape == (300,)
+        np.testing.assert_array_equal(first.distributions[kpi], second.distributions[kpi])
+        assert not np.array_equal(first.distributions[kpi], other.distributions[kpi])
+
+
+def test_several_strategies():
+    returns = pd.DataFrame(_returns(nb_strategies=2), columns=["a", "b"])
+    returns.iloc[:3, 0] = np.nan
+    result = bootstrap(returns, nb_paths=100, seed=1, length=50)
+    assert result.distributions["sharpe_ratio"].shape == (2, 100)
+    assert result.confidence_interval("sharpe_ratio").shape == (2, 2)
+    summary = result.summary()
+    assert list(summary["strategy"]) == ["a", "b", "a", "b"]
+    # a strategy alone is resampled on the same dates
+    alone = bootstrap(returns["b"].to_numpy()[3:], nb_paths=100, seed=1, length=50)
+    np.testing.assert_allclose(result.distributions["sharpe_ratio"][1], alone.distributions["sharpe_ratio"])
+
+
+def test_invalid_inputs():
+    with pytest.raises(ValueError):
+        bootstrap(_returns(), method="jackknife")
+    with pytest.raises(ValueError):
+        bootstrap(np.array([0.01, np.nan]))
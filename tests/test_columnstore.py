@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnstore import NS_PER_DAY, ColumnTable
+
+SCHEMA = {"ts": "int64", "symbol": "U", "funding_rate": "float64"}
+
+
+def _rows(days, symbols, rates):
+    ts = np.array([pd.Timestamp(day).value for day in days], dtype=np.int64)
+    return {"ts": ts, "symbol": np.array(symbols), "funding_rate": np.array(rates, dtype=np.float64)}
+
+
+def test_append_splits_rows_by_day(tmp_path):
+    table = ColumnTable(str(tmp_path), SCHEMA)
+    written = table.append(_rows(["2022-05-02 12:00", "2022-05-01 08:00", "2022-05-02 01:00"],
+                                 ["BTCUSDT", "ETHUSDT", "ETHUSDT"], [0.1, 0.2, 0.3]))
+    assert written == 3
+    assert table.partitions() == ["2022-05-01", "2022-05-02"]
+    assert len(os.listdir(tmp_path / "2022-05-02")) == 1
+
+
+def test_read_round_trip_sorted_by_time(tmp_path):
+    table = ColumnTable(str(tmp_path), SCHEMA)
+    table.append(_rows(["2022-05-02 12:00", "2022-05-01 08:00"], ["BTCUSDT", "ETHUSDT"], [0.1, 0.2]))
+    table.append(_rows(["2022-05-02 01:00"], ["ETHUSDT"], [0.3]))
+    data = table.read()
+    assert list(data) == list(SCHEMA)
+    assert list(data["symbol"]) == ["ETHUSDT", "ETHUSDT", "BTCUSDT"]
+    np.testing.assert_array_equal(data["funding_rate"], [0.2, 0.3, 0.1])
+    assert data["ts"].dtype == np.int64
+
+
+def test_read_filters_time_range_columns_and_values(tmp_path):
+    table = ColumnTable(str(tmp_path), SCHEMA)
+    table.append(_rows(["2022-05-01", "2022-05-02", "2022-05-03", "2022-05-03"],
+                       ["BTCUSDT", "BTCUSDT", "BTCUSDT", "ETHUSDT"], [0.1, 0.2, 0.3, 0.4]))
+    data = table.read("2022-05-02", "2022-05-03", columns=["funding_rate"], where={"symbol": "BTCUSDT"})
+    assert list(data) == ["funding_rate"]
+    np.testing.assert_array_equal(data["funding_rate"], [0.2, 0.3])
+    data = table.read(where={"symbol": ["ETHUSDT", "XRPUSDT"]})
+    np.testing.assert_array_equal(data["funding_rate"], [0.4])
+
+
+def test_read_of_an_empty_table_keeps_the_dtypes(tmp_path):
+    data = ColumnTable(str(tmp_path / "missing"), SCHEMA).read()
+    assert {name: len(array) for name, array in data.items()} == {"ts": 0, "symbol": 0, "funding_rate": 0}
+    assert data["funding_rate"].dtype == np.float64
+
+
+def test_compact_merges_the_parts_of_a_day(tmp_path):
+    table = ColumnTable(str(tmp_path), SCHEMA)
+    for rate in (0.1, 0.2, 0.3):
+        table.append(_rows(["2022-05-01"], ["BTCUSDT"], [rate]))
+    before = table.read()
+    assert table.compact() == 1
+    assert len(os.listdir(tmp_path / "2022-05-01")) == 1
+    for name, array in table.read().items():
+        np.testing.assert_array_equal(array, before[name])
+
+
+def test_append_checks_the_columns(tmp_path):
+    table = ColumnTable(str(tmp_path), SCHEMA)
+    with pytest.raises(KeyError):
+        table.append({"ts": [0], "symbol": ["BTCUSDT"]})
+    with pytest.raises(ValueError):
+        table.append({"ts": [0, NS_PER_DAY], "symbol": ["BTCUSDT"], "funding_rate": [0.1]})
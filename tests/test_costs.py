@@ -0,0 +1,76 @@
+import numpy as np
+
+from costs import CostModel, level_path, returns
+
+
+def _prices(nb_dates: int = 50, nb_assets: int = 3, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (nb_dates, nb_assets)), axis=0))
+
+
+def _reference(prices: np.ndarray, weights: np.ndarray, rates: np.ndarray, basis: float = 100.0) -> np.ndarray:
+    """
+    level of a portfolio of units traded at every close back to the weights, the costs of the traded weights
+    are paid out of the value before the units are bought
+    """
+    levels, units, cash = [basis], np.zeros(prices.shape[1]), basis
+    for t in range(len(prices)):
+        value = cash + units @ prices[t]
+        if t:
+            levels.append(value)
+        drifted = units * prices[t] / value
+        value *= 1 - np.abs(weights[t] - drifted) @ rates
+        units = weights[t] * value / prices[t]
+        cash = value - units @ prices[t]
+    return np.array(levels)
+
+
+def test_returns_of_missing_prices_are_zero():
+    prices = np.array([[np.nan, 10.0], [100.0, 11.0], [110.0, np.nan]])
+    np.testing.assert_allclose(returns(prices), [[0.0, 0.0], [0.0, 0.1], [0.1, 0.0]])
+
+
+def test_level_path_without_costs_compounds_the_portfolio_return():
+    prices = _prices()
+    weights = np.full(prices.shape, 1 / 3)
+    levels, turnover, costs = level_path(prices, weights)
+    expected = 100 * np.cumprod(1 + returns(prices).mean(axis=1))
+    np.testing.assert_allclose(levels, expected)
+    assert turnover[0] == 1.0
+    np.testing.assert_array_equal(costs, 0.0)
+
+
+def test_level_path_costs_match_a_unit_simulation():
+    prices = _prices()
+    rng = np.random.default_rng(3)
+    weights = rng.dirichlet(np.ones(3), len(prices)) * 0.9
+    rates = np.array([0.001, 0.002, 0.005])
+    levels, _, costs = level_path(prices, weights, rates)
+    np.testing.assert_allclose(levels, _reference(prices, weights, rates), rtol=1e-10)
+    assert (costs > 0).all()
+
+
+def test_level_path_evaluates_cost_scenarios_at_once():
+    prices = _prices()
+    weights = np.full(prices.shape, 0.3)
+    scenarios = np.array([[0.0, 0.0, 0.0], [0.001, 0.001, 0.001], [0.01, 0.01, 0.01]])
+    levels, turnover, costs = level_path(prices, weights, scenarios)
+    assert levels.shape == costs.shape == (3, len(prices))
+    for levels_k, rates in zip(levels, scenarios):
+        np.testing.assert_allclose(levels_k, level_path(prices, weights, rates)[0])
+    assert (np.diff(levels[:, -1]) < 0).all()
+
+
+def test_no_trade_outside_the_rebalancing_dates():
+    prices = _prices()
+    weights = np.full(prices.shape, 0.3)
+    rebalance = np.zeros(len(prices), dtype=bool)
+    rebalance[::10] = True
+    _, turnover, _ = level_path(prices, weights, np.full(3, 0.001), rebalance=rebalance)
+    assert (turnover[~rebalance] == 0).all()
+    assert (turnover[rebalance] > 0).all()
+
+
+def test_cost_model_rates():
+    model = CostModel(fee=0.001, spread=0.002, fee_by_code={"ethereum": 0.0}, spread_by_code={"dogecoin": 0.01})
+    np.testing.assert_allclose(model.rates(["bitcoin", "ethereum", "dogecoin"]), [0.002, 0.001, 0.006])
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from pandas import Timestamp
+
+from currency import CurrencyConverter
+from datasources import OHLCBatch
+from models.gecko import CoinGeckoExchangeRate, CoinGeckoMarketChart
+
+DAY_MS = 86_400_000
+DAY_NS = DAY_MS * 1_000_000
+START = Timestamp("2022-01-01")
+
+
+class _Client(object):
+    """
+    bitcoin at 10 000 + 100 * day usd and 8 000 + 100 * day eur, served for the requested range only
+    """
+    def __init__(self):
+        self.charts = list()
+        self.spot_calls = 0
+
+    def get_exchange_rate_by_currency(self):
+        self.spot_calls += 1
+        return {currency: CoinGeckoExchangeRate(name=currency, unit=currency, value=value, type="fiat")
+                for currency, value in (("btc", 1.0), ("usd", 20_000.0), ("eur", 18_000.0))}
+
+    def get_market_chart_by_range(self, id, vs_currency, start, end):
+        self.charts.append((vs_currency, int(start), int(end)))
+        first = START.value // 10 ** 6
+        days = np.arange(max(int(start) * 1000 - first, 0) // DAY_MS, (int(end) * 1000 - first) // DAY_MS + 1)
+        base = {"usd": 10_000.0, "eur": 8_000.0}[vs_currency]
+        return [CoinGeckoMarketChart(prices=[first + day * DAY_MS, base + 100 * day]) for day in days]
+
+
+def _ts(*days: float) -> np.ndarray:
+    return (START.value + np.array(days) * DAY_NS).astype(np.int64)
+
+
+def test_historical_rate_is_the_last_rate_at_or_before_every_date():
+    converter = CurrencyConverter(_Client())
+    rate = converter.historical_rate("usd", "eur", _ts(1, 1.5, 3))
+    np.testing.assert_allclose(rate, [8_100 / 10_100, 8_100 / 10_100, 8_300 / 10_300])
+    np.testing.assert_array_equal(converter.historical_rate("eur", "eur", _ts(1, 2)), [1.0, 1.0])
+
+
+def test_history_is_cached_and_extended_to_wider_ranges():
+    client = _Client()
+    converter = CurrencyConverter(client)
+    converter.historical_rate("usd", "eur", _ts(2, 5))
+    assert [currency for currency, _, _ in client.charts] == ["eur", "usd"]
+    # one day of margin before the first date
+    assert client.charts[0][1] == (START.value + DAY_NS) // 10 ** 9
+    converter.historical_rate("usd", "eur", _ts(3, 4))
+    assert len(client.charts) == 2
+    rate = converter.historical_rate("usd", "eur", _ts(4, 8))
+    assert len(client.charts) == 4
+    # the refetch covers the cached range and the new one
+    assert client.charts[-1][1] == client.charts[0][1]
+    np.testing.assert_allclose(rate, [8_400 / 10_400, 8_800 / 10_800])
+
+
+def test_spot_rates_are_kept_for_ttl_seconds():
+    client = _Client()
+    converter = CurrencyConverter(client, ttl=60)
+    assert converter.spot_rate("usd", "eur") == pytest.approx(0.9)
+    converter.spot_rate("eur", "usd")
+    assert client.spot_calls == 1
+    expired = CurrencyConverter(client, ttl=-1)
+    expired.spot_rate("usd", "eur")
+    expired.spot_rate("usd", "eur")
+    assert client.spot_calls == 3
+    with pytest.raises(KeyError):
+        converter.spot_rate("usd", "xyz")
+
+
+def test_convert():
+    converter = CurrencyConverter(_Client())
+    prices = np.array([[1.0, 2.0], [3.0, 4.0]])
+    np.testing.assert_allclose(converter.convert(prices, base="usd", target="eur"), prices * 0.9)
+    converted = converter.convert(prices, _ts(1, 2), base="usd", target="eur")
+    np.testing.assert_allclose(converted, prices * np.array([8_100 / 10_100, 8_200 / 10_200])[:, None])
+    batch = OHLCBatch(product_code="BTC", ts=_ts(1, 2), open=np.ones(2), high=np.ones(2), low=np.ones(2),
+                      close=np.array([1.0, 2.0]), volume=np.array([5.0, 6.0]))
+    converted = converter.convert_batch(batch, "usd", "eur")
+    np.testing.assert_allclose(converted.close, [8_100 / 10_100, 2 * 8_200 / 10_200])
+    np.testing.assert_array_equal(converted.volume, batch.volume)
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from derivatives import DerivativesCollector, tickers_to_columns
+from models.gecko import CoinGeckoDerivativesTickers
+
+HOUR_NS = 3_600 * 10 ** 9
+
+
+def _ticker(market: str, symbol: str, funding_rate, basis, price="100.5") -> CoinGeckoDerivativesTickers:
+    return CoinGeckoDerivativesTickers(market=market, symbol=symbol, index_id="BTC", price=price,
+                                       contract_type="perpetual", index=100.0, basis=basis, spread=0.01,
+                                       funding_rate=funding_rate, open_interest=None, volume_24h=1e6,
+                                       last_traded_at=1_650_000_000)
+
+
+class _Client(object):
+    """
+    client returning the queued snapshots of tickers in order
+    """
+    def __init__(self, *snapshots):
+        self._snapshots = list(snapshots)
+
+    def get_derivatives_tickers(self):
+        return self._snapshots.pop(0)
+
+
+def _collector(tmp_path) -> DerivativesCollector:
+    client = _Client([_ticker("Binance", "BTCUSDT", 0.01, 0.5), _ticker("FTX", "BTC-PERP", 0.02, -0.1)],
+                     [_ticker("Binance", "BTCUSDT", 0.03, 0.4)],
+                     [_ticker("Binance", "BTCUSDT", -0.01, 0.2), _ticker("FTX", "BTC-PERP", 0.01, 0.0)])
+    collector = DerivativesCollector(str(tmp_path), client=client)
+    for hour in range(3):
+        collector.collect(ts=pd.Timestamp("2022-05-01 22:00").value + hour * HOUR_NS)
+    return collector
+
+
+def test_tickers_to_columns_coerces_the_numbers():
+    columns = tickers_to_columns([_ticker("Binance", "BTCUSDT", "0.01", None, price="n/a")], ts=7)
+    assert columns["ts"].tolist() == [7]
+    assert columns["funding_rate"].tolist() == [0.01]
+    assert np.isnan(columns["basis"][0]) and np.isnan(columns["price"][0]) and np.isnan(columns["open_interest"][0])
+    assert columns["last_traded_at"].dtype == np.int64
+
+
+def test_funding_history_across_days(tmp_path):
+    collector = _collector(tmp_path)
+    assert collector.table.partitions() == ["2022-05-01", "2022-05-02"]
+    funding = collector.funding_history()
+    assert list(funding.index) == list(pd.date_range("2022-05-01 22:00", periods=3, freq="h"))
+    assert list(funding.columns) == [("Binance", "BTCUSDT"), ("FTX", "BTC-PERP")]
+    np.testing.assert_array_equal(funding.to_numpy(), [[0.01, 0.02], [0.03, np.nan], [-0.01, 0.01]])
+
+
+def test_basis_history_of_a_symbol_and_range(tmp_path):
+    basis = _collector(tmp_path).basis_history(start="2022-05-01 23:00", symbol="BTC-PERP")
+    assert list(basis.columns) == [("FTX", "BTC-PERP")]
+    np.testing.assert_array_equal(basis.to_numpy().ravel(), [0.0])
+
+
+def test_unknown_field(tmp_path):
+    with pytest.raises(ValueError):
+        _collector(tmp_path).history("leverage")
+
+
+def test_run_collects_every_interval(tmp_path):
+    snapshots = [[_ticker("Binance", "BTCUSDT", 0.01, 0.5)]] * 10
+    collector = DerivativesCollector(str(tmp_path), client=_Client(*snapshots), interval=0.01)
+
+    async def main():
+        collector.start()
+        await asyncio.sleep(0.05)
+        await collector.stop()
+
+    asyncio.run(main())
+    assert len(collector.table.read()["ts"]) >= 2
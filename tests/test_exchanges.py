@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from exchanges import ExchangeVolumeCollector
+from geckoclient import CoinGeckoClient
+
+DAY_MS = 86_400_000
+
+
+class _Response(object):
+    def __init__(self, url: str, payload, status_code: int = 200):
+        self.url = url
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode()
+        self.text = self.content.decode()
+
+
+class _Session(object):
+    """
+    session answering the routes of the mock api, any other url fails with a 429
+    """
+    def __init__(self, routes: dict):
+        self.routes = routes
+
+    def get(self, url, **kwargs):
+        route = url[len("http://mock/api/v3/"):]
+        if route in self.routes:
+            return _Response(url, self.routes[route])
+        return _Response(url, {"error": "rate limited"}, status_code=429)
+
+
+def _exchange(id: str, volume: float) -> dict:
+    return {"id": id, "name": id.title(), "country": "Nowhere", "trust_score": 10, "trust_score_rank": 1,
+            "trade_volume_24h_btc": volume, "trade_volume_24h_btc_normalized": volume}
+
+
+def _collector(tmp_path) -> ExchangeVolumeCollector:
+    session = _Session({
+        "exchanges?page=1&per_page=2": [_exchange("binance", 300.0), _exchange("kraken", 100.0)],
+        "exchanges/list": [{"id": "binance", "name": "Binance"}, {"id": "kraken", "name": "Kraken"}],
+        "exchanges/binance/volume_chart?days=2": [[DAY_MS, "300.0"], [2 * DAY_MS, "330.0"], [2 * DAY_MS, "330.0"]],
+        "exchanges/kraken/volume_chart?days=2": [[DAY_MS, "100.0"], [2 * DAY_MS, "110.0"]],
+    })
+    client = CoinGeckoClient(base_url="http://mock/api/v3/", session=session)
+    return ExchangeVolumeCollector(str(tmp_path), client=client, max_workers=2)
+
+
+def test_failed_page_ends_the_pagination(tmp_path):
+    collector = _collector(tmp_path)
+    assert collector.collect_exchanges(ts=DAY_MS * 1_000_000, per_page=2) == 2
+    metadata = collector.metadata()
+    assert sorted(metadata.index) == ["binance", "kraken"]
+    assert (metadata["ts"] == pd.Timestamp("1970-01-02")).all()
+
+
+def test_collect_is_idempotent(tmp_path):
+    collector = _collector(tmp_path)
+    assert collector.collect(days=2, metadata=False) == 4
+    assert collector.collect(days=2, metadata=False) == 0
+    shares = collector.market_share()
+    np.testing.assert_allclose(shares.sum(axis=1), 1.0)
+    np.testing.assert_allclose(shares["binance"], [0.75, 0.75])
@@ -0,0 +1,88 @@
+import asyncio
+
+import pandas as pd
+
+from feed import PriceFeed
+
+
+class _Client(object):
+    """
+    client returning the queued get_price_batch frames in order
+    """
+    def __init__(self, *responses: pd.DataFrame):
+        self._responses = list(responses)
+
+    def get_price_batch(self, ids, vs_currencies):
+        return self._responses.pop(0)
+
+
+def _prices(**prices) -> pd.DataFrame:
+    return pd.DataFrame({"usd": list(prices.values())}, index=list(prices))
+
+
+def test_poll_publishes_only_changed_prices():
+    feed = PriceFeed(["bitcoin", "ethereum"], client=_Client(_prices(bitcoin=100.0, ethereum=10.0),
+                                                             _prices(bitcoin=101.0, ethereum=10.0)))
+    assert sorted(feed.poll().index) == ["bitcoin", "ethereum"]
+    changes = feed.poll()
+    assert list(changes.index) == ["bitcoin"]
+    assert changes.loc["bitcoin", "usd"] == 101.0
+
+
+def test_tolerance_hides_small_moves():
+    feed = PriceFeed(["bitcoin"], client=_Client(_prices(bitcoin=100.0), _prices(bitcoin=100.5)), tolerance=0.01)
+    feed.poll()
+    assert feed.poll().empty
+
+
+def test_partial_poll_keeps_the_snapshot():
+    feed = PriceFeed(["bitcoin", "ethereum"], client=_Client(_prices(bitcoin=100.0, ethereum=10.0),
+                                                             pd.DataFrame(),
+                                                             _prices(bitcoin=100.0),
+                                                             _prices(bitcoin=100.0, ethereum=10.0)))
+    feed.poll()
+    assert feed.poll().empty
+    assert feed.poll().empty
+    assert feed.snapshot.loc["ethereum", "usd"] == 10.0
+    # the coins missing from the failed chunks are not republished once they come back unchanged
+    assert feed.poll().empty
+
+
+def test_subscriber_receives_the_snapshot_first():
+    feed = PriceFeed(["bitcoin"], client=_Client(_prices(bitcoin=100.0)))
+    feed.poll()
+    message = feed.subscribe().get_nowait()
+    assert message["prices"] == {"bitcoin": {"usd": 100.0}}
+
+
+def test_incomplete_batch_merges_the_prices_fetched():
+    from geckoclient import IncompleteBatchError
+
+    class _Failing(object):
+        def get_price_batch(self, ids, vs_currencies):
+            raise IncompleteBatchError("chunk failed", ["ethereum"], _prices(bitcoin=101.0))
+
+    feed = PriceFeed(["bitcoin", "ethereum"], client=_Client(_prices(bitcoin=100.0, ethereum=10.0)))
+    feed.poll()
+    feed._client = _Failing()
+    assert list(feed.poll().index) == ["bitcoin"]
+    assert feed.snapshot.loc["ethereum", "usd"] == 10.0
+
+
+def test_on_demand_polls_only_while_subscribed():
+    feed = PriceFeed(["bitcoin"], interval=0.01, on_demand=True,
+                     client=_Client(*[_prices(bitcoin=100.0 + poll) for poll in range(1000)]))
+
+    async def main():
+        await asyncio.sleep(0.05)
+        assert not feed.running
+        first, second = feed.subscribe(), feed.subscribe()
+        message = await asyncio.wait_for(first.get(), timeout=1)
+        assert message["prices"]["bitcoin"]["usd"] >= 100.0
+        feed.unsubscribe(first)
+        assert feed.running
+        feed.unsubscribe(second)
+        assert not feed.running
+        await feed.stop()
+
+    asyncio.run(main())
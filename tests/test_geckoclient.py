@@ -0,0 +1,98 @@
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from geckoclient import CoinGeckoClient, IncompleteBatchError
+
+BASE_URL = "http://mock/api/v3/"
+
+
+class _Response(object):
+    def __init__(self, url: str, payload, status_code: int = 200):
+        self.url = url
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode()
+        self.text = self.content.decode()
+
+
+class _Session(object):
+    """
+    /simple/price and /coins/markets of a market of nb_coins coins, the pages (or ids) in fail answer a 429
+    """
+    def __init__(self, nb_coins: int = 0, fail=()):
+        self.coins = [f"coin-{number}" for number in range(nb_coins)]
+        self.fail = set(fail)
+        self.urls = list()
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.urls.append(url)
+        parts = urlsplit(url)
+        query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        ids = query["ids"].split(",") if "ids" in query else None
+        if self.fail.intersection(ids or [int(query.get("page", 1))]):
+            return _Response(url, {"status": {"error_code": 429}}, status_code=429)
+        if parts.path.endswith("simple/price"):
+            return _Response(url, {id: {"usd": 1.0} for id in ids})
+        if ids is None:
+            per_page, page = int(query["per_page"]), int(query["page"])
+            ids = self.coins[(page - 1) * per_page:page * per_page]
+        return _Response(url, [{"id": id, "current_price": 1.0, "market_cap": 1.0} for id in ids])
+
+
+def _client(session: _Session) -> CoinGeckoClient:
+    return CoinGeckoClient(base_url=BASE_URL, session=session)
+
+
+def test_price_chunks_stay_under_the_url_length():
+    ids = [f"coin {number}/é" for number in range(300)]
+    session = _Session()
+    prices = _client(session).get_price_batch(ids, "usd", max_url_length=500)
+    assert sorted(prices.index) == sorted(ids)
+    assert len(session.urls) > 1
+    assert max(len(url) for url in session.urls) <= 500
+
+
+def test_markets_chunks_hold_at_most_per_page_ids():
+    ids = [f"coin-{number}" for number in range(25)]
+    session = _Session()
+    markets = _client(session).get_markets_batch("usd", ids=ids, per_page=10)
+    assert sorted(markets.index) == sorted(ids)
+    assert sorted(len(parse_qs(urlsplit(url).query)["ids"][0].split(",")) for url in session.urls) == [5, 10, 10]
+
+
+def test_pagination_stops_on_the_first_incomplete_page():
+    session = _Session(nb_coins=25)
+    markets = _client(session).get_markets_batch("usd", per_page=10, max_workers=2)
+    assert len(markets) == 25
+    pages = sorted(int(parse_qs(urlsplit(url).query)["page"][0]) for url in session.urls)
+    assert pages == [1, 2, 3, 4]
+
+
+def test_pagination_stops_at_max_pages():
+    session = _Session(nb_coins=100)
+    markets = _client(session).get_markets_batch("usd", per_page=10, max_pages=3, max_workers=2)
+    assert len(markets) == 30
+    assert len(session.urls) == 3
+
+
+def test_failed_page_raises_with_the_pages_fetched():
+    session = _Session(nb_coins=100, fail=[2])
+    with pytest.raises(IncompleteBatchError) as error:
+        _client(session).get_markets_batch("usd", per_page=10, max_workers=2)
+    assert error.value.failed == [2]
+    assert len(error.value.partial) == 10
+    assert len(session.urls) == 2
+
+
+def test_failed_chunk_raises_with_its_ids():
+    ids = [f"coin-{number}" for number in range(40)]
+    session = _Session(fail=["coin-0"])
+    with pytest.raises(IncompleteBatchError) as error:
+        _client(session).get_price_batch(ids, "usd", max_url_length=len(BASE_URL) + 120)
+    assert "coin-0" in error.value.failed
+    assert sorted(error.value.failed + list(error.value.partial.index)) == sorted(ids)
+    assert len(error.value.partial) > 0
@@ -0,0 +1,31 @@
+import numpy as np
+
+from grouping import bucket_by, group_codes
+
+
+def test_group_codes_with_duplicates():
+    groups = group_codes(np.array([30, 10, 30, 20, 10, 30]))
+    np.testing.assert_array_equal(groups.keys, [10, 20, 30])
+    np.testing.assert_array_equal(groups.counts, [2, 1, 3])
+    # the positions keep their original order inside a group
+    assert [(int(key), list(indices)) for key, indices in groups] == [(10, [1, 4]), (20, [3]), (30, [0, 2, 5])]
+
+
+def test_group_codes_of_one_code():
+    groups = group_codes(np.full(4, 7, dtype=np.int64))
+    assert len(groups) == 1
+    np.testing.assert_array_equal(groups.indices(0), [0, 1, 2, 3])
+
+
+def test_group_codes_empty():
+    groups = group_codes(np.array([], dtype=np.int64))
+    assert len(groups) == 0
+    assert groups.keys.shape == groups.starts.shape == groups.ends.shape == (0,)
+    assert list(groups) == []
+
+
+def test_bucket_by():
+    items = ["bb", "a", "cc", "d", "eee"]
+    assert bucket_by(items, len) == {3: ["eee"], 2: ["bb", "cc"], 1: ["a", "d"]}
+    assert list(bucket_by(items, len, reverse=False)) == [1, 2, 3]
+    assert bucket_by([], len) == {}
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import Timestamp
+
+from indices import INDEX_PREFIX, IndexBuilder, IndexSource, cap_weights
+from rebalancing import EveryNBars
+
+DAY_MS = 86_400_000
+
+
+def test_market_cap_weights_without_cap():
+    weights = cap_weights(np.array([[3.0, 1.0, np.nan], [0.0, 0.0, 0.0]]))
+    np.testing.assert_allclose(weights, [[0.75, 0.25, 0.0], [0.0, 0.0, 0.0]])
+
+
+def test_excess_is_redistributed_until_no_weight_exceeds_the_cap():
+    weights = cap_weights(np.array([[50.0, 30.0, 15.0, 5.0], [60.0, 35.0, 5.0, 0.0]]), cap=0.4)
+    np.testing.assert_allclose(weights, [[0.4, 0.36, 0.18, 0.06], [0.4, 0.4, 0.2, 0.0]])
+
+
+def test_infeasible_cap_is_raised_to_equal_weights():
+    np.testing.assert_allclose(cap_weights(np.array([[90.0, 10.0, np.nan]]), cap=0.3), [[0.5, 0.5, 0.0]])
+
+
+def test_capped_weights_sum_to_one():
+    rng = np.random.default_rng(8)
+    market_caps = rng.lognormal(0, 2, (50, 20))
+    market_caps[rng.random(market_caps.shape) < 0.2] = np.nan
+    weights = cap_weights(market_caps, cap=0.1)
+    np.testing.assert_allclose(weights.sum(axis=1), 1.0)
+    assert weights.max() <= 0.1 + 1e-9
+
+
+class _Client(object):
+    """
+    category of two coins with daily prices, bitcoin twice the market cap of ethereum
+    """
+    PRICES = {"bitcoin": [100.0, 110.0, 99.0, 120.0], "ethereum": [10.0, 10.0, 12.0, 9.0]}
+
+    def __init__(self):
+        self.charts = 0
+
+    def get_markets_batch(self, vs_currency, category=None, order=None, max_workers=None):
+        return pd.DataFrame({"market_cap": [1.0, 2.0]}, index=["ethereum", "bitcoin"])
+
+    def get_market_chart_by_range(self, id, vs_currency, start, end):
+        self.charts += 1
+        supply = 2 if id == "bitcoin" else 10
+        return [SimpleNamespace(prices=[day * DAY_MS, price], market_caps=[day * DAY_MS, price * supply])
+                for day, price in enumerate(self.PRICES[id])]
+
+
+def test_index_levels_and_source():
+    client = _Client()
+    builder = IndexBuilder(client=client, rebalancing=EveryNBars(2))
+    index = builder.build("layer-1", Timestamp("1970-01-01"), Timestamp("1970-01-04"))
+    assert index.code == INDEX_PREFIX + "layer-1"
+    assert index.constituents == ["bitcoin", "ethereum"]
+    # market caps 200/100 then 198/120 on the second rebalancing
+    bitcoin, ethereum = np.array(_Client.PRICES["bitcoin"]), np.array(_Client.PRICES["ethereum"])
+    first = 2 / 3 * bitcoin[:3] / 100 + 1 / 3 * ethereum[:3] / 10
+    second = first[2] * (198 / 318 * 120 / 99 + 120 / 318 * 9 / 12)
+    np.testing.assert_allclose(index.levels.to_numpy(), 100 * np.append(first, second))
+    assert list(index.rebalance_dates.day) == [1, 3]
+
+    builder.build("layer-1", Timestamp("1970-01-01"), Timestamp("1970-01-04"))
+    assert client.charts == 2
+
+    source = IndexSource(builder)
+    source.publish(index.batch)
+    batch = source.load(index.code)
+    np.testing.assert_allclose(batch.close, index.levels.to_numpy())
+    with pytest.raises(KeyError):
+        source.load("bitcoin")
+
+
+def test_built_index_is_rebuilt_for_a_wider_range():
+    builder = IndexBuilder(client=_Client())
+    ranges = list()
+    build = builder.build
+    builder.build = lambda category, start, end, **kwargs: ranges.append((start.day, end.day)) or \
+        build(category, start, end, **kwargs)
+    source = IndexSource(builder)
+    code = INDEX_PREFIX + "layer-1"
+    assert len(source.load(code, start=Timestamp("1970-01-02"), end=Timestamp("1970-01-03"))) == 2
+    assert len(source.load(code, start=Timestamp("1970-01-02"), end=Timestamp("1970-01-02"))) == 1
+    assert ranges == [(2, 3)]
+    # a range reaching outside of the built one rebuilds the index over both
+    assert len(source.load(code, start=Timestamp("1970-01-01"), end=Timestamp("1970-01-02"))) == 2
+    assert ranges == [(2, 3), (1, 3)]
+    assert len(source.load(code, start=Timestamp("1970-01-01"), end=Timestamp("1970-01-03"))) == 3
+    assert len(ranges) == 2
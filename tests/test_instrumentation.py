@@ -0,0 +1,85 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from base import BaseClient, Client, RequestSpec
+from instrumentation import Histogram, MetricsRegistry
+
+
+class _Response(object):
+    status_code = 200
+    content = b'{"gecko_says": "(V3) To the Moon!"}'
+    headers = {"Content-Length": "35"}
+
+    def __init__(self, retries: int = 0, from_cache: bool = False):
+        self.raw = SimpleNamespace(retries=SimpleNamespace(history=[None] * retries))
+        self.from_cache = from_cache
+
+
+class _Session(object):
+    def __init__(self, delay: float = 0.0, **response):
+        self.delay = delay
+        self.response = response
+
+    def get(self, url, **kwargs):
+        time.sleep(self.delay)
+        return _Response(**self.response)
+
+
+class _Client(Client):
+    base_url = "http://mock/api/v3/"
+
+    def __init__(self, session: _Session):
+        self._session = session
+
+    @property
+    def session(self):
+        return self._session
+
+
+def _observe(client: _Client, func):
+    registry, events = MetricsRegistry(), list()
+
+    def hook(event):
+        events.append(event)
+        registry.observe(event)
+
+    BaseClient.add_hook(hook)
+    try:
+        func(client)
+    finally:
+        BaseClient.remove_hook(hook)
+    return registry, events
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 1), ("1.0", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+
+
+def test_retries_and_cache_of_the_session():
+    registry, events = _observe(_Client(_Session(retries=2, from_cache=True)), lambda client: client._fetch(
+        RequestSpec("ping")))
+    assert [(event.status, event.retries, event.cache_hit) for event in events] == [(200, 2, True)]
+    metrics = registry.to_prometheus()
+    assert 'coingecko_client_retries_total{endpoint="ping"} 2' in metrics
+    assert 'coingecko_client_cache_total{endpoint="ping",result="hit"} 1' in metrics
+
+
+def test_shared_request_is_a_hit_without_status():
+    def fetch_twice(client):
+        thread = threading.Thread(target=client._fetch, args=(RequestSpec("ping"),))
+        thread.start()
+        time.sleep(0.05)
+        client._fetch(RequestSpec("ping"))
+        thread.join()
+
+    registry, events = _observe(_Client(_Session(delay=0.2)), fetch_twice)
+    assert sorted((event.cache_hit, event.status) for event in events) == [(False, 200), (True, None)]
+    metrics = registry.to_prometheus()
+    assert 'coingecko_client_requests_total{endpoint="ping",status="200"} 1' in metrics
+    assert 'coingecko_client_cache_total{endpoint="ping",result="hit"} 1' in metrics
+    assert 'coingecko_client_cache_total{endpoint="ping",result="miss"} 1' in metrics
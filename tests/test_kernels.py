@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+import kernels
+from kernels import DrawdownDerisk, StopLoss
+
+
+@pytest.fixture(params=["python", "numba"])
+def mode(request, monkeypatch):
+    """
+    run the kernels as plain python (the fallback without numba) and compiled with numba when it is installed
+    """
+    if request.param == "numba":
+        pytest.importorskip("numba")
+        assert kernels.NUMBA_AVAILABLE
+    else:
+        for name in ("_drift", "_stop_loss_kernel", "_drawdown_kernel"):
+            kernel = getattr(kernels, name)
+            monkeypatch.setattr(kernels, name, getattr(kernel, "py_func", kernel))
+    return request.param
+
+
+def _mask(nb_dates: int, *dates: int) -> np.ndarray:
+    mask = np.zeros(nb_dates, dtype=bool)
+    mask[list(dates)] = True
+    return mask
+
+
+def _column(values) -> np.ndarray:
+    return np.array(values, dtype=np.float64)[:, None]
+
+
+def test_fixed_stop_loss(mode):
+    prices = _column([100.0, 95.0, 89.0, 120.0, 80.0])
+    weights, trades = StopLoss(0.1)(prices, np.full(prices.shape, 0.5), _mask(5, 0, 3))
+    # 95 stays above the stop at 90, 89 hits it, 80 hits the stop at 108 of the rebalancing at 120
+    np.testing.assert_allclose(weights[:, 0], [0.5, 0.475 / 0.975, 0.0, 0.5, 0.0])
+    np.testing.assert_array_equal(trades, [True, False, True, True, True])
+
+
+def test_trailing_stop_loss(mode):
+    prices = _column([100.0, 120.0, 110.0, 107.0, 130.0])
+    targets = np.full(prices.shape, 0.5)
+    weights, trades = StopLoss(0.1, trailing=True)(prices, targets, _mask(5, 0))
+    # the highest price 120 puts the stop at 108, a fixed stop would stay at 90
+    first = 0.6 / 1.1
+    second = first * 110 / 120 / (1 - first + first * 110 / 120)
+    np.testing.assert_allclose(weights[:, 0], [0.5, first, second, 0.0, 0.0])
+    np.testing.assert_array_equal(trades, [True, False, False, True, False])
+    fixed, _ = StopLoss(0.1)(prices, targets, _mask(5, 0))
+    assert (fixed[:, 0] > 0).all()
+
+
+def test_stop_loss_only_closes_the_falling_asset(mode):
+    prices = np.array([[100.0, 10.0], [80.0, 11.0]])
+    weights, _ = StopLoss(0.1)(prices, np.full(prices.shape, 0.4), _mask(2, 0))
+    assert weights[1, 0] == 0.0 and weights[1, 1] > 0.4
+
+
+def test_drawdown_derisk(mode):
+    prices = _column([100.0, 110.0, 99.0, 88.0, 100.0, 120.0])
+    weights, trades = DrawdownDerisk(0.15, scale=0.5)(prices, np.ones(prices.shape), _mask(6, 0, 4))
+    # the drawdown reaches 20% at 88, back to 14.5% at 100 on the rebalancing date
+    np.testing.assert_allclose(weights[:, 0], [1.0, 1.0, 1.0, 0.5, 1.0, 1.0])
+    np.testing.assert_array_equal(trades, [True, False, False, True, True, False])
+
+
+def test_drawdown_stays_derisked_until_a_rebalancing(mode):
+    prices = _column([100.0, 110.0, 99.0, 88.0, 100.0])
+    weights, trades = DrawdownDerisk(0.15, scale=0.5)(prices, np.ones(prices.shape), _mask(5, 0, 3))
+    invested = 0.5 * 100 / 88
+    np.testing.assert_allclose(weights[:, 0], [1.0, 1.0, 1.0, 0.5, invested / (0.5 + invested)])
+    np.testing.assert_array_equal(trades, [True, False, False, True, False])
+
+
+def test_python_and_numba_agree():
+    numba = pytest.importorskip("numba")
+    rng = np.random.default_rng(12)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, (300, 4)), axis=0))
+    prices[:20, 3] = np.nan
+    targets = np.tile([0.3, 0.3, 0.2, 0.2], (300, 1))
+    rebalance = _mask(300, *range(0, 300, 30))
+    assert isinstance(kernels._stop_loss_kernel, numba.core.registry.CPUDispatcher)
+    for overlay, kernel in ((StopLoss(0.08, trailing=True), "_stop_loss_kernel"),
+                            (DrawdownDerisk(0.1), "_drawdown_kernel")):
+        compiled = overlay(prices, targets, rebalance)
+        with pytest.MonkeyPatch.context() as patch:
+            for name in ("_drift", kernel):
+                patch.setattr(kernels, name, getattr(kernels, name).py_func)
+            python = overlay(prices, targets, rebalance)
+        np.testing.assert_allclose(compiled[0], python[0])
+        np.testing.assert_array_equal(compiled[1], python[1])
+
+
+def test_invalid_stop():
+    with pytest.raises(ValueError):
+        StopLoss(1.5)
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from optimizer import PortfolioOptimizer, RollingCovariance, max_sharpe, min_variance, project, risk_parity
+
+
+def _covariance(nb_assets: int = 6, seed: int = 5) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (nb_assets, 2))
+    return factors @ factors.T + np.diag(rng.uniform(1e-5, 4e-4, nb_assets))
+
+
+def _assert_feasible(weights: np.ndarray, lower: float, upper: float):
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights.min() >= lower - 1e-9
+    assert weights.max() <= upper + 1e-9
+
+
+def test_project_on_the_capped_simplex():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        point = rng.normal(0, 0.5, 8)
+        projected = project(point, 0.0, 0.3)
+        _assert_feasible(projected, 0.0, 0.3)
+        # no feasible point is closer: the projection is optimal along the feasible directions
+        for other in (project(rng.normal(0, 0.5, 8), 0.0, 0.3) for _ in range(20)):
+            assert (point - projected) @ (other - projected) <= 1e-9
+
+
+def test_project_keeps_a_feasible_point():
+    weights = np.array([0.1, 0.2, 0.3, 0.4])
+    np.testing.assert_allclose(project(weights, 0.0, 0.5), weights)
+
+
+def test_min_variance_matches_the_closed_form_when_no_bound_binds():
+    covariance = _covariance()
+    inverse = np.linalg.solve(covariance, np.ones(len(covariance)))
+    expected = inverse / inverse.sum()
+    weights = min_variance(covariance, lower=-10.0, upper=10.0, max_iter=5000, tol=1e-12)
+    np.testing.assert_allclose(weights, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("lower, upper", [(0.0, 1.0), (0.0, 0.25), (0.05, 0.3)])
+def test_min_variance_respects_the_bounds_and_beats_feasible_points(lower, upper):
+    covariance = _covariance()
+    weights = min_variance(covariance, lower, upper, max_iter=2000, tol=1e-10)
+    _assert_feasible(weights, lower, upper)
+    rng = np.random.default_rng(1)
+    variance = weights @ covariance @ weights
+    for _ in range(200):
+        other = project(rng.dirichlet(np.ones(len(covariance))), lower, upper)
+        assert variance <= other @ covariance @ other + 1e-12
+
+
+def test_risk_parity_equalizes_the_risk_contributions():
+    covariance = _covariance()
+    weights = risk_parity(covariance)
+    _assert_feasible(weights, 0.0, 1.0)
+    contributions = weights * (covariance @ weights)
+    np.testing.assert_allclose(contributions, contributions.mean(), rtol=1e-5)
+
+
+def test_max_sharpe_is_close_to_the_tangency_portfolio():
+    covariance = _covariance()
+    mean = np.sqrt(np.diag(covariance)) * np.linspace(0.05, 0.15, len(covariance))
+    tangency = np.linalg.solve(covariance, mean)
+    tangency /= tangency.sum()
+    assert tangency.min() > 0
+    weights = max_sharpe(covariance, mean, nb_points=200, max_iter=2000, tol=1e-10)
+    _assert_feasible(weights, 0.0, 1.0)
+
+    def sharpe(w):
+        return mean @ w / np.sqrt(w @ covariance @ w)
+
+    assert sharpe(weights) == pytest.approx(sharpe(tangency), rel=1e-3)
+
+
+def test_max_sharpe_respects_the_cap():
+    covariance = _covariance()
+    mean = np.linspace(0.0, 0.01, len(covariance))
+    _assert_feasible(max_sharpe(covariance, mean, upper=0.2), 0.0, 0.2)
+
+
+def test_rolling_covariance_matches_numpy():
+    rng = np.random.default_rng(2)
+    returns = rng.normal(0, 0.02, (60, 4))
+    returns[:15, 3] = np.nan
+    covariances = RollingCovariance(returns, window=20)
+    for end in (10, 20, 35, 60, 30):
+        covariance, mean, estimated = covariances.update(end)
+        window = returns[max(end - 20, 0):end]
+        complete = window[:, :3]
+        np.testing.assert_allclose(covariance[:3, :3], np.cov(complete, rowvar=False), atol=1e-12)
+        np.testing.assert_allclose(mean[:3], complete.mean(axis=0))
+        assert estimated[3] == (np.sum(~np.isnan(window[:, 3])) >= 10)
+
+
+def test_targets_are_held_between_the_optimization_dates():
+    rng = np.random.default_rng(4)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (120, 5)), axis=0))
+    quoted = np.ones(prices.shape, dtype=bool)
+    quoted[:70, 4] = False
+    dates = np.zeros(len(prices), dtype=bool)
+    dates[::20] = True
+    targets = PortfolioOptimizer("min_variance", window=30, upper=0.4).targets(prices, quoted, dates)
+    np.testing.assert_allclose(targets.sum(axis=1), 1.0)
+    assert targets.max() <= 0.4 + 1e-9
+    # equal weights before the covariance can be estimated, never in an asset without quote
+    np.testing.assert_allclose(targets[0, :4], 0.25)
+    assert (targets[:80, 4] == 0).all()
+    for row in np.flatnonzero(dates):
+        assert (targets[row:row + 20] == targets[row]).all()
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        PortfolioOptimizer("max_return")
@@ -0,0 +1,66 @@
+import json
+import pstats
+import sys
+
+import pytest
+
+from profiling import Profiler, profiled
+
+
+class _Run(object):
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+
+    @profiled()
+    def load(self):
+        return [[] for _ in range(1000)]
+
+    @profiled("fail")
+    def broken(self):
+        raise RuntimeError("stage failed")
+
+
+def test_stages_in_execution_order():
+    profiler = Profiler()
+    with profiler.stage("outer"):
+        kept = _Run(profiler).load()
+    assert [stage.name for stage in profiler.report.stages] == ["load", "outer"]
+    load, outer = profiler.report.stages
+    assert load.allocated > 0 and load.objects > 0 and len(kept) == 1000
+    assert outer.wall >= load.wall
+    header = json.loads(profiler.report.to_header())
+    assert list(header) == ["load", "outer"] and len(header["load"]) == 5
+    assert "load" in repr(profiler.report)
+
+
+def test_no_profiler_no_stage():
+    assert len(_Run().load()) == 1000
+
+
+def test_cprofile_trace_covers_the_run(tmp_path):
+    profiler = Profiler(trace="cprofile", trace_dir=str(tmp_path))
+    run = _Run(profiler)
+    run.load()
+    run.load()
+    path = profiler.dump("my run")
+    assert path == str(tmp_path / "my_run.prof") and profiler.report.trace_path == path
+    assert any(function == "load" for _, _, function in pstats.Stats(path).stats)
+    assert sys.getprofile() is None
+    assert profiler.dump() is None
+
+
+def test_failed_stage_stops_the_trace(tmp_path):
+    profiler = Profiler(trace="cprofile", trace_dir=str(tmp_path))
+    with pytest.raises(RuntimeError):
+        _Run(profiler).broken()
+    assert sys.getprofile() is None
+    assert profiler.report.trace_path == str(tmp_path / "fail.prof")
+    assert [stage.name for stage in profiler.report.stages] == ["fail"]
+    # the later stages do not restart a trace
+    _Run(profiler).load()
+    assert sys.getprofile() is None
+
+
+def test_invalid_tracer():
+    with pytest.raises(ValueError):
+        Profiler(trace="perf")
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quality import DataQuality, FillPolicy, forward_fill, rolling_mad
+
+NAN = np.nan
+
+
+def _calendar(nb_dates: int) -> pd.DatetimeIndex:
+    return pd.date_range("2022-01-01", periods=nb_dates)
+
+
+def _walk(nb_dates: int = 80, seed: int = 9) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, nb_dates)))
+
+
+def test_forward_fill():
+    prices = np.array([[NAN, 1.0], [2.0, NAN], [NAN, NAN], [3.0, 4.0]])
+    np.testing.assert_array_equal(forward_fill(prices), [[NAN, 1.0], [2.0, 1.0], [2.0, 1.0], [3.0, 4.0]])
+
+
+def test_rolling_mad_excludes_the_current_row():
+    values = np.arange(10, dtype=np.float64)[:, None]
+    median, mad = rolling_mad(values, window=4, min_periods=4)
+    assert np.isnan(median[:4]).all()
+    assert median[4, 0] == 1.5
+    # every value of a ramp is 2.5 above the median of the 4 values before it
+    assert mad[-1, 0] == pytest.approx(2.5)
+
+
+def test_gaps_and_forward_fill_with_limit():
+    prices = np.array([[NAN, 10.0], [1.0, 11.0], [1.0, 12.0], [1.0, 12.0], [1.0, 12.0], [2.0, 13.0]])
+    quoted = np.array([[False, True], [True, True], [False, True], [False, False], [False, False], [True, True]])
+    cleaned, report = DataQuality(limit=2).clean(_calendar(6), prices, quoted, ["a", "b"])
+    np.testing.assert_array_equal(cleaned[:, 0], [NAN, 1.0, 1.0, 1.0, NAN, 2.0])
+    np.testing.assert_array_equal(cleaned[:, 1], [10.0, 11.0, 12.0, 12.0, 12.0, 13.0])
+    frame = report.to_frame()
+    assert frame.loc["a", "gaps"] == 3 and frame.loc["a", "filled"] == 2 and frame.loc["a", "longest_gap"] == 3
+    assert frame.loc["b", "gaps"] == 2 and frame.loc["b", "longest_gap"] == 2
+    # the dates before the first quote are not gaps
+    assert not report.gaps[0, 0]
+
+
+def test_no_fill_leaves_nan():
+    prices = np.array([[1.0], [1.0], [2.0]])
+    quoted = np.array([[True], [False], [True]])
+    cleaned, report = DataQuality(fill=FillPolicy.NONE).clean(_calendar(3), prices, quoted, ["a"])
+    np.testing.assert_array_equal(cleaned[:, 0], [1.0, NAN, 2.0])
+    assert report.filled.sum() == 0 and report.gaps.sum() == 1
+
+
+def test_empty_dates():
+    quoted = np.array([[True, True], [False, False], [True, False]])
+    _, report = DataQuality().clean(_calendar(3), np.ones((3, 2)), quoted, ["a", "b"])
+    assert list(report.empty_dates) == [pd.Timestamp("2022-01-02")]
+
+
+def test_jump_is_an_outlier_but_not_a_spike():
+    prices = _walk()
+    prices[60:] *= 1.5
+    quoted = np.ones((len(prices), 1), dtype=bool)
+    _, report = DataQuality().clean(_calendar(len(prices)), prices[:, None], quoted, ["a"])
+    assert list(np.flatnonzero(report.outliers[:, 0])) == [60]
+    assert report.spikes.sum() == 0
+
+
+def test_spike_is_removed_and_filled():
+    prices = _walk()
+    prices[60] *= 1.5
+    quoted = np.ones((len(prices), 1), dtype=bool)
+    flagged, report = DataQuality().clean(_calendar(len(prices)), prices[:, None], quoted, ["a"])
+    assert list(np.flatnonzero(report.spikes[:, 0])) == [60]
+    assert flagged[60, 0] == prices[60]
+    cleaned, report = DataQuality(remove_spikes=True).clean(_calendar(len(prices)), prices[:, None], quoted, ["a"])
+    assert not report.valid[60, 0] and report.filled[60, 0]
+    assert cleaned[60, 0] == prices[59]
+
+
+def test_spike_followed_by_a_missing_bar():
+    prices = _walk()
+    prices[60] *= 1.5
+    prices[61] = prices[60]
+    quoted = np.ones((len(prices), 2), dtype=bool)
+    # the reversal is the next quoted return, two dates later, and only the second product misses a bar
+    quoted[61, 1] = False
+    _, report = DataQuality().clean(_calendar(len(prices)), np.column_stack([_walk(), prices]), quoted, ["a", "b"])
+    assert list(np.flatnonzero(report.spikes[:, 1])) == [60]
+    assert report.spikes[:, 0].sum() == 0
+
+
+def test_invalid_arguments():
+    with pytest.raises(TypeError):
+        DataQuality(fill="forward")
+    with pytest.raises(ValueError):
+        DataQuality(window=1)
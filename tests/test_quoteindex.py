@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Backtester import Quote, QuoteIndex, QuoteKey
+
+DAYS = pd.date_range("2022-01-01", periods=6, freq="D")
+
+
+def _quote(product_code: str, day: int) -> Quote:
+    return Quote(key=QuoteKey(product_code, DAYS[day]), close=10.0 * day)
+
+
+@pytest.fixture
+def index() -> QuoteIndex:
+    """
+    BTC quoted on days 1, 2 and 4 (a gap on day 3), ETH on days 3 and 4, SOL never, given out of order
+    """
+    index = QuoteIndex.from_quotes([_quote("BTC", 4), _quote("ETH", 3), _quote("BTC", 1), _quote("ETH", 4),
+                                    _quote("BTC", 2)])
+    index.add("SOL", np.array([], dtype=np.int64), [])
+    return index
+
+
+def _days(quotes):
+    return [list(DAYS).index(quote.key.ts) for quote in quotes]
+
+
+def test_between(index):
+    assert _days(index.between("BTC")) == [1, 2, 4]
+    assert _days(index.between("BTC", DAYS[2], DAYS[4])) == [2, 4]
+    assert _days(index.between("BTC", DAYS[3], DAYS[3])) == []
+    assert _days(index.between("BTC", DAYS[0], DAYS[0])) == []
+    assert _days(index.between("BTC", DAYS[5])) == []
+    assert _days(index.between("BTC", DAYS[4], DAYS[1])) == []
+    assert index.between("SOL") == []
+    np.testing.assert_array_equal(index.closes("BTC", end=DAYS[3]), [10.0, 20.0])
+
+
+def test_asof(index):
+    assert index.asof("BTC", DAYS[0]) is None
+    assert _days([index.asof("BTC", DAYS[1])]) == [1]
+    # the gap and the dates after the last quote take the last quote before them
+    assert _days([index.asof("BTC", DAYS[3])]) == [2]
+    assert _days([index.asof("BTC", DAYS[5] + pd.Timedelta(days=30))]) == [4]
+    assert index.asof("SOL", DAYS[5]) is None
+
+
+def test_close_matrix(index):
+    ts = DAYS.values.astype("datetime64[ns]").astype(np.int64)
+    matrix = index.close_matrix(["BTC", "ETH", "SOL"], ts)
+    np.testing.assert_array_equal(matrix[:, 0], [np.nan, 10, 20, 20, 40, 40])
+    np.testing.assert_array_equal(matrix[:, 1], [np.nan, np.nan, np.nan, 30, 40, 40])
+    assert np.isnan(matrix[:, 2]).all()
+    assert index.close_matrix(["BTC", "ETH"], ts[:0]).shape == (0, 2)
+
+
+def test_quoted(index):
+    ts = DAYS.values.astype("datetime64[ns]").astype(np.int64)
+    matrix = index.quoted(["BTC", "ETH", "SOL"], ts)
+    np.testing.assert_array_equal(matrix[:, 0], [False, True, True, False, True, False])
+    np.testing.assert_array_equal(matrix[:, 1], [False, False, False, True, True, False])
+    assert not matrix[:, 2].any()
+    assert index.quoted(["BTC"], ts[:0]).shape == (0, 1)
+
+
+def test_add_checks_the_lengths():
+    with pytest.raises(ValueError):
+        QuoteIndex().add("BTC", np.array([1, 2], dtype=np.int64), [_quote("BTC", 1)])
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rebalancing import Anchored, DriftThreshold, EveryNBars, drifted_weights, hold_weights
+
+
+def _prices(nb_dates: int = 120, nb_assets: int = 3, seed: int = 11) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.03, (nb_dates, nb_assets)), axis=0))
+
+
+def _reference_hold(prices: np.ndarray, targets: np.ndarray, rebalance: np.ndarray) -> np.ndarray:
+    held = np.zeros(targets.shape)
+    for t in range(len(prices)):
+        if rebalance[t]:
+            held[t] = targets[t]
+            continue
+        value = held[t - 1] * prices[t] / prices[t - 1]
+        held[t] = value / (value.sum() + 1 - held[t - 1].sum())
+    return held
+
+
+def test_every_n_bars():
+    mask = EveryNBars(3, offset=1).mask(pd.date_range("2022-01-01", periods=8))
+    assert list(np.flatnonzero(mask)) == [0, 1, 4, 7]
+
+
+def test_anchored_first_and_last_of_the_month():
+    calendar = pd.date_range("2022-01-30", "2022-03-02")
+    first = calendar[Anchored("M").mask(calendar)]
+    last = calendar[Anchored("M", on="last").mask(calendar)]
+    assert list(first.strftime("%m-%d")) == ["01-30", "02-01", "03-01"]
+    assert list(last.strftime("%m-%d")) == ["01-30", "01-31", "02-28", "03-02"]
+
+
+def test_drifted_weights_keep_the_cash():
+    held = drifted_weights(np.array([10.0, 10.0]), np.array([0.25, 0.25]), np.array([[20.0, 10.0]]))
+    np.testing.assert_allclose(held, [[0.4, 0.2]])
+
+
+def test_hold_weights_match_a_date_by_date_drift():
+    prices = _prices()
+    targets = np.tile([0.5, 0.3, 0.1], (len(prices), 1))
+    rebalance = Anchored("W").mask(pd.date_range("2022-01-01", periods=len(prices)))
+    np.testing.assert_allclose(hold_weights(prices, targets, rebalance),
+                               _reference_hold(prices, targets, rebalance))
+
+
+def test_drift_threshold_rebalances_on_the_first_breach():
+    prices = _prices()
+    targets = np.tile([0.5, 0.3, 0.2], (len(prices), 1))
+    calendar = pd.date_range("2022-01-01", periods=len(prices))
+    threshold = 0.05
+    mask = DriftThreshold(threshold, chunk=4).mask(calendar, prices, targets)
+    assert mask[0]
+    # the drift since the last rebalancing stays under the threshold on the other dates and breaches it on them
+    held = _reference_hold(prices, targets, mask)
+    previous = np.vstack([held[:1], held[:-1]])
+    drift = np.abs(drifted_weights(prices[:-1], previous[1:], prices[1:]) - targets[1:]).max(axis=1)
+    assert (drift[~mask[1:]] <= threshold).all()
+    assert (drift[mask[1:]] > threshold).all()
+    assert 0 < mask.sum() < len(prices)
+
+
+def test_drift_threshold_keeps_the_schedule():
+    prices = _prices()
+    targets = np.tile([0.5, 0.3, 0.2], (len(prices), 1))
+    calendar = pd.date_range("2022-01-01", periods=len(prices))
+    monthly = Anchored("M").mask(calendar)
+    mask = DriftThreshold(1.0, schedule=Anchored("M")).mask(calendar, prices, targets)
+    np.testing.assert_array_equal(mask, monthly)
+
+
+def test_drift_threshold_needs_prices():
+    with pytest.raises(ValueError):
+        DriftThreshold(0.05).mask(pd.date_range("2022-01-01", periods=3))
@@ -0,0 +1,51 @@
+import pytest
+
+from base import RequestSpec, canonical_value
+
+BASE_URL = "https://api.coingecko.com/api/v3/"
+
+
+def test_canonical_list_values():
+    assert canonical_value(" ethereum,bitcoin , ethereum,", is_list=True) == "bitcoin,ethereum"
+    assert canonical_value(["usd", "eur", "usd"], is_list=True) == "eur,usd"
+    assert canonical_value(",", is_list=True) is None
+
+
+def test_canonical_scalar_values():
+    assert canonical_value(True) == "true"
+    assert canonical_value("False") == "false"
+    assert canonical_value(365) == "365"
+    assert canonical_value(None) is None
+    assert canonical_value("  ") is None
+    # order and duplicates matter outside of the list parameters
+    assert canonical_value("gecko_desc,id_asc,gecko_desc") == "gecko_desc,id_asc,gecko_desc"
+    assert canonical_value(["b", "a"]) == "b,a"
+
+
+def test_equivalent_calls_share_one_url():
+    specs = [RequestSpec("simple/price", ids="bitcoin,ethereum", vs_currencies="usd", include_market_cap=True),
+             RequestSpec("simple/price", include_market_cap="true", vs_currencies=["usd"],
+                         ids=" ethereum, bitcoin,bitcoin"),
+             RequestSpec("simple/price", vs_currencies="usd", ids=("ethereum", "bitcoin"), include_market_cap="True",
+                         include_24hr_vol=None)]
+    assert len({spec.cache_key for spec in specs}) == 1
+    assert len(set(specs)) == 1
+    assert specs[0].url(BASE_URL) == \
+        BASE_URL + "simple/price?ids=bitcoin,ethereum&include_market_cap=true&vs_currencies=usd"
+
+
+def test_path_parameters_are_quoted():
+    spec = RequestSpec("coins/{id}/ohlc", id=" wrapped/bitcoin ", vs_currency="usd", days=365)
+    assert spec.path == "coins/wrapped%2Fbitcoin/ohlc"
+    assert spec.cache_key == "coins/wrapped%2Fbitcoin/ohlc?days=365&vs_currency=usd"
+    assert spec.endpoint == "coins/{id}/ohlc"
+
+
+def test_missing_path_parameter():
+    with pytest.raises(ValueError):
+        RequestSpec("coins/{id}/ohlc", vs_currency="usd")
+
+
+def test_query_values_are_encoded():
+    spec = RequestSpec("search", query="bitcoin cash & co")
+    assert spec.query == "query=bitcoin%20cash%20%26%20co"
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from base import Client, RequestSpec, SingleFlight
+
+
+class _Response(object):
+    status_code = 200
+    content = b'{"gecko_says": "(V3) To the Moon!"}'
+
+
+class _Session(object):
+    """
+    session answering every GET after a delay and counting them
+    """
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.urls = list()
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.urls.append(url)
+        time.sleep(self.delay)
+        return _Response()
+
+
+class _Client(Client):
+    base_url = "http://mock/api/v3/"
+
+    def __init__(self, session: _Session):
+        self._session = session
+
+    @property
+    def session(self):
+        return self._session
+
+
+def _slow(calls: list, value, delay: float = 0.2):
+    calls.append(value)
+    time.sleep(delay)
+    return value
+
+
+def test_do_shares_concurrent_calls():
+    flight, calls = SingleFlight(), list()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: flight.do("key", _slow, calls, 42), range(8)))
+    assert results == [42] * 8
+    assert calls == [42]
+
+
+def test_do_raises_the_error_to_every_caller():
+    flight, calls = SingleFlight(), list()
+
+    def fail():
+        calls.append(None)
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    def call(_):
+        try:
+            flight.do("key", fail)
+        except ValueError as error:
+            return str(error)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(call, range(4))) == ["boom"] * 4
+    assert len(calls) == 1
+
+
+def test_do_runs_again_once_the_call_is_done():
+    flight, calls = SingleFlight(), list()
+    flight.do("key", _slow, calls, 1, 0.0)
+    flight.do("key", _slow, calls, 2, 0.0)
+    assert calls == [1, 2]
+
+
+def test_ado_shares_concurrent_calls():
+    flight, calls = SingleFlight(), list()
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", _slow, calls, 42) for _ in range(8)))
+
+    assert asyncio.run(main()) == [42] * 8
+    assert calls == [42]
+
+
+def test_ado_cancelled_leader_does_not_cancel_followers():
+    flight, calls = SingleFlight(), list()
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("key", _slow, calls, 42))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(flight.ado("key", _slow, calls, 42))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 42
+    assert calls == [42]
+
+
+def test_ado_raises_the_error_to_every_caller():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", fail) for _ in range(3)), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(main())] == ["boom"] * 3
+
+
+def test_thread_and_coroutine_share_one_request():
+    session = _Session()
+    client, spec = _Client(session), RequestSpec("ping")
+    results = dict()
+    thread = threading.Thread(target=lambda: results.update(sync=client._fetch(spec)))
+    thread.start()
+    time.sleep(0.05)
+    results["async"] = asyncio.run(client._afetch(spec))
+    thread.join()
+    assert results["sync"] == results["async"] == {"gecko_says": "(V3) To the Moon!"}
+    assert session.urls == ["http://mock/api/v3/ping"]
+
+
+def test_raw_and_decoded_requests_are_not_shared():
+    session = _Session(delay=0.1)
+    client, spec = _Client(session), RequestSpec("ping")
+
+    async def main():
+        return await asyncio.gather(client._afetch(spec), client._ageturl(spec.url(client.base_url), raw=True))
+
+    decoded, raw = asyncio.run(main())
+    assert decoded == {"gecko_says": "(V3) To the Moon!"}
+    assert raw == _Response.content
+    assert len(session.urls) == 2
+
+
+def test_requests_of_different_sessions_are_not_shared():
+    first, second = _Session(delay=0.1), _Session(delay=0.1)
+    clients = [_Client(first), _Client(first), _Client(second)]
+    spec = RequestSpec("ping")
+
+    async def main():
+        return await asyncio.gather(*(client._afetch(spec) for client in clients))
+
+    assert asyncio.run(main()) == [{"gecko_says": "(V3) To the Moon!"}] * 3
+    # the clients sharing a session share the request, the other session may carry other headers or credentials
+    assert len(first.urls) == len(second.urls) == 1
+
+
+def test_coingecko_clients_without_session_share_requests():
+    from geckoclient import CoinGeckoClient
+
+    session = _Session()
+    assert CoinGeckoClient()._request_key("url") == CoinGeckoClient()._request_key("url")
+    assert CoinGeckoClient(session=session)._request_key("url") != CoinGeckoClient()._request_key("url")
+    assert CoinGeckoClient(session=session)._request_key("url") == CoinGeckoClient(session=session)._request_key("url")
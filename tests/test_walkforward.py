@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from walkforward import RollingCache, WalkForward, moving_average_grid, moving_average_targets
+
+CALENDAR = pd.date_range("2022-01-01", periods=12, freq="D")
+
+
+def _prices() -> np.ndarray:
+    """
+    asset 0 rises by 10% a day for 5 days then falls by 10% a day, asset 1 does the opposite
+    """
+    up = np.where(np.arange(1, 12) <= 5, 1.1, 0.9)
+    down = np.where(np.arange(1, 12) <= 5, 0.9, 1.1)
+    return np.column_stack([np.cumprod(np.r_[1.0, up]), np.cumprod(np.r_[1.0, down])]) * 100
+
+
+def _hold(cache: RollingCache, asset: int) -> np.ndarray:
+    targets = np.zeros(cache.prices.shape)
+    targets[:, asset] = 1.0
+    return targets
+
+
+def _walk_forward(prices=None, **kwargs) -> WalkForward:
+    kwargs.setdefault("strategy", _hold)
+    kwargs.setdefault("param_grid", {"asset": [0, 1]})
+    return WalkForward(CALENDAR, _prices() if prices is None else prices, train_size=4, test_size=2,
+                       kpi="total_return", max_workers=2, **kwargs)
+
+
+def test_windows():
+    assert _walk_forward().windows() == [(0, 4, 4, 6), (2, 6, 6, 8), (4, 8, 8, 10), (6, 10, 10, 12)]
+    assert _walk_forward(anchored=True).windows() == [(0, 4, 4, 6), (0, 6, 6, 8), (0, 8, 8, 10), (0, 10, 10, 12)]
+    assert _walk_forward(step=3).windows() == [(0, 4, 4, 6), (3, 7, 7, 9), (6, 10, 10, 12)]
+    with pytest.raises(ValueError):
+        _walk_forward(step=1)
+
+
+def test_selects_the_best_parameters_of_the_train_window():
+    result = _walk_forward().run()
+    # the train windows ending after the turn of the trend (day 5) prefer the second asset
+    assert [window.params for window in result.windows] == [{"asset": 0}, {"asset": 0}, {"asset": 1}, {"asset": 1}]
+    assert result.windows[0].train_kpi == pytest.approx(1.1 ** 3 - 1)
+    assert result.windows[2].train_kpi == pytest.approx(0.9 * 1.1 ** 2 - 1)
+    assert result.windows[1].test_start == CALENDAR[6] and result.windows[1].test_end == CALENDAR[7]
+
+
+def test_stitches_the_test_windows():
+    result = _walk_forward().run()
+    # the first test return is the one from the last train close, then the returns of the selected asset
+    growth = [1.1, 1.1, 0.9, 0.9, 1.1, 1.1, 1.1, 1.1]
+    np.testing.assert_allclose(result.levels.to_numpy(), 100 * np.cumprod(np.r_[1.0, growth]))
+    pd.testing.assert_index_equal(result.levels.index, CALENDAR[3:])
+    assert result.windows[1].test_kpi == pytest.approx(0.81 - 1)
+
+
+def test_no_lookahead():
+    rng = np.random.default_rng(3)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (12, 3)), axis=0))
+    shocked = prices.copy()
+    shocked[6:] *= rng.uniform(0.5, 1.5, shocked[6:].shape)
+    grid = moving_average_grid([1, 2], [3, 4])
+    before, after = (_walk_forward(values, strategy=moving_average_targets, param_grid=grid).run()
+                     for values in (prices, shocked))
+    # the first window ends before the shocked dates, nothing computed on it may change
+    assert before.windows[0] == after.windows[0]
+    np.testing.assert_allclose(before.levels.to_numpy()[:3], after.levels.to_numpy()[:3])
+
+
+def test_rolling_cache_is_computed_once():
+    calls = list()
+
+    def strategy(cache, short_ma, long_ma):
+        calls.append((short_ma, long_ma))
+        return moving_average_targets(cache, short_ma, long_ma)
+
+    grid = moving_average_grid([1, 2], [3, 4])
+    walk_forward = _walk_forward(strategy=strategy, param_grid=grid)
+    walk_forward.run()
+    assert sorted(calls) == sorted((params["short_ma"], params["long_ma"]) for params in grid)
+    cache = walk_forward.cache
+    assert cache.mean(3) is cache.mean(3)
+    assert cache.volatility(3) is cache.volatility(3)
+    frame = pd.DataFrame(_prices())
+    np.testing.assert_allclose(cache.mean(3), frame.rolling(3).mean().to_numpy())
+    np.testing.assert_allclose(cache.volatility(3), frame.pct_change().rolling(3).std().to_numpy(),
+                               atol=1e-7)
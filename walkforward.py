@@ -0,0 +1,289 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import product
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas import Timestamp
+
+from costs import CostModel, level_path
+from metrics import LOWER_IS_BETTER, PERIODS_PER_YEAR, compute_kpi
+from rebalancing import EveryNBars, RebalancingSchedule, hold_weights
+
+
+class RollingCache(object):
+    """
+    class RollingCache of rolling statistics of the price matrix, computed once over the whole calendar from
+    cumulative sums and memoized by window length, so every train/test window and every parameter set reuses them
+    A statistic at date t only uses the data up to t, slicing it to a window does not leak the future
+    """
+    def __init__(self, prices: np.ndarray):
+        """
+        :param prices: (T, N) close prices, NaN before the first quote of an asset
+        """
+        self._prices = np.asarray(prices, dtype=np.float64)
+        self._returns = None
+        self._means: Dict[int, np.ndarray] = dict()
+        self._volatilities: Dict[int, np.ndarray] = dict()
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._prices
+
+    @property
+    def returns(self) -> np.ndarray:
+        """
+        :return: (T, N) simple returns, NaN on the first date and before the first quote
+        """
+        if self._returns is None:
+            returns = np.full_like(self._prices, np.nan)
+            returns[1:] = self._prices[1:] / self._prices[:-1] - 1
+            self._returns = returns
+        return self._returns
+
+    @staticmethod
+    def _rolling_sum(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (rolling sum over window dates, True where the window has no NaN), NaN rows before the first
+                 full window
+        """
+        if window < 1:
+            raise ValueError(f"window should be a positive number of dates current value is : {window}")
+        zeros = np.zeros((1, values.shape[1]))
+        total = np.concatenate([zeros, np.cumsum(np.nan_to_num(values, nan=0.0), axis=0)])
+        count = np.concatenate([zeros, np.cumsum(~np.isnan(values), axis=0)])
+        rolling = np.full(values.shape, np.nan)
+        full = np.zeros(values.shape, dtype=bool)
+        rolling[window - 1:] = total[window:] - total[:-window]
+        full[window - 1:] = count[window:] - count[:-window] == window
+        return rolling, full
+
+    def mean(self, window: int) -> np.ndarray:
+        """
+        :return: (T, N) moving average of the prices over window dates, NaN until the window is full
+        """
+        if window not in self._means:
+            rolling, full = self._rolling_sum(self._prices, window)
+            self._means[window] = np.where(full, rolling / window, np.nan)
+        return self._means[window]
+
+    def volatility(self, window: int) -> np.ndarray:
+        """
+        :return: (T, N) standard deviation of the returns over window dates, NaN until the window is full
+        """
+        if window not in self._volatilities:
+            rolling, full = self._rolling_sum(self.returns, window)
+            squares, _ = self._rolling_sum(self.returns ** 2, window)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                variance = (squares - rolling ** 2 / window) / (window - 1)
+            self._volatilities[window] = np.where(full, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+        return self._volatilities[window]
+
+
+def moving_average_targets(cache: RollingCache, short_ma: int, long_ma: int) -> np.ndarray:
+    """
+    Equally weight the assets whose short moving average is above the long one, cash when there is none
+    :return: (T, N) target weights
+    """
+    signal = cache.mean(short_ma) > cache.mean(long_ma)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(signal, 1 / signal.sum(axis=1, keepdims=True), 0.0)
+
+
+def moving_average_grid(short_mas: Iterable[int], long_mas: Iterable[int]) -> List[Dict[str, int]]:
+    """
+    :return: parameter sets of moving_average_targets with short_ma < long_ma
+    """
+    return [{"short_ma": short_ma, "long_ma": long_ma} for short_ma, long_ma in product(short_mas, long_mas)
+            if short_ma < long_ma]
+
+
+@dataclass
+class WalkForwardWindow:
+    """
+    Parameters selected on a train window and their KPI on the train and the following test window
+    """
+    train_start: Timestamp
+    train_end: Timestamp
+    test_start: Timestamp
+    test_end: Timestamp
+    params: Dict
+    train_kpi: float
+    test_kpi: float
+
+
+class WalkForwardResult(object):
+    def __init__(self, levels: pd.Series, windows: List[WalkForwardWindow], kpi: str):
+        self._levels = levels
+        self._windows = windows
+        self._kpi = kpi
+
+    @property
+    def levels(self) -> pd.Series:
+        """
+        :return: out of sample levels, the test windows chained one after the other
+        """
+        return self._levels
+
+    @property
+    def windows(self) -> List[WalkForwardWindow]:
+        return self._windows
+
+    @property
+    def kpi(self) -> str:
+        return self._kpi
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame([asdict(window) for window in self._windows])
+
+
+class WalkForward(object):
+    """
+    class WalkForward sliding train/test windows over the calendar: on every train window the parameter grid is
+    evaluated (in parallel) and the best parameters by the KPI are run on the following test window
+
+    The prices are loaded once (see from_backtester), the rolling statistics are computed once for the whole
+    calendar (RollingCache) and the target weights once per parameter set, the windows only slice them
+
+    eg: walk_forward = WalkForward.from_backtester(backtester, moving_average_grid([5, 10, 20], [50, 100]),
+                                                   train_size=365, test_size=90)
+        result = walk_forward.run()
+        result.levels, result.to_frame()
+    """
+    def __init__(
+            self,
+            calendar: Iterable[Timestamp],
+            prices: np.ndarray,
+            param_grid: Union[List[Dict], Dict[str, Iterable]],
+            strategy: Callable[..., np.ndarray] = moving_average_targets,
+            train_size: int = 365,
+            test_size: int = 90,
+            step: int = None,
+            anchored: bool = False,
+            kpi: str = "sharpe_ratio",
+            periods_per_year: float = 365,
+            product_codes: List[str] = None,
+            cost_model: CostModel = None,
+            rebalancing: RebalancingSchedule = None,
+            basis: float = 100.0,
+            max_workers: int = None
+    ):
+        """
+        :param prices: (T, N) close prices on the calendar
+        :param param_grid: list of parameter sets, or {name: values} for every combination
+        :param strategy: strategy(cache: RollingCache, **params) -> (T, N) target weights
+        :param train_size: dates of the train windows
+        :param test_size: dates of the test windows
+        :param step: dates between two train windows, at least test_size so the test windows do not overlap,
+                     test_size by default
+        :param anchored: train windows all start at the first date (expanding) instead of sliding
+        :param product_codes: codes of the price columns, needed by a cost model
+        """
+        self._calendar = pd.DatetimeIndex(list(calendar))
+        self._cache = RollingCache(prices)
+        if isinstance(param_grid, dict):
+            param_grid = [dict(zip(param_grid, values)) for values in product(*param_grid.values())]
+        if not param_grid:
+            raise ValueError("param_grid should have at least one parameter set")
+        self._param_grid = list(param_grid)
+        self._strategy = strategy
+        self._train_size = train_size
+        self._test_size = test_size
+        self._step = test_size if step is None else step
+        if self._step < test_size:
+            raise ValueError(f"step should be at least test_size ({test_size}) current value is : {self._step}")
+        self._anchored = anchored
+        self._kpi = kpi
+        self._periods_per_year = periods_per_year
+        self._rates = None if cost_model is None else cost_model.rates(product_codes)
+        self._rebalancing = EveryNBars(1) if rebalancing is None else rebalancing
+        self._basis = basis
+        self._max_workers = max_workers
+        self._targets: Dict[Tuple, np.ndarray] = dict()
+
+    @classmethod
+    def from_backtester(cls, backtester, param_grid: Union[List[Dict], Dict[str, Iterable]], **kwargs) -> "WalkForward":
+        """
+        Walk forward on the prices already loaded by a Backtester, with the frequency, cost model and rebalancing
+        of its config unless given in kwargs
+        """
+        config = backtester.config
+        kwargs.setdefault("periods_per_year", PERIODS_PER_YEAR[config.frequency.value])
+        kwargs.setdefault("cost_model", config.cost_model)
+        kwargs.setdefault("rebalancing", config.rebalancing)
+        return cls(backtester.calendar, backtester.prices.to_numpy(), param_grid,
+                   product_codes=backtester.underlyings_codes, **kwargs)
+
+    @property
+    def cache(self) -> RollingCache:
+        return self._cache
+
+    def windows(self) -> List[Tuple[int, int, int, int]]:
+        """
+        :return: (train start, train end, test start, test end) positions in the calendar, ends excluded
+        """
+        nb_dates = len(self._calendar)
+        windows = list()
+        start = 0
+        while start + self._train_size < nb_dates:
+            train_end = start + self._train_size
+            windows.append((0 if self._anchored else start, train_end, train_end,
+                            min(train_end + self._test_size, nb_dates)))
+            start += self._step
+        return windows
+
+    def targets(self, params: Dict) -> np.ndarray:
+        """
+        :return: (T, N) target weights of the parameter set over the whole calendar, computed once
+        """
+        key = tuple(sorted(params.items()))
+        if key not in self._targets:
+            self._targets[key] = self._strategy(self._cache, **params)
+        return self._targets[key]
+
+    def evaluate(self, params: Dict, start: int, end: int) -> np.ndarray:
+        """
+        :return: levels of the parameter set from the position start to end (excluded) of the calendar,
+                 the portfolio trades in from cash at start
+        """
+        prices = self._cache.prices[start:end]
+        targets = self.targets(params)[start:end]
+        rebalance = self._rebalancing.mask(self._calendar[start:end], prices, targets)
+        levels, _, _ = level_path(prices, hold_weights(prices, targets, rebalance), self._rates, self._basis,
+                                  rebalance)
+        return levels
+
+    def _score(self, levels: np.ndarray) -> np.ndarray:
+        return compute_kpi(self._kpi, levels, self._periods_per_year)
+
+    def run(self) -> WalkForwardResult:
+        windows = self.windows()
+        if not windows:
+            raise ValueError(f"{len(self._calendar)} dates are not enough for a train window of {self._train_size}")
+        selected, growth = list(), list()
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            # the target weights of every parameter set are computed once, in parallel
+            list(executor.map(self.targets, self._param_grid))
+            for train_start, train_end, test_start, test_end in windows:
+                levels = np.stack(list(executor.map(lambda params: self.evaluate(params, train_start, train_end),
+                                                    self._param_grid)))
+                scores = self._score(levels)
+                best = int(np.argmin(scores) if self._kpi in LOWER_IS_BETTER else np.argmax(scores))
+                params = self._param_grid[best]
+                # the test levels start from the close before the window so its first return is included
+                test_levels = self.evaluate(params, test_start - 1, test_end)
+                growth.append(test_levels[1:] / test_levels[:-1])
+                selected.append(WalkForwardWindow(
+                    train_start=self._calendar[train_start],
+                    train_end=self._calendar[train_end - 1],
+                    test_start=self._calendar[test_start],
+                    test_end=self._calendar[test_end - 1],
+                    params=params,
+                    train_kpi=float(scores[best]),
+                    test_kpi=float(self._score(test_levels))
+                ))
+        levels = self._basis * np.concatenate([[1.0], np.cumprod(np.concatenate(growth))])
+        index = self._calendar[[windows[0][2] - 1] + [position for _, _, test_start, test_end in windows
+                                                      for position in range(test_start, test_end)]]
+        return WalkForwardResult(pd.Series(levels, index=index, name="walk_forward"), selected, self._kpi)